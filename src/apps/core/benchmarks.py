@@ -0,0 +1,41 @@
+"""Общее для нагрузочных management-команд."""
+import shutil
+import tempfile
+from contextlib import contextmanager
+from os import path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import override_settings
+
+
+@contextmanager
+def temporary_database():
+    """Пустая SQLite-база с актуальной схемой и временный MEDIA_ROOT
+    вместо настроенных — на время блока."""
+
+    database = settings.DATABASES['default']
+    if connection.vendor != 'sqlite':
+        raise CommandError('Нужна база SQLite')
+    original_name = database['NAME']
+    directory = tempfile.mkdtemp()
+    connections.close_all()
+    database['NAME'] = path.join(directory, 'benchmark.sqlite3')
+    try:
+        with override_settings(MEDIA_ROOT=path.join(directory, 'media')):
+            call_command('migrate', verbosity=0)
+            yield
+    finally:
+        connections.close_all()
+        database['NAME'] = original_name
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def percentile(values, fraction):
+    """Перцентиль отсортированного списка (ближайший ранг)."""
+
+    if not values:
+        return 0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
@@ -0,0 +1,54 @@
+"""Сжатие ответов: brotli, если клиент его принимает и установлен пакет
+brotli, иначе gzip.
+
+Как и GZipMiddleware, не трогает короткие, потоковые и уже сжатые ответы,
+добавляет Vary: Accept-Encoding и делает ETag слабым — сжатый ответ
+побайтово отличается от исходного.
+"""
+import re
+from functools import wraps
+
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli  # noqa: WPS433
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+_MIN_LENGTH = 200
+_ACCEPTS_BROTLI = re.compile(r'\bbr\b')
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+def _encode(request, content):
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if brotli is not None and _ACCEPTS_BROTLI.search(accept_encoding):
+        return 'br', brotli.compress(content)
+    if _ACCEPTS_GZIP.search(accept_encoding):
+        return 'gzip', compress_string(content)
+    return None, content
+
+
+def compress_response(view_func):
+    """Декоратор представления: сжать ответ brotli или gzip."""
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        if response.streaming or len(response.content) < _MIN_LENGTH:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding, content = _encode(request, response.content)
+        if encoding is None or len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub('^"', 'W/"', response['ETag'])
+        return response
+    return wrapper
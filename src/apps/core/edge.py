@@ -0,0 +1,187 @@
+"""Общий кэш перед приложением (CDN, Varnish, nginx proxy_cache).
+
+Декоратор edge_cache собирает страницы для посетителей без сессии, не
+обращаясь к ней: ответ один для всех анонимных посетителей и уходит с
+Cache-Control: public, s-maxage=EDGE_CACHE_TIMEOUT и Surrogate-Key —
+ключами, по которым его можно сбросить. Ответы остальным помечаются
+private. Кэш перед приложением должен пропускать мимо себя запросы с
+cookie сессии (SESSION_COOKIE_NAME).
+
+purge(keys) сбрасывает ответы с этими ключами через purger из
+EDGE_CACHE_PURGER: 'file' дописывает ключи строкой в файл
+EDGE_CACHE_PURGE_LOCATION (локальная замена CDN), 'http' отправляет
+PURGE на URL EDGE_CACHE_PURGE_LOCATION с заголовком Surrogate-Key
+(Fastly, Varnish xkey), иначе — путь к своему классу. Сброс идёт в
+фоновом потоке: медленный CDN не задерживает ответ на запись.
+"""
+import logging
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.utils.cache import has_vary_header, patch_cache_control
+from django.utils.module_loading import import_string
+
+
+SURROGATE_KEY_HEADER = 'Surrogate-Key'
+
+# Fastly принимает не больше 256 ключей в одном запросе
+_KEYS_PER_REQUEST = 256
+_PURGE_TIMEOUT = 2
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+
+
+def has_session(request):
+    """У посетителя есть сессия — возможно, он вошёл на сайт."""
+
+    return settings.SESSION_COOKIE_NAME in request.COOKIES
+
+
+def is_shared(request):
+    """Ответ на запрос можно отдать всем анонимным посетителям."""
+
+    return bool(settings.EDGE_CACHE_TIMEOUT) and (
+        request.method in {'GET', 'HEAD'}
+    ) and not has_session(request)
+
+
+def _is_anonymous_render(request, response):
+    """Ответ не зависит от посетителя.
+
+    Vary: Cookie значит, что ответ собирали с сессией — в том числе
+    взятый из кэша страниц, куда его положил вошедший пользователь.
+    """
+
+    return not (
+        response.cookies or
+        request.META.get('CSRF_COOKIE_USED') or
+        has_vary_header(response, 'Cookie')
+    )
+
+
+def edge_cache(*surrogate_keys):
+    """Разрешить общему кэшу хранить страницу для анонимных посетителей.
+
+    surrogate_keys — функции kwargs представления → ключ сброса.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not settings.EDGE_CACHE_TIMEOUT:
+                return view_func(request, *args, **kwargs)
+            shared = is_shared(request)
+            if shared:
+                # Без сессии пользователь и так анонимный, а обращение к
+                # ней добавило бы Vary: Cookie
+                request.user = AnonymousUser()
+            response = view_func(request, *args, **kwargs)
+            if shared and _is_anonymous_render(request, response):
+                patch_cache_control(
+                    response,
+                    public=True,
+                    max_age=0,
+                    s_maxage=settings.EDGE_CACHE_TIMEOUT,
+                )
+                response[SURROGATE_KEY_HEADER] = ' '.join(
+                    key(kwargs) for key in surrogate_keys
+                )
+            else:
+                patch_cache_control(response, private=True)
+            return response
+        return wrapper
+    return decorator
+
+
+class FilePurger(object):
+    """Дописывает сброшенные ключи строкой в файл: «время ключ ключ…»."""
+
+    def __init__(self, location):
+        self.location = location
+
+    def purge(self, keys):
+        with open(self.location, 'a') as purge_log:
+            purge_log.write('{0:.3f} {1}\n'.format(
+                time.time(), ' '.join(keys),
+            ))
+
+
+class HttpPurger(object):
+    """Запрос PURGE с заголовком Surrogate-Key."""
+
+    def __init__(self, location):
+        self.location = location
+
+    def purge(self, keys):
+        for offset in range(0, len(keys), _KEYS_PER_REQUEST):
+            request = urllib.request.Request(  # noqa: S310
+                self.location,
+                method='PURGE',
+                headers={SURROGATE_KEY_HEADER: ' '.join(
+                    keys[offset:offset + _KEYS_PER_REQUEST],
+                )},
+            )
+            urllib.request.urlopen(  # noqa: S310
+                request, timeout=_PURGE_TIMEOUT,
+            ).close()
+
+
+PURGERS = {  # noqa: WPS407
+    'file': FilePurger,
+    'http': HttpPurger,
+}
+
+
+def get_purger():
+    name = settings.EDGE_CACHE_PURGER
+    if not name:
+        return None
+    purger_class = PURGERS.get(name) or import_string(name)
+    return purger_class(settings.EDGE_CACHE_PURGE_LOCATION)
+
+
+def _get_executor():
+    global _executor  # noqa: WPS420
+    with _lock:
+        if _executor is None:
+            # Один поток: сбросы уходят в CDN в порядке записей
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='edge-purge',
+            )
+    return _executor
+
+
+def _run(purger, keys):
+    try:
+        purger.purge(keys)
+    except Exception:  # noqa: B902 - поток сброса не должен падать
+        logger.exception('Не удалось сбросить ключи %s', keys)
+
+
+def purge(keys):
+    """Поставить сброс ответов с ключами keys в общем кэше в фоновый поток.
+
+    Ошибка сброса только пишется в лог: запись уже прошла, а устаревший
+    ответ живёт не дольше EDGE_CACHE_TIMEOUT.
+    """
+
+    purger = get_purger()
+    keys = sorted(keys)
+    if purger is None or not keys:
+        return
+    _get_executor().submit(_run, purger, keys)
+
+
+def wait_for_purges():
+    """Дождаться сбросов, поставленных до вызова (для тестов и команд)."""
+
+    if _executor is not None:
+        _get_executor().submit(lambda: None).result()
@@ -0,0 +1,164 @@
+"""Отдача статики и медиа без django.views.static.serve.
+
+Если перед приложением стоит nginx/Apache, файл отдаёт он: ответ содержит
+только заголовок X-Accel-Redirect или X-Sendfile (FILE_OFFLOAD). Иначе файл
+целиком уходит через FileResponse (wsgi.file_wrapper, у gunicorn — sendfile),
+с ETag/Last-Modified, поддержкой Range и долгим кэшированием.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+
+_HTTP206 = 206
+_HTTP416 = 416
+_CHUNK_SIZE = 64 * 1024
+_IMMUTABLE = 'public, max-age=31536000, immutable'
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _resolve(document_root, path):
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404('"{0}" does not exist'.format(path))
+    if not os.path.isfile(fullpath):
+        raise Http404('"{0}" does not exist'.format(path))
+    return fullpath
+
+
+def _etag(stat):
+    return quote_etag('{0:x}-{1:x}'.format(stat.st_mtime_ns, stat.st_size))
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag in {tag.strip() for tag in if_none_match.split(',')}
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+
+def _parse_range(header, size):
+    """(start, end) включительно, None — отдать файл целиком, ValueError —
+    диапазон не попадает в файл."""
+
+    match = _RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(fullpath, start, length):
+    with open(fullpath, 'rb') as file_obj:
+        file_obj.seek(start)
+        while length > 0:
+            chunk = file_obj.read(min(_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload(request, fullpath):
+    if settings.FILE_OFFLOAD == 'x-accel-redirect':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = '{0}{1}'.format(
+            settings.FILE_OFFLOAD_PREFIX, request.path,
+        )
+        return response
+    if settings.FILE_OFFLOAD == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = fullpath
+        return response
+    return None
+
+
+def _file_response(request, fullpath, stat):
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.META.get('HTTP_IF_RANGE', _etag(stat)) == _etag(stat):
+        try:
+            byte_range = _parse_range(range_header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=_HTTP416)
+            response['Content-Range'] = 'bytes */{0}'.format(stat.st_size)
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(fullpath, start, end - start + 1),
+                status=_HTTP206,
+            )
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(
+                start, end, stat.st_size,
+            )
+            return response
+    response = FileResponse(open(fullpath, 'rb'))  # noqa: WPS515
+    response['Content-Length'] = stat.st_size
+    return response
+
+
+@require_safe
+def serve(request, path, document_root, immutable=False):
+    """Отдать файл из document_root.
+
+    immutable — имена файлов не переиспользуются (хэш в имени у
+    ManifestStaticFilesStorage, уникальные имена загрузок), поэтому
+    браузеру и CDN можно кэшировать их на год.
+    """
+
+    fullpath = _resolve(document_root, path)
+    stat = os.stat(fullpath)
+    etag = _etag(stat)
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        response = _offload(request, fullpath) or _file_response(
+            request, fullpath, stat,
+        )
+        content_type, encoding = mimetypes.guess_type(fullpath)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = (
+        _IMMUTABLE if immutable else 'public, max-age={0}'.format(
+            settings.STATIC_MAX_AGE,
+        )
+    )
+    return response
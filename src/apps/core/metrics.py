@@ -0,0 +1,280 @@
+"""Метрики запросов.
+
+MetricsMiddleware замеряет для каждого запроса число запросов к базе и
+время в ней, время рендеринга шаблонов, попадания и промахи кэша и общее
+время ответа. Метрики копятся в памяти процесса по имени представления
+(``posts:index``, ``posts:profile``, …), отдаются в текстовом формате
+Prometheus представлением metrics_view и пишутся в лог apps.core.metrics
+одной JSON-строкой на запрос (уровень INFO).
+
+Представление может объявить бюджет запросов к базе — атрибутом
+query_budget у класса или декоратором query_budget. Превышение пишется
+в лог с уровнем WARNING, а при QUERY_BUDGETS_STRICT (он включён в
+config.test_settings) поднимает QueryBudgetExceeded, и тест падает.
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template.base import Template
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_metrics', default=None)
+_MISSING = object()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Представление выполнило больше запросов, чем объявило."""
+
+
+class RequestMetrics(object):
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.template_time = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper."""
+
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+class _Registry(object):
+    """Накопленные метрики процесса по представлениям."""
+
+    _counters = (
+        'requests', 'seconds', 'db_queries', 'db_seconds',
+        'template_seconds', 'cache_hits', 'cache_misses', 'budget_exceeded',
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._views = defaultdict(lambda: dict.fromkeys(self._counters, 0))
+            self._buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+
+    def observe(self, view, metrics, latency, exceeded):
+        with self._lock:
+            counters = self._views[view]
+            counters['requests'] += 1
+            counters['seconds'] += latency
+            counters['db_queries'] += metrics.queries
+            counters['db_seconds'] += metrics.db_time
+            counters['template_seconds'] += metrics.template_time
+            counters['cache_hits'] += metrics.cache_hits
+            counters['cache_misses'] += metrics.cache_misses
+            counters['budget_exceeded'] += int(exceeded)
+            buckets = self._buckets[view]
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    buckets[index] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return (
+                {view: dict(counters) for view, counters in self._views.items()},
+                {view: list(buckets) for view, buckets in self._buckets.items()},
+            )
+
+    def render(self):
+        """Текстовый формат Prometheus."""
+
+        views, buckets = self.snapshot()
+        lines = []
+        for counter in self._counters:
+            name = 'yatube_{0}_total'.format(counter)
+            lines.append('# TYPE {0} counter'.format(name))
+            for view, counters in sorted(views.items()):
+                lines.append('{0}{{view="{1}"}} {2}'.format(
+                    name, view, counters[counter],
+                ))
+        lines.append('# TYPE yatube_request_duration_seconds histogram')
+        for view, counts in sorted(buckets.items()):
+            for bound, count in zip(LATENCY_BUCKETS, counts):
+                lines.append(
+                    'yatube_request_duration_seconds_bucket'
+                    '{{view="{0}",le="{1}"}} {2}'.format(view, bound, count),
+                )
+            lines.append(
+                'yatube_request_duration_seconds_bucket'
+                '{{view="{0}",le="+Inf"}} {1}'.format(
+                    view, views[view]['requests'],
+                ),
+            )
+            lines.append(
+                'yatube_request_duration_seconds_sum{{view="{0}"}} {1}'.format(
+                    view, views[view]['seconds'],
+                ),
+            )
+            lines.append(
+                'yatube_request_duration_seconds_count{{view="{0}"}} {1}'
+                .format(view, views[view]['requests']),
+            )
+        return '\n'.join(lines) + '\n'
+
+
+registry = _Registry()
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        metrics = _current.get()
+        if metrics is None or metrics.rendering:
+            return render(self, context)
+        # Учитывается только внешний шаблон, include уже внутри него
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics.rendering = False
+    wrapper.metrics_instrumented = True
+    return wrapper
+
+
+def _counted_get(get):
+    def wrapper(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        metrics = _current.get()
+        if value is _MISSING:
+            if metrics is not None:
+                metrics.cache_misses += 1
+            return default
+        if metrics is not None:
+            metrics.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    def wrapper(keys, version=None):
+        keys = list(keys)
+        found = get_many(keys, version=version)
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.cache_hits += len(found)
+            metrics.cache_misses += len(keys) - len(found)
+        return found
+    return wrapper
+
+
+def _instrument_cache(cache):
+    """Считать обращения к кэшу (экземпляры кэша у каждого потока свои)."""
+
+    if getattr(cache, 'metrics_instrumented', False):
+        return
+    cache.get = _counted_get(cache.get)
+    cache.get_many = _counted_get_many(cache.get_many)
+    cache.metrics_instrumented = True
+
+
+if not getattr(Template.render, 'metrics_instrumented', False):
+    Template.render = _timed_render(Template.render)
+
+
+def query_budget(budget):
+    """Декоратор функции-представления: не больше budget запросов к базе."""
+
+    def decorator(view_func):
+        view_func.query_budget = budget
+        return view_func
+    return decorator
+
+
+def _get_budget(view_func):
+    budget = getattr(view_func, 'query_budget', None)
+    view_class = getattr(view_func, 'view_class', None)
+    if budget is None and view_class is not None:
+        budget = getattr(view_class, 'query_budget', None)
+    return budget
+
+
+class MetricsMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        request.query_budget = None
+        started = time.perf_counter()
+        try:
+            _instrument_cache(caches['default'])
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        latency = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        budget = request.query_budget
+        exceeded = budget is not None and metrics.queries > budget
+        registry.observe(view, metrics, latency, exceeded)
+        self._log(request, response, view, metrics, latency, budget)
+        if exceeded and settings.QUERY_BUDGETS_STRICT:
+            raise QueryBudgetExceeded(
+                '{0} выполнил {1} запросов к базе при бюджете {2}'.format(
+                    view, metrics.queries, budget,
+                ),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = _get_budget(view_func)
+
+    def _log(self, request, response, view, metrics, latency, budget):
+        exceeded = budget is not None and metrics.queries > budget
+        level = logging.WARNING if exceeded else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        logger.log(level, json.dumps({
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'latency_ms': round(latency * 1000, 2),
+            'db_queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'template_ms': round(metrics.template_time * 1000, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'query_budget': budget,
+        }, ensure_ascii=False))
+
+
+def metrics_view(request):
+    """Метрики процесса для Prometheus (только INTERNAL_IPS и staff)."""
+
+    allowed = request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+    if not allowed and not request.user.is_staff:
+        raise Http404
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4',
+    )
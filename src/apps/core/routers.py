@@ -0,0 +1,105 @@
+"""Чтение с реплик.
+
+ReplicaRouter отправляет чтение на реплику только внутри
+replica_reads(), всё остальное — на основную базу. Представления
+включают реплику декоратором read_from_replica; после записи
+(stick_to_primary) клиент получает короткоживущую cookie и, пока она
+жива, читает с основной базы, чтобы видеть свои изменения, даже если
+реплика отстаёт.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+STICKY_COOKIE = 'use_primary_db'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему на реплики приносит репликация
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+@contextmanager
+def replica_reads():
+    """Читать с одной (случайной) реплики до выхода из блока."""
+
+    if not settings.REPLICA_DATABASES:
+        yield
+        return
+    token = _read_alias.set(random.choice(settings.REPLICA_DATABASES))
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def is_sticky(request):
+    return STICKY_COOKIE in request.COOKIES
+
+
+def read_from_replica(view_func=None, load_user=True):
+    """Декоратор представления: безопасные запросы без липкой cookie
+    читают с реплики. Ответ рендерится внутри, потому что ленивые
+    queryset шаблона выполняются при рендеринге.
+
+    load_user=False — для ответов, не зависящих от посетителя: сессия
+    и пользователь тогда не читаются вовсе.
+    """
+
+    if view_func is None:
+        return partial(read_from_replica, load_user=load_user)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in {'GET', 'HEAD'} or is_sticky(request):
+            return view_func(request, *args, **kwargs)
+        if load_user:
+            # Сессия и пользователь — с основной базы: сразу после входа
+            # их может ещё не быть на реплике
+            request.user.is_authenticated  # noqa: WPS428
+        with replica_reads():
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+        return response
+    return wrapper
+
+
+def stick_to_primary(view_func):
+    """Декоратор представления: после небезопасного запроса клиент
+    REPLICA_STICKY_SECONDS секунд читает с основной базы."""
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        if settings.REPLICA_DATABASES and request.method not in {
+            'GET', 'HEAD', 'OPTIONS',
+        }:
+            response.set_cookie(
+                STICKY_COOKIE,
+                '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+    return wrapper
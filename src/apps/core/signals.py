@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.dispatch import receiver
+
+
+@receiver(request_started)
+def check_persistent_connections(sender, **kwargs):
+    """Закрыть постоянные соединения, которые сервер успел оборвать.
+
+    Django 2.2 проверяет соединение только после ошибки в нём; без этого
+    первый запрос после рестарта СУБД или обрыва по таймауту падал бы.
+    Выполняется после close_old_connections, закрывшего устаревшие.
+    """
+
+    if not settings.DB_HEALTH_CHECKS:
+        return
+    for conn in connections.all():
+        if conn.connection is not None and not conn.is_usable():
+            conn.close()
@@ -0,0 +1,35 @@
+"""SQLite с настройками для нескольких воркеров.
+
+Каждое новое соединение получает settings.SQLITE_PRAGMAS, а транзакции
+atomic() начинаются с BEGIN IMMEDIATE (settings.SQLITE_TRANSACTION_MODE):
+отложенная транзакция, которая сначала читает, а потом пишет, получает
+«database is locked» сразу, не дожидаясь busy_timeout, если другой воркер
+успел записать раньше.
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = dict(settings.SQLITE_PRAGMAS)
+        journal_mode = pragmas.pop('journal_mode', None)
+        for pragma, value in pragmas.items():
+            conn.execute('PRAGMA {0} = {1}'.format(pragma, value))
+        # Режим журнала хранится в файле базы, а его смена требует
+        # монопольной блокировки — меняем, только если он другой
+        current = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        if journal_mode and current != journal_mode.lower():
+            conn.execute('PRAGMA journal_mode = {0}'.format(journal_mode))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # Базы в памяти (тесты) делят кэш между потоками с блокировками
+        # таблиц, которые busy_timeout не ждёт; им IMMEDIATE только мешает
+        if self.is_in_memory_db():
+            super()._start_transaction_under_autocommit()
+            return
+        self.cursor().execute(
+            'BEGIN {0}'.format(settings.SQLITE_TRANSACTION_MODE),
+        )
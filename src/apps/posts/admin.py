@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from apps.posts.models import Comment, Group, Post
+from apps.posts.models import ApiToken, Comment, Group, Post
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -20,6 +20,16 @@ class CommentAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class ApiTokenAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'name', 'created')
+    # Ключи создаёт команда create_api_token, в админке их только удаляют
+    readonly_fields = ('user', 'name', 'created')
+
+    def has_add_permission(self, request):
+        return False
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
+admin.site.register(ApiToken, ApiTokenAdmin)
@@ -0,0 +1,80 @@
+"""Сериализация JSON API.
+
+Строки читаются .values() без создания моделей, и только те столбцы,
+которые запросил клиент (?fields=id,text,…). Имена полей API не совпадают
+с путями ORM, поэтому у каждого ресурса есть таблица соответствия.
+"""
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+
+POST_FIELDS = {  # noqa: WPS407
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated': 'updated',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments': 'comment_count',
+}
+
+COMMENT_FIELDS = {  # noqa: WPS407
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+# Параметры json.dumps для всех ответов API, в том числе ошибок
+JSON_PARAMS = {  # noqa: WPS407
+    'ensure_ascii': False,
+    'separators': (',', ':'),
+}
+
+# Ключи курсора паджинатора читаются всегда
+_POST_KEY = ('pub_date', 'id')
+_COMMENT_KEY = ('created', 'id')
+
+
+def parse_fields(value, available):
+    """Имена полей из ?fields=; ValueError, если среди них есть
+    неизвестные."""
+
+    if not value:
+        return list(available)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = sorted(set(names) - set(available))
+    if unknown:
+        raise ValueError('Неизвестные поля: {0}'.format(', '.join(unknown)))
+    return names
+
+
+def _lookups(fields, available, key):
+    return {available[name] for name in fields}.union(key)
+
+
+def post_rows(queryset, fields):
+    if 'comments' in fields:
+        queryset = queryset.annotate(
+            comment_count=Coalesce(F('counters__comments'), 0),
+        )
+    return queryset.values(*_lookups(fields, POST_FIELDS, _POST_KEY))
+
+
+def comment_rows(queryset, fields):
+    return queryset.values(*_lookups(fields, COMMENT_FIELDS, _COMMENT_KEY))
+
+
+def serialize(rows, fields, available):
+    serialized = []
+    for row in rows:
+        item = {name: row[available[name]] for name in fields}
+        if item.get('image'):
+            item['image'] = default_storage.url(item['image'])
+        elif 'image' in item:
+            item['image'] = None
+        serialized.append(item)
+    return serialized
@@ -0,0 +1,44 @@
+from django.urls import path
+
+from apps.posts.views.api import (
+    CommentsApiView,
+    GroupApiView,
+    IndexApiView,
+    PostApiView,
+    ProfileApiView,
+)
+from apps.posts.views.batch import (
+    CommentBatchView,
+    FollowBatchView,
+    PostBatchView,
+)
+
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', IndexApiView.as_view(), name='index'),
+    path('posts/<int:pk>/', PostApiView.as_view(), name='post'),
+    path(
+        'posts/<int:pk>/comments/',
+        CommentsApiView.as_view(),
+        name='comments',
+    ),
+    path(
+        'groups/<slug:slug>/posts/',
+        GroupApiView.as_view(),
+        name='group',
+    ),
+    path(
+        'users/<str:username>/posts/',
+        ProfileApiView.as_view(),
+        name='profile',
+    ),
+    path('batch/posts/', PostBatchView.as_view(), name='batch_posts'),
+    path(
+        'batch/comments/',
+        CommentBatchView.as_view(),
+        name='batch_comments',
+    ),
+    path('batch/follows/', FollowBatchView.as_view(), name='batch_follows'),
+]
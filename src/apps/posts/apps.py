@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'apps.posts'
+
+    def ready(self):
+        from apps.posts import checks, signals  # noqa: F401, WPS433
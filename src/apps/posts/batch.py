@@ -0,0 +1,157 @@
+"""Пакетная запись постов, комментариев и подписок.
+
+Каждый элемент проверяется формой (PostForm, CommentForm) или
+справочником из одного запроса на весь пакет. Если хоть один элемент
+неверен, ничего не пишется и возвращаются ошибки с индексами элементов;
+иначе пакет сохраняется bulk_create в одной транзакции, а денормализованные
+данные обновляет refresh_after_bulk.
+"""
+from django.db import transaction
+
+from apps.posts.bulk import bulk_insert, refresh_after_bulk
+from apps.posts.forms import CommentForm, PostForm
+from apps.posts.models import Comment, Follow, Post, User
+
+
+FOLLOW = 'follow'
+UNFOLLOW = 'unfollow'
+
+
+class BatchError(Exception):
+    """Пакет не прошёл проверку; errors — [{'index', 'errors'}, …]."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _error(message, code='invalid'):
+    return [{'message': message, 'code': code}]
+
+
+def _is_id(value):
+    """JSON-число — pk; true и false для Python тоже int, но не pk."""
+
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate(items, validate):
+    """validate(item) → (объект, None) или (None, ошибки по полям)."""
+
+    objs = []
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            obj, item_errors = None, {'__all__': _error('Ожидается объект')}
+        else:
+            obj, item_errors = validate(item)
+        if item_errors:
+            errors.append({'index': index, 'errors': item_errors})
+        objs.append(obj)
+    if errors:
+        raise BatchError(errors)
+    return objs
+
+
+def _validate_form(form_class, item, **fields):
+    form = form_class(data=item)
+    # Форма приняла бы true за pk 1
+    errors = {
+        name: _error('Ожидается число или строка')
+        for name, value in item.items() if isinstance(value, bool)
+    }
+    if not form.is_valid() or errors:
+        return None, dict(form.errors.get_json_data(), **errors)
+    obj = form.save(commit=False)
+    for name, value in fields.items():
+        setattr(obj, name, value)
+    return obj, None
+
+
+def create_posts(user, items):
+    """Создать посты user, вернуть их."""
+
+    posts = _validate(items, lambda item: _validate_form(
+        PostForm, item, author=user,
+    ))
+    with transaction.atomic():
+        bulk_insert(Post, posts)
+        refresh_after_bulk(posts=posts)
+    return posts
+
+
+def create_comments(user, items):
+    """Создать комментарии user к постам item['post'], вернуть их."""
+
+    post_ids = {
+        item.get('post') for item in items if isinstance(item, dict)
+    }
+    existing = set(Post.objects.filter(
+        pk__in=[pk for pk in post_ids if _is_id(pk)],
+    ).values_list('pk', flat=True))
+
+    def validate(item):
+        post_id = item.get('post')
+        comment, errors = _validate_form(
+            CommentForm, item, author=user, post_id=post_id,
+        )
+        if not _is_id(post_id) or post_id not in existing:
+            errors = dict(errors or {}, post=_error('Нет такого поста'))
+        return comment, errors
+
+    comments = _validate(items, validate)
+    with transaction.atomic():
+        bulk_insert(Comment, comments)
+        refresh_after_bulk(comments=comments)
+    return comments
+
+
+def change_follows(user, items):
+    """Подписаться на авторов item['author'] (action 'follow', по
+    умолчанию) или отписаться ('unfollow'). Возвращает имена авторов,
+    подписки на которых появились и пропали."""
+
+    usernames = {
+        item.get('author') for item in items if isinstance(item, dict)
+    }
+    authors = dict(User.objects.filter(
+        username__in=[name for name in usernames if isinstance(name, str)],
+    ).values_list('username', 'pk'))
+
+    def validate(item):
+        errors = {}
+        action = item.get('action', FOLLOW)
+        if action not in {FOLLOW, UNFOLLOW}:
+            errors['action'] = _error('Ожидается follow или unfollow')
+        author_id = authors.get(item.get('author'))
+        if author_id is None:
+            errors['author'] = _error('Нет такого пользователя')
+        elif author_id == user.pk:
+            errors['author'] = _error('Нельзя подписаться на себя')
+        return (action, author_id), errors
+
+    operations = _validate(items, validate)
+    # Для автора действует последняя операция пакета
+    wanted = {author_id: action for action, author_id in operations}
+    with transaction.atomic():
+        following = set(Follow.objects.filter(
+            user=user, author_id__in=list(wanted),
+        ).values_list('author_id', flat=True))
+        follows = [
+            Follow(user=user, author_id=author_id)
+            for author_id, action in wanted.items()
+            if action == FOLLOW and author_id not in following
+        ]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        unfollowed = [
+            author_id for author_id, action in wanted.items()
+            if action == UNFOLLOW and author_id in following
+        ]
+        # Отписка через delete(): сигналы поправят счётчики и ленту
+        Follow.objects.filter(user=user, author_id__in=unfollowed).delete()
+        refresh_after_bulk(follows=follows)
+    names = {pk: name for name, pk in authors.items()}
+    return (
+        sorted(names[follow.author_id] for follow in follows),
+        sorted(names[author_id] for author_id in unfollowed),
+    )
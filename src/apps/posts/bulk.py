@@ -0,0 +1,125 @@
+"""Массовая запись постов, комментариев и подписок.
+
+bulk_create не отправляет сигналы, поэтому после него денормализованные
+данные (счётчики, ленты подписок, поисковый индекс, кэш страниц) надо
+обновить явно — это делает refresh_after_bulk.
+"""
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+from apps.posts import counters, search, timeline
+from apps.posts.cache import author_scope, invalidate, post_scopes
+from apps.posts.models import Comment, Post, User
+
+
+# Запас до лимита SQLite на число параметров запроса (999)
+_CHUNK_SIZE = 500
+
+
+def _chunks(ids):
+    ids = sorted(set(ids))
+    for offset in range(0, len(ids), _CHUNK_SIZE):
+        yield ids[offset:offset + _CHUNK_SIZE]
+
+
+def _reserve_sqlite_ids(model, count):
+    """Занять в sqlite_sequence count идущих подряд pk и вернуть первый.
+
+    Таблицы Django в SQLite создаются с AUTOINCREMENT: UPDATE счётчика
+    сразу берёт блокировку записи, так что параллельный пакет получит
+    другие pk, а pk удалённых строк повторно не выдаются.
+    """
+
+    table = model._meta.db_table  # noqa: WPS437
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s',
+            [count, table],
+        )
+        if not cursor.rowcount:
+            # В таблицу ещё ничего не вставляли
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                [table, count],
+            )
+        cursor.execute(
+            'SELECT seq FROM sqlite_sequence WHERE name = %s', [table],
+        )
+        return cursor.fetchone()[0] - count + 1
+
+
+def bulk_insert(model, objs, batch_size=None):
+    """bulk_create, после которого у всех объектов есть pk.
+
+    SQLite в Django 2.2 не возвращает pk из bulk_create, поэтому там они
+    занимаются заранее в счётчике AUTOINCREMENT внутри транзакции. Без
+    batch_size размер пачки подбирает бэкенд (у SQLite он ограничен числом
+    параметров запроса).
+    """
+
+    objs = list(objs)
+    if connection.features.can_return_ids_from_bulk_insert or not objs:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+    with transaction.atomic():
+        first = _reserve_sqlite_ids(model, len(objs))
+        for offset, obj in enumerate(objs):
+            obj.pk = first + offset
+        model.objects.bulk_create(objs, batch_size=batch_size)
+    return objs
+
+
+@contextmanager
+def explicit_dates():
+    """Сохранять Post.pub_date и Comment.created как есть, а не текущим
+    временем.
+
+    Меняет поля моделей на время блока, поэтому только для
+    management-команд, а не для потоков веб-сервера.
+    """
+
+    fields = [
+        Post._meta.get_field('pub_date'),  # noqa: WPS437
+        Comment._meta.get_field('created'),  # noqa: WPS437
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def refresh_after_bulk(posts=(), comments=(), follows=(), backfill=None):
+    """Обновить денормализованные данные после bulk_insert.
+
+    Новые посты раскладываются по лентам подписчиков и попадают в поиск,
+    новые подписки получают последние посты автора (не больше backfill),
+    счётчики затронутых пользователей и постов пересчитываются.
+    """
+
+    user_ids = {post.author_id for post in posts}
+    user_ids.update(follow.user_id for follow in follows)
+    user_ids.update(follow.author_id for follow in follows)
+    post_ids = {post.pk for post in posts}
+    post_ids.update(comment.post_id for comment in comments)
+
+    scopes = set()
+    for chunk in _chunks(user_ids):
+        users = User.objects.filter(pk__in=chunk)
+        counters.recount_users(users)
+        scopes.update(
+            author_scope(username)
+            for username in users.values_list('username', flat=True)
+        )
+    for chunk in _chunks(post_ids):
+        counters.recount_posts(Post.objects.filter(pk__in=chunk))
+        scopes.update(post_scopes(chunk))
+    if posts:
+        timeline.fan_out_posts(posts)
+        for chunk in _chunks(post.pk for post in posts):
+            search.index_posts(Post.objects.filter(pk__in=chunk))
+    if follows:
+        timeline.backfill_follows(follows, limit=backfill)
+    invalidate(*scopes)
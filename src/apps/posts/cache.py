@@ -0,0 +1,242 @@
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+
+from apps.core import edge
+from apps.posts.models import Group, Post
+
+
+INDEX_PAGE = 'index_page'
+POST_CARD = 'post_card'
+
+_GENERATION_KEY = 'generation:{0}'
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def get_generation(name):
+    """Текущее поколение кэша name — время последнего изменения в
+    миллисекундах.
+
+    Если ключа нет (ещё не было или вытеснен), поколение начинается с
+    текущего времени: оно не откатится к уже использованному и не окажется
+    раньше настоящего изменения.
+    """
+
+    key = _GENERATION_KEY.format(name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _now_ms(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(name):
+    """Сменить поколение: всё, что закэшировано под старым, устаревает.
+
+    Поколение сдвигается атомарным incr не меньше чем до текущего времени.
+    """
+
+    key = _GENERATION_KEY.format(name)
+    current = cache.get(key)
+    if current is None:
+        get_generation(name)
+        return
+    try:
+        cache.incr(key, max(_now_ms() - current, 1))
+    except ValueError:
+        get_generation(name)
+
+
+def author_scope(username):
+    """Поколение страниц, на которых видны посты и счётчики автора."""
+
+    return 'author:{0}'.format(username)
+
+
+def group_scope(slug):
+    return 'group:{0}'.format(slug)
+
+
+def post_scope(post_id):
+    return 'post:{0}'.format(post_id)
+
+
+def post_scopes(post_ids):
+    """Поколения всех страниц, где показаны посты: главной, профилей
+    авторов, групп и самих постов. Один запрос на все post_ids."""
+
+    post_ids = list(post_ids)
+    names = queryset_scopes(Post.objects.filter(pk__in=post_ids))
+    names.update(post_scope(post_id) for post_id in post_ids)
+    return names
+
+
+def queryset_scopes(posts):
+    """post_scopes для queryset постов: одним запросом и без списка pk в
+    параметрах, сколько бы постов ни было."""
+
+    names = {INDEX_PAGE}
+    rows = posts.values_list('pk', 'author__username', 'group__slug')
+    for post_id, username, slug in rows.distinct():
+        names.update((post_scope(post_id), author_scope(username)))
+        if slug:
+            names.add(group_scope(slug))
+    return names
+
+
+def invalidate(*names):
+    """Сбросить поколения сейчас и ещё раз после коммита транзакции.
+
+    Повторный сброс выбрасывает страницы, которые другие процессы успели
+    закэшировать по данным до коммита. После коммита те же имена
+    сбрасываются и в общем кэше перед приложением (apps.core.edge) — они
+    же Surrogate-Key страниц.
+    """
+
+    def bump_all():
+        for name in names:
+            bump_generation(name)
+
+    def commit():
+        bump_all()
+        edge.purge(names)
+
+    bump_all()
+    transaction.on_commit(commit)
+
+
+def cache_page_by_generation(timeout, key_prefix):
+    """cache_page, ключ которого включает поколение key_prefix.
+
+    Кэшируются только страницы посетителей без сессии: они одинаковы для
+    всех. Страница вошедшего пользователя не попадает в кэш и не берётся
+    из него.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not settings.POSTS_GENERATION_CACHE or edge.has_session(
+                request,
+            ):
+                return view_func(request, *args, **kwargs)
+            prefix = '{0}.{1}'.format(key_prefix, get_generation(key_prefix))
+            cached_view = cache_page(timeout, key_prefix=prefix)(view_func)
+            return cached_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class GenerationValidators(object):
+    """ETag и Last-Modified страницы по поколениям scopes.
+
+    ETag — хэш поколений и зрителя (пользователь и CSRF-cookie),
+    Last-Modified — самое свежее поколение. Страница, общая для всех
+    анонимных посетителей (edge.is_shared), и ответ без per_viewer от
+    зрителя не зависят.
+    """
+
+    def __init__(self, scopes, per_viewer=True):
+        self.scopes = scopes
+        self.per_viewer = per_viewer
+
+    def is_per_viewer(self, request):
+        return self.per_viewer and not edge.is_shared(request)
+
+    def generations(self, kwargs):
+        return [get_generation(scope(kwargs)) for scope in self.scopes]
+
+    def etag(self, request, *args, **kwargs):
+        viewer = [None]
+        if self.is_per_viewer(request):
+            viewer = [
+                request.user.pk,
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+            ]
+        payload = repr(self.generations(kwargs) + viewer).encode()
+        return hashlib.md5(payload).hexdigest()  # noqa: S303
+
+    def last_modified(self, request, *args, **kwargs):
+        return datetime.fromtimestamp(
+            max(self.generations(kwargs)) / 1000, tz=timezone.utc,
+        )
+
+
+def condition_by_generation(*scopes, per_viewer=True):
+    """Conditional GET по поколениям кэша.
+
+    scopes — функции kwargs представления → имя поколения, валидаторы
+    считает GenerationValidators (без POSTS_GENERATION_CACHE их нет). На
+    If-None-Match / If-Modified-Since ответ 304 отдаётся без запросов
+    ленты и рендеринга; Vary: Cookie не даёт кэшам отдать страницу одного
+    зрителя другому. per_viewer=False — ответ одинаков для всех, и
+    пользователь не читается.
+
+    Любое изменение данных страницы должно сдвигать одно из её scopes:
+    так, переименование автора сдвигает и поколения групп с его постами
+    (apps.posts.signals).
+    """
+
+    validators = GenerationValidators(scopes, per_viewer)
+
+    def decorator(view_func):
+        conditional_view = condition(
+            validators.etag, validators.last_modified,
+        )(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not settings.POSTS_GENERATION_CACHE:
+                return view_func(request, *args, **kwargs)
+            response = conditional_view(request, *args, **kwargs)
+            if validators.is_per_viewer(request):
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
+
+
+def post_card_key(post, viewer_is_author):
+    """Ключ фрагмента карточки поста, тот же, что у {% cache %} в
+    posts/includes/post_item.html.
+
+    Кроме версии поста в ключе всё, что карточка показывает об авторе и
+    группе: их переименование меняет ключ.
+    """
+
+    group = post.group or Group()
+    return make_template_fragment_key(POST_CARD, [
+        post.pk,
+        post.updated,
+        post.comment_count,
+        post.author.username,
+        group.slug,
+        group.title,
+        viewer_is_author,
+    ])
+
+
+def invalidate_post_card(post):
+    """Удалить закэшированные карточки поста (post из Post.objects.for_feed).
+
+    Изменение текста или числа комментариев и так меняет ключ; явный сброс
+    освобождает кэш от устаревших копий.
+    """
+
+    cache.delete_many([
+        post_card_key(post, viewer_is_author)
+        for viewer_is_author in (True, False)
+    ])
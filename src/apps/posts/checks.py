@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.checks import Warning, register  # noqa: WPS347
+
+
+@register()
+def check_generation_cache(app_configs, **kwargs):
+    """Поколения кэша выключены: кэш свой у каждого процесса."""
+
+    if settings.POSTS_GENERATION_CACHE:
+        return []
+    return [Warning(
+        'Кэш locmem свой у каждого процесса: кэш страниц по поколениям и '
+        'conditional GET выключены.',
+        hint='Задайте DJANGO_CACHE_BACKEND=file или redis.',
+        id='posts.W001',
+    )]
+
+
+@register()
+def check_thumbnail_workers(app_configs, **kwargs):
+    """Миниатюры без пула создаются в потоке запроса."""
+
+    if settings.POSTS_THUMBNAIL_WORKERS:
+        return []
+    return [Warning(
+        'POSTS_THUMBNAIL_WORKERS = 0 — синхронный режим для тестов: '
+        'миниатюры создаются в потоке запроса, сохранившего пост.',
+        hint='Задайте POSTS_THUMBNAIL_WORKERS больше нуля.',
+        id='posts.W002',
+    )]
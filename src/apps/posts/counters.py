@@ -0,0 +1,111 @@
+from itertools import islice
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.posts.models import (
+    Comment,
+    Follow,
+    Post,
+    PostCounters,
+    User,
+    UserCounters,
+)
+
+
+_BATCH_SIZE = 1000
+
+
+def _total(queryset, field):
+    """Подзапрос «количество строк queryset на OuterRef('pk')»."""
+
+    subquery = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field,
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(subquery), 0)
+
+
+def _batched(iterable, size=_BATCH_SIZE):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def _sync(model, key, fields, rows):
+    """Привести строки счётчиков model к rows = [(pk, *values), ...].
+
+    Отсутствующие строки создаются, разошедшиеся — обновляются. Возвращает
+    число исправленных строк.
+    """
+
+    drift = 0
+    for batch in _batched(rows):
+        stored = {
+            row[0]: row[1:]
+            for row in model.objects.filter(
+                **{'{0}__in'.format(key): [row[0] for row in batch]},
+            ).values_list(key, *fields)
+        }
+        missing = []
+        for pk, *values in batch:
+            if pk not in stored:
+                missing.append(model(**{key: pk}, **dict(zip(fields, values))))
+            elif stored[pk] != tuple(values):
+                model.objects.filter(**{key: pk}).update(**dict(zip(fields, values)))
+                drift += 1
+        model.objects.bulk_create(missing)
+        drift += len(missing)
+    return drift
+
+
+def change_user_counters(user_id, **deltas):
+    """Атомарно сдвинуть счётчики пользователя: ``followers=1, posts=-1``."""
+
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    updated = UserCounters.objects.filter(user_id=user_id).update(**changes)
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        recount_users(User.objects.filter(pk=user_id))
+
+
+def change_post_counters(post_id, **deltas):
+    """Атомарно сдвинуть счётчики поста: ``comments=1``."""
+
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    updated = PostCounters.objects.filter(post_id=post_id).update(**changes)
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        recount_posts(Post.objects.filter(pk=post_id))
+
+
+def recount_users(users=None):
+    """Пересчитать счётчики пользователей по реальным данным.
+
+    Возвращает число пользователей, у которых счётчики разошлись с данными.
+    """
+
+    if users is None:
+        users = User.objects.all()
+    rows = users.order_by('pk').annotate(
+        actual_followers=_total(Follow.objects, 'author'),
+        actual_following=_total(Follow.objects, 'user'),
+        actual_posts=_total(Post.objects, 'author'),
+    ).values_list('pk', 'actual_followers', 'actual_following', 'actual_posts')
+    return _sync(
+        UserCounters, 'user_id', ('followers', 'following', 'posts'),
+        rows.iterator(chunk_size=_BATCH_SIZE),
+    )
+
+
+def recount_posts(posts=None):
+    """Пересчитать счётчики постов. Возвращает число исправленных."""
+
+    if posts is None:
+        posts = Post.objects.all()
+    rows = posts.order_by('pk').annotate(
+        actual_comments=_total(Comment.objects, 'post'),
+    ).values_list('pk', 'actual_comments')
+    return _sync(
+        PostCounters, 'post_id', ('comments',),
+        rows.iterator(chunk_size=_BATCH_SIZE),
+    )
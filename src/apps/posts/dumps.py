@@ -0,0 +1,283 @@
+"""Чтение дампов других платформ для apps.posts.importing.
+
+Дамп читается потоком: JSON (массив или NDJSON, в том числе выгрузка
+export_user), CSV или WXR (экспорт WordPress) — и превращается в записи
+трёх видов:
+
+* ``post`` — id, author, group, text, pub_date, image и вложенные
+  comments;
+* ``comment`` — post (id поста в источнике), author, text, created;
+* ``image`` — post и image: вложение, которое становится изображением
+  поста, если своего у него нет.
+
+fetch_image читает изображение записи по URL или пути рядом с дампом.
+"""
+import csv
+import io
+import json
+import os
+import urllib.request
+import xml.etree.ElementTree as ElementTree  # noqa: S405
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.html import strip_tags
+from PIL import Image
+
+
+POST = 'post'
+COMMENT = 'comment'
+IMAGE = 'image'
+
+FORMATS = ('json', 'csv', 'wxr')
+
+_READ_SIZE = 64 * 1024
+_DOWNLOAD_TIMEOUT = 30
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in {'.xml', '.wxr'}:
+        return 'wxr'
+    return 'json'
+
+
+def read_records(stream, dump_format):
+    """Записи дампа по одной. stream — бинарный файл."""
+
+    readers = {
+        'json': _read_json,
+        'csv': _read_csv,
+        'wxr': _read_wxr,
+    }
+    return readers[dump_format](stream)
+
+
+def _json_values(stream):
+    """Объекты JSON-массива или NDJSON по одному, не читая файл целиком."""
+
+    decoder = json.JSONDecoder()
+    stream = io.TextIOWrapper(stream, encoding='utf-8')
+    text = ''
+    for chunk in iter(lambda: stream.read(_READ_SIZE), ''):
+        text += chunk
+        while True:
+            text = text.lstrip(' \t\r\n,[]')
+            try:
+                value, end = decoder.raw_decode(text)
+            except ValueError:
+                break
+            yield value
+            text = text[end:]
+    if text.strip(' \t\r\n,[]'):
+        raise ValueError('Неполный JSON в конце дампа: {0}'.format(
+            text[:80],
+        ))
+
+
+def _read_json(stream):
+    for value in _json_values(stream):
+        record = _json_record(value)
+        if record is not None:
+            yield record
+
+
+def _json_record(value):
+    """Запись из объекта JSON или None, если это не пост и не
+    комментарий."""
+
+    if not isinstance(value, dict):
+        return None
+    kind = value.get('type', POST)
+    if kind == COMMENT:
+        return _comment(value, value.get('post'))
+    if kind != POST:
+        return None
+    record = _post(value)
+    record['comments'] = [
+        _comment(comment, record['id'])
+        for comment in value.get('comments') or ()
+        if isinstance(comment, dict)
+    ]
+    return record
+
+
+def _read_csv(stream):
+    lines = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    for row in csv.DictReader(lines):
+        record = _post(row)
+        record['comments'] = []
+        yield record
+
+
+def _post(value):
+    return {
+        'kind': POST,
+        'id': _text(value.get('id')),
+        'author': value.get('author'),
+        'group': value.get('group'),
+        'text': value.get('text') or '',
+        'pub_date': value.get('pub_date'),
+        'image': value.get('image'),
+    }
+
+
+def _comment(value, post_id):
+    return {
+        'kind': COMMENT,
+        'post': _text(post_id),
+        'author': value.get('author'),
+        'text': value.get('text') or '',
+        'created': value.get('created'),
+    }
+
+
+def _text(value):
+    return None if value in {None, ''} else str(value)
+
+
+def _split_tag(tag):
+    """'{namespace}name' → ('namespace', 'name')."""
+
+    namespace, _, name = tag.rpartition('}')
+    return namespace.lstrip('{'), name
+
+
+def _read_wxr(stream):
+    channel = None
+    for event, elem in ElementTree.iterparse(  # noqa: S314
+        stream, events=('start', 'end'),
+    ):
+        tag = (event, _split_tag(elem.tag)[1])
+        if tag == ('start', 'channel'):
+            channel = elem
+        elif tag == ('end', 'item'):
+            yield from _wxr_item(elem)
+            # Разобранные item больше не нужны: память не растёт с дампом
+            _clear(channel)
+
+
+def _clear(elem):
+    if elem is not None:
+        elem.clear()
+
+
+def _wxr_item(item):
+    fields, group, comments = _wxr_fields(item)
+    if fields.get('post_type') == 'attachment':
+        if fields.get('post_parent', '0') != '0':
+            yield {
+                'kind': IMAGE,
+                'post': fields['post_parent'],
+                'image': fields.get('attachment_url'),
+            }
+    elif _is_published_post(fields):
+        yield _wxr_post(fields, group, comments)
+
+
+def _wxr_fields(item):
+    """Поля item по имени тега (первое значение), рубрика и
+    комментарии."""
+
+    fields = {}
+    group = None
+    comments = []
+    for child in item:
+        namespace, tag = _split_tag(child.tag)
+        if tag == 'encoded' and 'content' not in namespace:
+            continue
+        if tag == 'category' and child.get('domain') == 'category':
+            group = group or (child.text or '').strip() or None
+        elif tag == 'comment':
+            comments.append({
+                _split_tag(part.tag)[1]: part.text or '' for part in child
+            })
+        else:
+            fields.setdefault(tag, child.text or '')
+    return fields, group, comments
+
+
+def _is_published_post(fields):
+    return fields.get('post_type', 'post') == 'post' and (
+        fields.get('status', 'publish') == 'publish'
+    )
+
+
+def _wxr_post(fields, group, comments):
+    post_id = _text(fields.get('post_id'))
+    text = strip_tags(fields.get('encoded', '')).strip()
+    title = fields.get('title', '').strip()
+    return {
+        'kind': POST,
+        'id': post_id,
+        'author': fields.get('creator'),
+        'group': group,
+        'text': '\n\n'.join(filter(None, (title, text))),
+        'pub_date': _wxr_date(fields, 'post_date'),
+        'image': None,
+        'comments': [
+            {
+                'kind': COMMENT,
+                'post': post_id,
+                'author': comment.get('comment_author'),
+                'text': strip_tags(comment.get('comment_content', '')),
+                'created': _wxr_date(comment, 'comment_date'),
+            }
+            for comment in comments
+            if comment.get('comment_approved', '1') == '1'
+        ],
+    }
+
+
+def _wxr_date(fields, name):
+    # В WordPress нулевая дата означает «не задана»
+    for key in ('{0}_gmt'.format(name), name):
+        value = fields.get(key, '')
+        if value and not value.startswith('0000'):
+            return value
+    return None
+
+
+def _is_url(source):
+    return urlparse(source).scheme in {'http', 'https'}
+
+
+def _read_image(stream):
+    """Содержимое stream порциями; ValueError, как только прочитано больше
+    POSTS_IMPORT_MAX_IMAGE_BYTES."""
+
+    limit = settings.POSTS_IMPORT_MAX_IMAGE_BYTES
+    content = io.BytesIO()
+    for chunk in iter(lambda: stream.read(_READ_SIZE), b''):
+        content.write(chunk)
+        if content.tell() > limit:
+            raise ValueError('Изображение больше {0} байт'.format(limit))
+    return content.getvalue()
+
+
+def fetch_image(source, base_dir):
+    """Прочитать изображение по URL или пути относительно base_dir и
+    сохранить в хранилище под posts/. Возвращает имя файла.
+
+    ValueError — изображение больше POSTS_IMPORT_MAX_IMAGE_BYTES.
+    """
+
+    if _is_url(source):
+        with urllib.request.urlopen(  # noqa: S310
+            source, timeout=_DOWNLOAD_TIMEOUT,
+        ) as response:
+            content = _read_image(response)
+    else:
+        with open(os.path.join(base_dir, source), 'rb') as image_file:
+            content = _read_image(image_file)
+    # Страница ошибки вместо картинки не должна стать изображением поста
+    with Image.open(io.BytesIO(content)) as image:
+        image.verify()
+    name = os.path.basename(urlparse(source).path) or 'image'
+    return default_storage.save(
+        'posts/{0}'.format(name), ContentFile(content),
+    )
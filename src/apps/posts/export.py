@@ -0,0 +1,99 @@
+"""Выгрузка постов и комментариев пользователя.
+
+Архив не собирается в памяти: строки читаются из базы курсором
+(.iterator) пачками по CHUNK_SIZE, а NDJSON и zip отдаются генераторами
+байтовых кусков — для StreamingHttpResponse или записи в файл. Память
+не зависит от размера архива.
+"""
+import json
+import zipfile
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from apps.posts.models import Comment, Post
+
+
+CHUNK_SIZE = 2000
+
+_FILE_CHUNK_SIZE = 64 * 1024
+
+_POST_FIELDS = ('id', 'pub_date', 'updated', 'text', 'group__slug', 'image')
+_COMMENT_FIELDS = ('id', 'post_id', 'created', 'text')
+
+
+def _line(kind, row):
+    row['type'] = kind
+    return '{0}\n'.format(
+        json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False),
+    ).encode()
+
+
+def _user_posts(user):
+    return Post.objects.filter(author=user).order_by('pk')
+
+
+def export_ndjson(user):
+    """Строки NDJSON: сначала посты пользователя, затем его комментарии."""
+
+    posts = _user_posts(user).values(*_POST_FIELDS)
+    for post in posts.iterator(chunk_size=CHUNK_SIZE):
+        post['group'] = post.pop('group__slug')
+        yield _line('post', post)
+    comments = Comment.objects.filter(author=user).order_by('pk').values(
+        *_COMMENT_FIELDS,
+    )
+    for comment in comments.iterator(chunk_size=CHUNK_SIZE):
+        comment['post'] = comment.pop('post_id')
+        yield _line('comment', comment)
+
+
+class _ZipStream(object):
+    """Файл только для записи: zipfile пишет, генератор забирает."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, chunk):
+        self.chunks.append(bytes(chunk))
+        return len(chunk)
+
+    def flush(self):
+        """zipfile вызывает flush у потока."""
+
+    def drain(self):
+        if self.chunks:
+            yield b''.join(self.chunks)
+            self.chunks = []
+
+
+def export_zip(user):
+    """Zip с data.ndjson и файлами изображений постов под их именами в
+    хранилище (поле image в NDJSON)."""
+
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('data.ndjson', 'w') as entry:
+            for line in export_ndjson(user):
+                entry.write(line)
+                yield from stream.drain()
+        images = _user_posts(user).exclude(image='').exclude(
+            image=None,
+        ).order_by('image').values_list('image', flat=True).distinct()
+        for name in images.iterator(chunk_size=CHUNK_SIZE):
+            yield from _write_file(archive, stream, name)
+    yield from stream.drain()
+
+
+def _write_file(archive, stream, name):
+    try:
+        source = default_storage.open(name)
+    except OSError:
+        return
+    # Изображения уже сжаты
+    info = zipfile.ZipInfo(name)
+    info.compress_type = zipfile.ZIP_STORED
+    with source, archive.open(info, 'w') as entry:
+        for chunk in source.chunks(_FILE_CHUNK_SIZE):
+            entry.write(chunk)
+            yield from stream.drain()
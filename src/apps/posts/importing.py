@@ -0,0 +1,380 @@
+"""Перенос постов из других платформ.
+
+Записи дампа читает apps.posts.dumps. Importer пишет их пачками через
+bulk_create с исходными датами (explicit_dates), создаёт недостающих
+пользователей и группы, а изображения скачивает или копирует в
+MEDIA_ROOT/posts/ пулом потоков уже после коммита пачки. Позиция в дампе
+(ImportCheckpoint) и соответствие id постов (ImportedPost) пишутся в той
+же транзакции, поэтому прерванный импорт продолжается с первой
+незаписанной пачки, а недокачанные изображения ставятся в очередь заново.
+"""
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.text import slugify
+
+from apps.posts import counters
+from apps.posts.bulk import bulk_insert, explicit_dates, refresh_after_bulk
+from apps.posts.cache import invalidate, post_scopes
+from apps.posts.dumps import COMMENT, IMAGE, POST, fetch_image
+from apps.posts.models import (
+    Comment,
+    Group,
+    ImportCheckpoint,
+    ImportedPost,
+    Post,
+    User,
+)
+
+
+_USERNAME_MAX_LENGTH = 150
+_SLUG_MAX_LENGTH = 50
+_USERNAME_RE = re.compile(r'[^\w.@+-]+')
+# Сколько загрузок на поток может ждать в очереди пула
+_PENDING_PER_WORKER = 4
+
+
+def _parse_date(value, default):
+    """Дата из ISO 8601 или «ГГГГ-ММ-ДД ЧЧ:ММ:СС»; без часового пояса —
+    UTC, только дата — полночь."""
+
+    value = str(value or '').strip()
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None and parse_date(value) is not None:
+            parsed = datetime.combine(parse_date(value), datetime.min.time())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        return default
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+def clean_username(name):
+    username = _USERNAME_RE.sub('_', str(name or '').strip())
+    return username[:_USERNAME_MAX_LENGTH] or 'anonymous'
+
+
+class Importer(object):  # noqa: WPS214, WPS230
+    """Импорт дампа записей dumps.read_records в базу.
+
+    source — имя источника для продолжения после прерывания. Записи без
+    автора получают default_author. workers — потоки загрузки
+    изображений (0 — загружать сразу в основном потоке); очередь пула
+    не длиннее _PENDING_PER_WORKER загрузок на поток. progress(step,
+    done) вызывается после каждой пачки.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        source,
+        base_dir='.',
+        default_author='imported',
+        batch_size=1000,
+        workers=4,
+        images=True,
+        progress=None,
+    ):
+        self.source = source
+        self.base_dir = base_dir
+        self.default_author = default_author
+        self.batch_size = batch_size
+        self.workers = workers
+        self.images = images
+        self.progress = progress or (lambda step, done: None)
+        self.users = {}
+        self.groups = {}
+        self.stats = {
+            'posts': 0,
+            'comments': 0,
+            'skipped': 0,
+            'images': 0,
+            'image_errors': 0,
+        }
+        self.executor = None
+        self.futures = set()
+
+    def run(self, records):
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            source=self.source,
+        )
+        position = checkpoint.position
+        records = islice(records, position, None)
+        if self.workers and self.images:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='import',
+            )
+        try:
+            self._queue_pending_images()
+            with explicit_dates():
+                batch = list(islice(records, self.batch_size))
+                while batch:
+                    position += len(batch)
+                    with transaction.atomic():
+                        queued = self.import_batch(batch)
+                        ImportCheckpoint.objects.filter(
+                            pk=checkpoint.pk,
+                        ).update(position=position)
+                    self._queue_images(queued)
+                    self.progress('records', position)
+                    batch = list(islice(records, self.batch_size))
+            self._drain(0)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+        return self.stats
+
+    def import_batch(self, records):
+        """Записать пачку, вернуть [(ImportedPost.pk, post.pk, адрес
+        изображения)] для загрузки после коммита."""
+
+        posts = [record for record in records if record['kind'] == POST]
+        comments = [
+            record for record in records if record['kind'] == COMMENT
+        ]
+        for post in posts:
+            comments.extend(post['comments'])
+        self._ensure_users(posts + comments)
+        self._ensure_groups(posts)
+
+        imported = self._insert_posts(posts)
+        post_ids = self._post_ids(
+            [comment['post'] for comment in comments] + [
+                record['post'] for record in records
+                if record['kind'] == IMAGE
+            ],
+        )
+        post_ids.update({
+            external_id: link.post_id
+            for external_id, link in imported.items()
+        })
+        inserted_comments = self._insert_comments(comments, post_ids)
+        refresh_after_bulk(
+            posts=[link.post for link in imported.values()],
+            comments=inserted_comments,
+        )
+        queued = [
+            (link.pk, link.post_id, link.image_source)
+            for link in imported.values() if link.image_source
+        ]
+        queued.extend(self._attach_images(records, post_ids))
+        return queued
+
+    def _ensure_users(self, records):
+        names = {
+            clean_username(record['author'] or self.default_author)
+            for record in records
+        }
+        for record in records:
+            record['author'] = clean_username(
+                record['author'] or self.default_author,
+            )
+        names.difference_update(self.users)
+        if not names:
+            return
+        self.users.update(User.objects.filter(
+            username__in=names,
+        ).values_list('username', 'pk'))
+        missing = sorted(names.difference(self.users))
+        if not missing:
+            return
+        password = make_password(None)
+        created = bulk_insert(User, (
+            User(username=name, password=password) for name in missing
+        ))
+        self.users.update((user.username, user.pk) for user in created)
+        counters.recount_users(
+            User.objects.filter(pk__in=[user.pk for user in created]),
+        )
+
+    def _ensure_groups(self, posts):
+        """Группы по slug или названию; новые получают уникальный slug."""
+
+        names = {
+            post['group'] for post in posts
+            if post['group'] and post['group'] not in self.groups
+        }
+        if not names:
+            return
+        self.groups.update(Group.objects.filter(
+            slug__in=names,
+        ).values_list('slug', 'pk'))
+        for title, pk in Group.objects.filter(
+            title__in=names,
+        ).values_list('title', 'pk'):
+            self.groups.setdefault(title, pk)
+        max_length = Group._meta.get_field('title').max_length  # noqa: WPS437
+        for name in sorted(names.difference(self.groups)):
+            group = Group.objects.create(
+                title=name[:max_length],
+                slug=self._unique_slug(name),
+                description='',
+            )
+            self.groups[name] = group.pk
+
+    def _unique_slug(self, title):
+        base = slugify(title)[:_SLUG_MAX_LENGTH - 10] or 'group'
+        slug = base
+        number = 1
+        while Group.objects.filter(slug=slug).exists():
+            number += 1
+            slug = '{0}-{1}'.format(base, number)
+        return slug
+
+    def _insert_posts(self, records):
+        """Вставить посты, которых ещё нет в ImportedPost; вернуть
+        {внешний id: ImportedPost}."""
+
+        known = set(ImportedPost.objects.filter(
+            source=self.source,
+            external_id__in=[
+                record['id'] for record in records if record['id']
+            ],
+        ).values_list('external_id', flat=True))
+        now = timezone.now()
+        fresh = []
+        for record in records:
+            if record['id'] in known or not record['text'].strip():
+                self.stats['skipped'] += 1
+                continue
+            if record['id']:
+                known.add(record['id'])
+            fresh.append(record)
+        posts = bulk_insert(Post, (
+            Post(
+                text=record['text'],
+                author_id=self.users[record['author']],
+                group_id=self.groups.get(record['group']),
+                pub_date=_parse_date(record['pub_date'], now),
+            )
+            for record in fresh
+        ))
+        links = bulk_insert(ImportedPost, (
+            ImportedPost(
+                source=self.source,
+                external_id=record['id'] or 'pk:{0}'.format(post.pk),
+                post=post,
+                image_source=(record['image'] or '') if self.images else '',
+            )
+            for record, post in zip(fresh, posts)
+        ))
+        self.stats['posts'] += len(posts)
+        return {link.external_id: link for link in links}
+
+    def _post_ids(self, external_ids):
+        post_ids = {}
+        external_ids = sorted({pk for pk in external_ids if pk})
+        for offset in range(0, len(external_ids), self.batch_size):
+            post_ids.update(ImportedPost.objects.filter(
+                source=self.source,
+                external_id__in=external_ids[
+                    offset:offset + self.batch_size
+                ],
+            ).values_list('external_id', 'post_id'))
+        return post_ids
+
+    def _insert_comments(self, records, post_ids):
+        now = timezone.now()
+        comments = []
+        for record in records:
+            post_id = post_ids.get(record['post'])
+            if post_id is None or not record['text'].strip():
+                self.stats['skipped'] += 1
+                continue
+            comments.append(Comment(
+                post_id=post_id,
+                author_id=self.users[record['author']],
+                text=record['text'],
+                created=_parse_date(record['created'], now),
+            ))
+        bulk_insert(Comment, comments)
+        self.stats['comments'] += len(comments)
+        return comments
+
+    def _attach_images(self, records, post_ids):
+        """Вложения WXR: изображение поста, если у него ещё нет своего."""
+
+        if not self.images:
+            return []
+        attachments = {}
+        for record in records:
+            post_id = post_ids.get(record['post']) if (
+                record['kind'] == IMAGE and record['image']
+            ) else None
+            if post_id is not None:
+                attachments.setdefault(post_id, record['image'])
+        links = list(ImportedPost.objects.filter(
+            Q(post__image='') | Q(post__image=None),
+            post_id__in=list(attachments),
+            image_source='',
+        ).only('pk', 'post_id'))
+        for link in links:
+            link.image_source = attachments[link.post_id]
+        ImportedPost.objects.bulk_update(links, ['image_source'])
+        return [
+            (link.pk, link.post_id, link.image_source) for link in links
+        ]
+
+    def _queue_pending_images(self):
+        """Изображения, не загруженные прошлым запуском."""
+
+        if not self.images:
+            return
+        self._queue_images(ImportedPost.objects.filter(
+            source=self.source,
+        ).exclude(image_source='').values_list(
+            'pk', 'post_id', 'image_source',
+        ))
+
+    def _queue_images(self, queued):
+        for job in queued:
+            if self.executor is None:
+                self._count_image(self._download(*job))
+                continue
+            self.futures.add(self.executor.submit(
+                self._download_in_thread, *job,
+            ))
+            self._drain(self.workers * _PENDING_PER_WORKER)
+
+    def _drain(self, limit):
+        """Дождаться загрузок, пока в очереди не останется limit."""
+
+        while len(self.futures) > limit:
+            done, pending = wait(self.futures, return_when=FIRST_COMPLETED)
+            self.futures = pending
+            for future in done:
+                self._count_image(future.result())
+
+    def _count_image(self, ok):
+        self.stats['images' if ok else 'image_errors'] += 1
+
+    def _download_in_thread(self, link_id, post_id, source):
+        # Соединение потока пула закрывается сразу: Django закрывает
+        # соединения только в потоках запросов
+        try:
+            return self._download(link_id, post_id, source)
+        finally:
+            connection.close()
+
+    def _download(self, link_id, post_id, source):
+        try:
+            name = fetch_image(source, self.base_dir)
+        except (OSError, ValueError, SyntaxError):
+            # Ошибка остаётся в image_source: повторится при перезапуске
+            return False
+        with transaction.atomic():
+            Post.objects.filter(pk=post_id).update(
+                image=name, updated=timezone.now(),
+            )
+            ImportedPost.objects.filter(pk=link_id).update(image_source='')
+            invalidate(*post_scopes([post_id]))
+        return True
@@ -0,0 +1,294 @@
+import json
+import logging
+import platform
+import subprocess  # noqa: S404
+import time
+from http import HTTPStatus
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core.benchmarks import percentile, temporary_database
+from apps.core.metrics import RequestMetrics
+from apps.posts.models import Group, Post, User
+from apps.posts.seeding import Seeder
+
+
+SCENARIOS = (
+    'index',
+    'follow_index',
+    'profile',
+    'group',
+    'post_detail',
+    'add_comment',
+    'profile_follow',
+    'api_index',
+    'api_post',
+)
+
+_DATASET = (
+    ('users', 1000),
+    ('groups', 20),
+    ('posts', 20000),
+    ('comments', 50000),
+    ('follows', 20000),
+    ('images', 50),
+)
+
+
+class _Scenario(object):
+    def __init__(self, client, url, method='get', data=None, reset=None):
+        self.client = client
+        self.url = url
+        self.method = method
+        self.data = data
+        self.reset = reset
+
+    def request(self):
+        response = getattr(self.client, self.method)(self.url, self.data)
+        expected = HTTPStatus.FOUND if self.method == 'post' else (
+            HTTPStatus.OK
+        )
+        if response.status_code != expected:
+            raise CommandError('{0} {1}: ответ {2}'.format(
+                self.method.upper(), self.url, response.status_code,
+            ))
+
+    def finish(self):
+        if self.reset is not None:
+            self.reset()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(  # noqa: S603, S607
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True, check=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест горячих путей ленты: заполняет временную базу '
+        'синтетическими данными и замеряет пропускную способность, задержку '
+        'и число запросов к базе для каждого сценария. Результат — JSON, '
+        'который можно сравнить с прошлым прогоном (--compare).'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in _DATASET:
+            parser.add_argument(
+                '--{0}'.format(name), type=int, default=default,
+                help='Размер данных: {0} (по умолчанию {1})'.format(
+                    name, default,
+                ),
+            )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--iterations', type=int, default=50,
+            help='Замеряемых запросов на сценарий',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Прогревочных запросов на сценарий',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--scenario', action='append', choices=SCENARIOS,
+            help='Запустить только эти сценарии',
+        )
+        parser.add_argument('--output', help='Записать JSON в файл')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+        dataset = {name: options[name] for name, _ in _DATASET}
+
+        with temporary_database():
+            cache.clear()
+            self.stderr.write('Генерация данных: {0}'.format(dataset))
+            started = time.perf_counter()
+            Seeder(seed=options['seed'], **dataset).run()
+            self.stderr.write('Готово за {0:.1f} с'.format(
+                time.perf_counter() - started,
+            ))
+            scenarios = self._scenarios()
+            results = {}
+            for name in options['scenario'] or SCENARIOS:
+                results[name] = self._measure(scenarios[name], options)
+                self.stderr.write('{0}: p50 {1} мс, запросов {2}'.format(
+                    name,
+                    results[name]['latency_ms']['p50'],
+                    results[name]['queries']['mean'],
+                ))
+            cache.clear()
+
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'dataset': dataset,
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'cold': options['cold'],
+            },
+            'scenarios': results,
+        }
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(text)
+        else:
+            self.stdout.write(text)
+        if baseline is not None:
+            self._compare(baseline['scenarios'], results)
+
+    def _scenarios(self):
+        # Самые тяжёлые страницы набора: больше всего подписок, постов,
+        # комментариев
+        reader = User.objects.order_by('-counters__following', 'pk').first()
+        author = User.objects.order_by('-counters__posts', 'pk').first()
+        group = Group.objects.annotate(
+            size=Count('posts'),
+        ).order_by('-size', 'pk').first()
+        post = Post.objects.select_related('author').order_by(
+            '-counters__comments', 'pk',
+        ).first()
+        if None in {reader, author, group, post}:
+            raise CommandError('Слишком мало данных для сценариев')
+        target = User.objects.exclude(pk=reader.pk).exclude(
+            following__user=reader,
+        ).order_by('pk').first()
+
+        anonymous = Client(HTTP_HOST='localhost')
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(reader)
+        post_kwargs = {'username': post.author.username, 'pk': post.pk}
+        return {
+            'index': _Scenario(anonymous, reverse('posts:index')),
+            'follow_index': _Scenario(client, reverse('posts:follow_index')),
+            'profile': _Scenario(client, reverse(
+                'posts:profile', kwargs={'username': author.username},
+            )),
+            'group': _Scenario(anonymous, reverse(
+                'posts:group', kwargs={'slug': group.slug},
+            )),
+            'post_detail': _Scenario(
+                client, reverse('posts:post', kwargs=post_kwargs),
+            ),
+            'add_comment': _Scenario(
+                client,
+                reverse('posts:add_comment', kwargs=post_kwargs),
+                method='post',
+                data={'text': 'Комментарий нагрузочного теста'},
+            ),
+            'api_index': _Scenario(anonymous, reverse('api:index')),
+            'api_post': _Scenario(
+                anonymous, reverse('api:post', kwargs={'pk': post.pk}),
+            ),
+            # Между замерами подписка снимается, чтобы каждый раз
+            # оформлялась заново
+            'profile_follow': _Scenario(
+                client,
+                reverse(
+                    'posts:profile_follow',
+                    kwargs={'username': target.username},
+                ),
+                method='post',
+                reset=lambda: client.post(reverse(
+                    'posts:profile_unfollow',
+                    kwargs={'username': target.username},
+                )),
+            ),
+        }
+
+    def _measure(self, scenario, options):
+        # Число запросов попадает в отчёт, предупреждения о бюджете
+        # запросов (apps.core.metrics) на каждый запрос не нужны
+        logging.disable(logging.WARNING)
+        try:
+            return self._run(scenario, options)
+        finally:
+            logging.disable(logging.NOTSET)
+
+    def _run(self, scenario, options):
+        for _ in range(options['warmup']):
+            scenario.request()
+            scenario.finish()
+        latencies = []
+        queries = []
+        for _ in range(options['iterations']):  # noqa: WPS122
+            if options['cold']:
+                cache.clear()
+            metrics = RequestMetrics()
+            with connection.execute_wrapper(metrics):
+                started = time.perf_counter()
+                scenario.request()
+                latencies.append(time.perf_counter() - started)
+            queries.append(metrics.queries)
+            scenario.finish()
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'throughput_rps': _round(len(latencies) / sum(latencies)),
+            'latency_ms': {
+                'mean': _ms(sum(latencies) / len(latencies)),
+                'p50': _ms(percentile(latencies, 0.5)),
+                'p95': _ms(percentile(latencies, 0.95)),
+                'max': _ms(latencies[-1]),
+            },
+            'queries': {
+                'mean': _round(sum(queries) / len(queries)),
+                'max': max(queries),
+            },
+        }
+
+    def _compare(self, before, after):
+        self.stderr.write(self.style.MIGRATE_HEADING(
+            'Сравнение с прошлым прогоном (p50, мс / запросов к базе)',
+        ))
+        for name, result in after.items():
+            if name not in before:
+                continue
+            old = before[name]
+            old_p50 = old['latency_ms']['p50']
+            new_p50 = result['latency_ms']['p50']
+            change = (new_p50 - old_p50) / old_p50 * 100 if old_p50 else 0
+            line = '  {0:<15} {1:>8} -> {2:<8} ({3:+.0f}%)  {4} -> {5}'.format(
+                name, old_p50, new_p50, change,
+                old['queries']['mean'], result['queries']['mean'],
+            )
+            slower = change > 10 or (
+                result['queries']['mean'] > old['queries']['mean']
+            )
+            self.stderr.write(
+                self.style.WARNING(line) if slower else line,
+            )
+
+
+def _round(number):
+    return round(number, 2)
+
+
+def _ms(seconds):
+    return _round(seconds * 1000)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.posts.models import User
+from apps.posts.tokens import create_token
+
+
+class Command(BaseCommand):
+    help = (
+        'Создать ключ пакетного API для пользователя. Ключ печатается '
+        'один раз: в базе хранится только его хэш.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--name', default='', help='Чей это ключ')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError('Нет пользователя {0}'.format(
+                options['username'],
+            ))
+        self.stdout.write(create_token(user, options['name']))
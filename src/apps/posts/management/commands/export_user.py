@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.posts.export import export_ndjson, export_zip
+from apps.posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгрузить посты и комментарии пользователя в NDJSON или zip с '
+        'изображениями. Данные читаются курсором и пишутся по мере чтения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--format', choices=('ndjson', 'zip'), default='ndjson',
+        )
+        parser.add_argument(
+            '--output', help='Файл архива (по умолчанию stdout)',
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError('Нет пользователя {0}'.format(
+                options['username'],
+            ))
+        export = export_zip if options['format'] == 'zip' else export_ndjson
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                self._write(export(user), output)
+        else:
+            self._write(export(user), sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+
+    def _write(self, chunks, output):
+        for chunk in chunks:
+            output.write(chunk)
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from apps.posts.cache import invalidate, post_scopes
+from apps.posts.models import Post
+from apps.posts.thumbnails import CARD_DERIVATIVES, generate_thumbnails
+
+
+def _generate(post_id):
+    close_old_connections()
+    try:
+        generate_thumbnails(post_id, touch=False)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Создать миниатюры и производные (srcset) для изображений постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число потоков генерации',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Сколько постов обрабатывать за раз',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(
+            image__isnull=True,
+        ).order_by('pk')
+        self.stdout.write('Производных на изображение: {0}'.format(
+            len(CARD_DERIVATIVES) + 1,
+        ))
+
+        done = 0
+        last_pk = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                batch = list(
+                    posts.filter(pk__gt=last_pk).values_list(
+                        'pk', flat=True,
+                    )[:options['batch_size']],
+                )
+                if not batch:
+                    break
+                for post_id, error in zip(batch, self._run(executor, batch)):
+                    if error is not None:
+                        self.stderr.write('Пост {0}: {1}'.format(post_id, error))
+                Post.objects.filter(pk__in=batch).update(
+                    updated=timezone.now(),
+                )
+                invalidate(*post_scopes(batch))
+                done += len(batch)
+                last_pk = batch[-1]
+                self.stdout.write('Обработано постов: {0}'.format(done))
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def _run(self, executor, batch):
+        futures = [executor.submit(_generate, post_id) for post_id in batch]
+        return [future.exception() for future in futures]
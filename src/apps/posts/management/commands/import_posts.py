@@ -0,0 +1,79 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.posts.dumps import FORMATS, detect_format, read_records
+from apps.posts.importing import Importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортировать посты и комментарии из дампа другой платформы: '
+        'JSON/NDJSON, CSV или WXR (WordPress). Записи пишутся пачками '
+        'с исходными датами, изображения скачиваются пулом потоков. '
+        'Повторный запуск с тем же --source продолжает прерванный импорт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл дампа')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат дампа (по умолчанию — по расширению файла)',
+        )
+        parser.add_argument(
+            '--source',
+            help='Имя источника для продолжения (по умолчанию путь дампа)',
+        )
+        parser.add_argument(
+            '--author', default='imported',
+            help='Автор записей, у которых он не указан',
+        )
+        parser.add_argument(
+            '--media-dir',
+            help='Откуда брать изображения с относительными путями '
+            '(по умолчанию каталог дампа)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Потоков загрузки изображений (0 — без пула)',
+        )
+        parser.add_argument(
+            '--skip-images', action='store_true',
+            help='Не загружать изображения',
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.isfile(path):
+            raise CommandError('Нет файла {0}'.format(path))
+        started = time.perf_counter()
+        importer = Importer(
+            source=options['source'] or path,
+            base_dir=options['media_dir'] or os.path.dirname(path),
+            default_author=options['author'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            images=not options['skip_images'],
+            progress=self.progress,
+        )
+        dump_format = options['format'] or detect_format(path)
+        with open(path, 'rb') as dump:
+            try:
+                stats = importer.run(read_records(dump, dump_format))
+            except (ValueError, SyntaxError) as error:
+                raise CommandError('Не удалось разобрать дамп: {0}'.format(
+                    error,
+                ))
+        self.stdout.write(self.style.SUCCESS(
+            'Готово за {0:.0f} с: постов {1[posts]}, комментариев '
+            '{1[comments]}, пропущено {1[skipped]}, изображений '
+            '{1[images]}, ошибок загрузки {1[image_errors]}'.format(
+                time.perf_counter() - started, stats,
+            ),
+        ))
+
+    def progress(self, step, done):
+        self.stdout.write('{0}: {1}'.format(step, done))
+        self.stdout.flush()
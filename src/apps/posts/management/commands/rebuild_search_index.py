@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.posts.models import Post
+from apps.posts.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать полнотекстовый индекс постов'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild(Post.objects.order_by('pk'))
+        self.stdout.write(self.style.SUCCESS(
+            'Проиндексировано постов: {0}'.format(total),
+        ))
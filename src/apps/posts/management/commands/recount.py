@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.posts.counters import recount_posts, recount_users
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать денормализованные счётчики пользователей и постов'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = recount_users()
+            posts = recount_posts()
+        self.stdout.write(self.style.SUCCESS(
+            'Исправлено счётчиков: пользователей {0}, постов {1}'.format(
+                users, posts,
+            ),
+        ))
@@ -0,0 +1,111 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.posts.models import User
+from apps.posts.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполнить базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для нагрузочных тестов и стендов. '
+        'Данные пишутся пачками через bulk_create, счётчики, ленты подписок '
+        'и поисковый индекс строятся после загрузки.'
+    )
+
+    def add_arguments(self, parser):
+        counts = parser.add_argument_group('количество')
+        counts.add_argument('--users', type=int, default=10000)
+        counts.add_argument('--groups', type=int, default=100)
+        counts.add_argument('--posts', type=int, default=100000)
+        counts.add_argument('--comments', type=int, default=500000)
+        counts.add_argument('--follows', type=int, default=200000)
+        counts.add_argument(
+            '--images', type=int, default=0,
+            help='Примерное число постов с изображениями',
+        )
+        counts.add_argument(
+            '--image-pool', type=int, default=20,
+            help='Сколько разных файлов изображений сгенерировать',
+        )
+
+        shape = parser.add_argument_group('распределения')
+        shape.add_argument(
+            '--author-skew', type=float, default=1.0,
+            help='Степень закона популярности авторов (подписчики и посты)',
+        )
+        shape.add_argument(
+            '--group-skew', type=float, default=1.0,
+            help='Степень закона размеров групп',
+        )
+        shape.add_argument(
+            '--comment-skew', type=float, default=1.2,
+            help='Степень закона числа комментариев у постов',
+        )
+        shape.add_argument(
+            '--comment-burst', type=int, default=3 * 3600,
+            help='Среднее время до комментария после публикации, секунд',
+        )
+        shape.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до сегодня распределить посты',
+        )
+
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='user',
+            help='Префикс имён пользователей и адресов групп',
+        )
+        parser.add_argument(
+            '--password',
+            help='Общий пароль пользователей (по умолчанию вход невозможен)',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+            username__startswith=options['prefix'],
+        ).exists():
+            raise CommandError(
+                'Пользователи с префиксом «{0}» уже есть, укажите другой '
+                '--prefix'.format(options['prefix']),
+            )
+        self.started = time.perf_counter()
+        self.step = None
+        Seeder(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            images=options['images'],
+            image_pool=options['image_pool'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            password=options['password'],
+            days=options['days'],
+            author_skew=options['author_skew'],
+            group_skew=options['group_skew'],
+            comment_skew=options['comment_skew'],
+            comment_burst=options['comment_burst'],
+            batch_size=options['batch_size'],
+            progress=self.progress,
+        ).run()
+        self.stdout.write(self.style.SUCCESS('Готово за {0:.0f} с'.format(
+            time.perf_counter() - self.started,
+        )))
+
+    def progress(self, step, done, total):
+        now = time.perf_counter()
+        if step != self.step:
+            self.step = step
+            self.step_started = now
+        elapsed = now - self.step_started
+        self.stdout.write(
+            '{0:<10} {1:>10}/{2:<10} {3:>4.0%}  {4:>8.0f} строк/с'.format(
+                step, done, total, done / total if total else 1,
+                done / elapsed if elapsed else 0,
+            ),
+        )
+        self.stdout.flush()
@@ -0,0 +1,150 @@
+import threading
+import time
+from http import HTTPStatus
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from apps.core.benchmarks import percentile, temporary_database
+from apps.posts.models import Post, User
+
+
+# Настройки SQLite по умолчанию: журнал отката блокирует чтение на время
+# записи, а без busy_timeout и BEGIN IMMEDIATE конкурирующая запись сразу
+# получает ошибку
+_BASELINE = {  # noqa: WPS407
+    'SQLITE_PRAGMAS': {
+        'journal_mode': 'delete',
+        'synchronous': 'full',
+        'busy_timeout': 0,
+    },
+    'SQLITE_TRANSACTION_MODE': 'DEFERRED',
+}
+
+
+class _Stats(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {'read': 0, 'write': 0}
+        self.errors = 0
+        self.latencies = []
+
+    def add(self, kind, latency, error):
+        with self.lock:
+            if error:
+                self.errors += 1
+            else:
+                self.requests[kind] += 1
+                self.latencies.append(latency)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест SQLite: параллельные комментарии (AddCommentView) '
+        'и чтение главной (IndexListView) с настройками SQLite по умолчанию '
+        'и с SQLITE_PRAGMAS. Работает на временной копии схемы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--readers', type=int, default=4,
+            help='Потоков чтения главной страницы',
+        )
+        parser.add_argument(
+            '--writers', type=int, default=4,
+            help='Потоков добавления комментариев',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=5,
+            help='Длительность каждого прогона в секундах',
+        )
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            post = self._create_fixtures()
+            connections.close_all()
+            for title, profile in (
+                ('SQLite по умолчанию', _BASELINE),
+                ('SQLITE_PRAGMAS', {}),
+            ):
+                with override_settings(**profile):
+                    stats = self._run(post, options)
+                connections.close_all()
+                self._report(title, stats, options['duration'])
+
+    def _create_fixtures(self):
+        author = User.objects.create_user(username='benchmark')
+        for number in range(50):
+            post = Post.objects.create(
+                text='Пост для нагрузочного теста {0}'.format(number),
+                author=author,
+            )
+        return post
+
+    def _run(self, post, options):
+        # Режим журнала переключается первым соединением профиля
+        connection.ensure_connection()
+        connection.close()
+        stats = _Stats()
+        readers = [
+            (Client(HTTP_HOST='localhost'), 'read', reverse('posts:index'))
+            for _ in range(options['readers'])
+        ]
+        writers = []
+        for _ in range(options['writers']):
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(post.author)
+            writers.append((client, 'write', reverse(
+                'posts:add_comment',
+                kwargs={'username': post.author.username, 'pk': post.pk},
+            )))
+        connection.close()
+
+        deadline = time.monotonic() + options['duration']
+        workers = [
+            threading.Thread(target=self._work, args=(stats, deadline) + job)
+            for job in readers + writers
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return stats
+
+    def _work(self, stats, deadline, client, kind, url):
+        try:
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                try:
+                    if kind == 'write':
+                        response = client.post(url, {'text': 'Комментарий'})
+                        ok = response.status_code == HTTPStatus.FOUND and (
+                            'login' not in response['Location']
+                        )
+                    else:
+                        # Уникальный параметр запроса обходит кэш страницы
+                        response = client.get(url, {'nocache': started})
+                        ok = response.status_code == HTTPStatus.OK
+                except OperationalError:
+                    ok = False
+                stats.add(kind, time.monotonic() - started, not ok)
+        finally:
+            connection.close()
+
+    def _report(self, title, stats, duration):
+        latencies = sorted(stats.latencies)
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(
+            '  чтений/с: {0:.1f}, записей/с: {1:.1f}, '
+            'ошибок: {2}'.format(
+                stats.requests['read'] / duration,
+                stats.requests['write'] / duration,
+                stats.errors,
+            ),
+        )
+        self.stdout.write('  задержка p50: {0:.1f} мс, p95: {1:.1f} мс'.format(
+            percentile(latencies, 0.5) * 1000,
+            percentile(latencies, 0.95) * 1000,
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from apps.posts.models import User
+from apps.posts.timeline import trim_timelines
+
+
+_USERS_PER_BATCH = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Оставить в лентах подписок по POSTS_TIMELINE_LENGTH новейших '
+        'записей'
+    )
+
+    def handle(self, *args, **options):
+        last_id = User.objects.aggregate(last=Max('pk'))['last'] or 0
+        deleted = 0
+        for first_id in range(1, last_id + 1, _USERS_PER_BATCH):
+            with transaction.atomic():
+                deleted += trim_timelines(
+                    first_id, first_id + _USERS_PER_BATCH - 1,
+                )
+        self.stdout.write(self.style.SUCCESS(
+            'Удалено записей лент: {0}'.format(deleted),
+        ))
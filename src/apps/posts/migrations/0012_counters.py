@@ -0,0 +1,86 @@
+# Generated by Django 2.2.28 on 2026-10-18 21:05
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def _total(model, field):
+    subquery = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+        field,
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(subquery), 0)
+
+
+def _bulk_create(model, objs, batch_size=1000):
+    objs = iter(objs)
+    batch = list(islice(objs, batch_size))
+    while batch:
+        model.objects.bulk_create(batch)
+        batch = list(islice(objs, batch_size))
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    PostCounters = apps.get_model('posts', 'PostCounters')
+
+    users = User.objects.order_by('pk').annotate(
+        actual_followers=_total(Follow, 'author'),
+        actual_following=_total(Follow, 'user'),
+        actual_posts=_total(Post, 'author'),
+    ).values_list('pk', 'actual_followers', 'actual_following', 'actual_posts')
+    _bulk_create(
+        UserCounters,
+        (
+            UserCounters(
+                user_id=pk, followers=followers, following=following, posts=posts,
+            )
+            for pk, followers, following, posts in users.iterator()
+        ),
+    )
+    posts = Post.objects.order_by('pk').annotate(
+        actual_comments=_total(Comment, 'post'),
+    ).values_list('pk', 'actual_comments')
+    _bulk_create(
+        PostCounters,
+        (
+            PostCounters(post_id=pk, comments=comments)
+            for pk, comments in posts.iterator()
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_auto_20200809_1349'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCounters',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to='posts.Post')),
+                ('comments', models.IntegerField(default=0, verbose_name='Комментариев')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers', models.IntegerField(default=0, verbose_name='Подписчиков')),
+                ('following', models.IntegerField(default=0, verbose_name='Подписок')),
+                ('posts', models.IntegerField(default=0, verbose_name='Записей')),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
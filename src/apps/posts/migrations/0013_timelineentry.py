@@ -0,0 +1,66 @@
+# Generated by Django 2.2.28 on 2026-10-18 21:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+_BACKFILL = 100
+
+# Тот же INSERT … SELECT, что в apps.posts.timeline.backfill_authors, по
+# всем подпискам сразу: новая таблица пуста, проверять дубли не нужно
+_FILL_SQL = """
+    INSERT INTO {timeline} (user_id, post_id, author_id, pub_date)
+    SELECT follow.user_id, post.id, post.author_id, post.pub_date
+    FROM {follow} follow
+    JOIN (
+        SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+            PARTITION BY author_id ORDER BY pub_date DESC
+        ) AS position
+        FROM {post}
+    ) post ON post.author_id = follow.author_id AND post.position <= %s
+"""
+
+
+def fill_timelines(apps, schema_editor):
+    sql = _FILL_SQL.format(
+        timeline=apps.get_model('posts', 'TimelineEntry')._meta.db_table,
+        follow=apps.get_model('posts', 'Follow')._meta.db_table,
+        post=apps.get_model('posts', 'Post')._meta.db_table,
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql, [_BACKFILL])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_user_post'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
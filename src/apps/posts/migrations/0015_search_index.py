@@ -0,0 +1,42 @@
+from django.db import migrations
+
+from apps.posts.search import get_backend
+
+
+def create_search_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    Post = apps.get_model('posts', 'Post')
+    rows = Post.objects.using(schema_editor.connection.alias).values_list(
+        'pk', 'text', 'group__title',
+    )
+    with schema_editor.connection.cursor() as cursor:
+        backend.create(cursor)
+        batch = []
+        for row in rows.iterator(chunk_size=500):
+            batch.append(row)
+            if len(batch) == 500:
+                backend.upsert(cursor, batch)
+                batch = []
+        if batch:
+            backend.upsert(cursor, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_timeline_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='card_images',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 
 
@@ -17,17 +18,32 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор и группа одним JOIN'ом, число комментариев
+        аннотацией — страница рендерится за постоянное число запросов."""
+
+        return self.select_related('author', 'group').annotate(
+            comment_count=Coalesce(models.F('counters__comments'), 0),
+        )
+
+
 class Post(models.Model):
 
     text = models.TextField(verbose_name='Текст поста')
     pub_date = models.DateTimeField(
         auto_now_add=True, db_index=True, verbose_name='Дата публикации поста',
     )
+    updated = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения поста',
+    )
+    # Поиск по автору и группе покрывают составные индексы из Meta
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='posts',
         verbose_name='Автор поста',
+        db_index=False,
     )
     group = models.ForeignKey(
         Group,
@@ -36,13 +52,32 @@ class Post(models.Model):
         null=True,
         related_name='posts',
         verbose_name='Группа',
+        db_index=False,
     )
     image = models.ImageField(
         upload_to='posts/', blank=True, null=True, verbose_name='Изображение',
     )
+    # Имена готовых миниатюры и производных карточки (JSON), пишет
+    # apps.posts.thumbnails.generate_thumbnails: карточка рендерится без
+    # обращений к хранилищу ключей sorl
+    card_images = models.TextField(blank=True, default='', editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta(object):
         ordering = ['-pub_date']
+        # Ленты группы и автора читаются диапазоном индекса в порядке
+        # (-pub_date, -id) keyset-паджинатора, без сортировки
+        indexes = [
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -56,7 +91,10 @@ class Post(models.Model):
 
 class Comment(models.Model):
     post = models.ForeignKey(
-        Post, on_delete=models.CASCADE, related_name='comments',
+        Post,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        db_index=False,
     )
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='comments',
@@ -64,6 +102,15 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField('comment created date', auto_now_add=True)
 
+    class Meta(object):
+        ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
     def get_absolute_url(self):
         return reverse(
             'posts:post',
@@ -75,14 +122,28 @@ class Comment(models.Model):
 
 
 class Follow(models.Model):
+    # (user, author) покрывает уникальный индекс, (author, user) — индекс
+    # из Meta для выборки подписчиков при раскладке ленты
     user = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name='follower',
+        User,
+        on_delete=models.CASCADE,
+        related_name='follower',
+        db_index=False,
     )
     author = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name='following',
+        User,
+        on_delete=models.CASCADE,
+        related_name='following',
+        db_index=False,
     )
 
     class Meta(object):
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
@@ -93,3 +154,119 @@ class Follow(models.Model):
                 name='user_not_author',
             ),
         ]
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами (apps.posts.signals), расхождения чинит
+    команда ``manage.py recount``.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+    )
+    followers = models.IntegerField(default=0, verbose_name='Подписчиков')
+    following = models.IntegerField(default=0, verbose_name='Подписок')
+    posts = models.IntegerField(default=0, verbose_name='Записей')
+
+
+class PostCounters(models.Model):
+    """Денормализованные счётчики поста."""
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+    )
+    comments = models.IntegerField(default=0, verbose_name='Комментариев')
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок (fan-out-on-write).
+
+    pub_date и author продублированы из поста, чтобы чтение ленты и
+    отписка шли по индексам этой таблицы без JOIN'а.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta(object):
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_user_post',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+
+
+class ImportedPost(models.Model):
+    """Пост, перенесённый командой import_posts из другой платформы.
+
+    external_id — id поста в источнике: по нему к посту привязываются
+    комментарии и вложения. image_source — адрес изображения, которое
+    ещё не скачано.
+    """
+
+    source = models.CharField(max_length=_TITLE_MAX_LENGTH)
+    external_id = models.CharField(max_length=_TITLE_MAX_LENGTH)
+    post = models.OneToOneField(
+        Post, on_delete=models.CASCADE, related_name='+',
+    )
+    image_source = models.TextField(blank=True, default='')
+
+    class Meta(object):
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'external_id'],
+                name='unique_imported_post',
+            ),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    """Сколько записей источника import_posts уже перенесено."""
+
+    source = models.CharField(max_length=_TITLE_MAX_LENGTH, unique=True)
+    position = models.BigIntegerField(default=0)
+
+
+class ApiToken(models.Model):
+    """Ключ пакетного API для скриптов и инструментов импорта.
+
+    Хранится только SHA-256 ключа: сам ключ показывается один раз при
+    создании (apps.posts.tokens.create_token).
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='api_tokens',
+    )
+    name = models.CharField(max_length=_TITLE_MAX_LENGTH, blank=True)
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '{0}: {1}'.format(self.user, self.name or self.pk)
@@ -0,0 +1,196 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.db.models import Q
+
+
+_FORWARD = 'n'
+_BACKWARD = 'p'
+
+
+def _get_value(item, name):
+    if isinstance(item, dict):
+        return item[name]
+    return getattr(item, name)
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_token(payload):
+    """Упаковать JSON-совместимый payload в непрозрачный urlsafe токен."""
+
+    dumped = json.dumps(payload, separators=(',', ':'), default=_dump_value)
+    return base64.urlsafe_b64encode(dumped.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Распаковать токен encode_token; None, если токен битый."""
+
+    if not token:
+        return None
+    padding = '=' * (-len(token) % 4)
+    try:
+        return json.loads(base64.urlsafe_b64decode(token + padding).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+
+
+class CursorPage(Sequence):
+    """Страница keyset-паджинатора.
+
+    В отличие от django.core.paginator.Page не знает ни номера, ни общего
+    количества страниц — только токены соседних страниц.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of {0} items>'.format(len(self))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator(object):
+    """Keyset (cursor) паджинатор.
+
+    Страница выбирается условием по ключу сортировки (по умолчанию
+    ``(pub_date, id)``) вместо OFFSET, поэтому глубокие страницы не
+    медленнее первой, а COUNT(*) не выполняется вовсе. Курсор — непрозрачный
+    urlsafe base64 токен с направлением и значениями ключа.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def get_page(self, cursor):
+        """Вернуть страницу по курсору; битый курсор — первая страница."""
+
+        decoded = self.decode_cursor(cursor)
+        if decoded is None:
+            return self._first_page()
+        direction, key = decoded
+        if direction == _BACKWARD:
+            return self._page_before(key)
+        return self._page_after(key)
+
+    def encode_cursor(self, direction, item):
+        key = [_get_value(item, name) for name in self._names]
+        return encode_token([direction, key])
+
+    def decode_cursor(self, cursor):
+        """(направление, ключ) из курсора; None, если курсор битый."""
+
+        try:
+            direction, key = decode_token(cursor)
+        except (TypeError, ValueError):
+            return None
+        if not self._is_valid(direction, key):
+            return None
+        try:
+            return direction, self._parse_key(key)
+        except Exception:  # noqa: B902 - ValidationError и прочий мусор
+            return None
+
+    def _is_valid(self, direction, key):
+        return (
+            direction in {_FORWARD, _BACKWARD} and
+            isinstance(key, list) and
+            len(key) == len(self._names)
+        )
+
+    def _parse_key(self, key):
+        return [
+            self._get_field(name).to_python(value)
+            for name, value in zip(self._names, key)
+        ]
+
+    @property
+    def _names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _get_field(self, name):
+        return self.object_list.model._meta.get_field(name)  # noqa: WPS437
+
+    def _keyset_filter(self, key, reverse=False):
+        """Условие «строго после key» в порядке self.ordering.
+
+        Для ключа (a, b) это ``a < va OR (a = va AND b < vb)`` при убывающей
+        сортировке, что позволяет использовать составной индекс.
+        """
+
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, key):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = '{0}__{1}'.format(name, 'lt' if descending else 'gt')
+            condition |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            field[1:] if field.startswith('-') else '-{0}'.format(field)
+            for field in self.ordering
+        ]
+
+    def _fetch(self, queryset):
+        return list(queryset[:self.per_page + 1])
+
+    def _first_page(self):
+        items = self._fetch(self.object_list.order_by(*self.ordering))
+        return self._build_page(items[:self.per_page], len(items) > self.per_page, False)
+
+    def _page_after(self, key):
+        queryset = self.object_list.filter(
+            self._keyset_filter(key),
+        ).order_by(*self.ordering)
+        items = self._fetch(queryset)
+        return self._build_page(items[:self.per_page], len(items) > self.per_page, True)
+
+    def _page_before(self, key):
+        queryset = self.object_list.filter(
+            self._keyset_filter(key, reverse=True),
+        ).order_by(*self._reversed_ordering())
+        items = self._fetch(queryset)
+        has_previous = len(items) > self.per_page
+        items = items[:self.per_page]
+        items.reverse()
+        return self._build_page(items, True, has_previous)
+
+    def _build_page(self, items, has_next, has_previous):
+        next_cursor = None
+        previous_cursor = None
+        if items and has_next:
+            next_cursor = self.encode_cursor(_FORWARD, items[-1])
+        if items and has_previous:
+            previous_cursor = self.encode_cursor(_BACKWARD, items[0])
+        return CursorPage(items, self, next_cursor, previous_cursor)
@@ -0,0 +1,234 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс — отдельная таблица с текстом поста и названием группы: на SQLite
+виртуальная таблица FTS5 (ранжирование bm25, основы слов считает
+apps.posts.stemmer), на PostgreSQL — tsvector со словарём russian и
+GIN-индексом. Индекс обновляют сигналы, пересобирает команда
+rebuild_search_index.
+
+Выдача сортируется по релевантности и листается keyset-курсором по паре
+(score, id): меньший score — более релевантный пост.
+"""
+from itertools import islice
+
+from django.db import connection
+
+from apps.posts.pagination import CursorPage, decode_token, encode_token
+from apps.posts.stemmer import stem_words
+
+
+_BATCH_SIZE = 500
+
+
+class SqliteBackend(object):
+    """FTS5; rowid строки индекса совпадает с id поста."""
+
+    table = 'posts_post_fts'
+
+    def create(self, cursor):
+        cursor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5('
+            "text, group_title, tokenize='unicode61 remove_diacritics 2')"
+            .format(self.table),
+        )
+
+    def drop(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS {0}'.format(self.table))
+
+    def upsert(self, cursor, rows):
+        rows = [
+            (post_id, ' '.join(stem_words(text)), ' '.join(stem_words(title)))
+            for post_id, text, title in rows
+        ]
+        cursor.executemany(
+            'DELETE FROM {0} WHERE rowid = %s'.format(self.table),
+            [(post_id,) for post_id, _, _ in rows],
+        )
+        cursor.executemany(
+            'INSERT INTO {0} (rowid, text, group_title) VALUES (%s, %s, %s)'
+            .format(self.table),
+            rows,
+        )
+
+    def delete(self, cursor, post_ids):
+        cursor.executemany(
+            'DELETE FROM {0} WHERE rowid = %s'.format(self.table),
+            [(post_id,) for post_id in post_ids],
+        )
+
+    def clear(self, cursor):
+        cursor.execute('DELETE FROM {0}'.format(self.table))
+
+    def search(self, cursor, query, after, limit):
+        # Каждое слово запроса — префикс основы, все слова обязательны
+        match = ' '.join('"{0}"*'.format(word) for word in stem_words(query))
+        if not match:
+            return []
+        sql = (
+            'SELECT id, score FROM ('
+            'SELECT rowid AS id, bm25({0}, 1.0, 0.5) AS score '
+            'FROM {0} WHERE {0} MATCH %s)'
+        ).format(self.table)
+        params = [match]
+        if after is not None:
+            sql += ' WHERE score > %s OR (score = %s AND id > %s)'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY score, id LIMIT %s'
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+class PostgresBackend(object):
+    """tsvector: текст поста с весом A, название группы — B."""
+
+    table = 'posts_post_search'
+
+    def create(self, cursor):
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS {0} ('
+            'post_id integer PRIMARY KEY '
+            'REFERENCES posts_post (id) ON DELETE CASCADE '
+            'DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'.format(self.table),
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS {0}_document_idx '
+            'ON {0} USING gin (document)'.format(self.table),
+        )
+
+    def drop(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS {0}'.format(self.table))
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(
+            'INSERT INTO {0} (post_id, document) VALUES (%s, '
+            "setweight(to_tsvector('russian', %s), 'A') || "
+            "setweight(to_tsvector('russian', %s), 'B')) "
+            'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document'
+            .format(self.table),
+            [(post_id, text, title or '') for post_id, text, title in rows],
+        )
+
+    def delete(self, cursor, post_ids):
+        cursor.execute(
+            'DELETE FROM {0} WHERE post_id = ANY(%s)'.format(self.table),
+            [list(post_ids)],
+        )
+
+    def clear(self, cursor):
+        cursor.execute('TRUNCATE {0}'.format(self.table))
+
+    def search(self, cursor, query, after, limit):
+        # Ранг отрицательный, чтобы порядок совпадал с bm25 у SQLite
+        sql = (
+            'SELECT id, score FROM ('
+            'SELECT post_id AS id, -ts_rank(document, query) AS score '
+            "FROM {0}, plainto_tsquery('russian', %s) query "
+            'WHERE document @@ query) ranked'
+        ).format(self.table)
+        params = [query]
+        if after is not None:
+            sql += ' WHERE score > %s OR (score = %s AND id > %s)'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY score, id LIMIT %s'
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+_BACKENDS = {  # noqa: WPS407
+    'sqlite': SqliteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend(using=None):
+    """Бэкенд поиска для соединения; None — СУБД не поддерживается."""
+
+    backend = _BACKENDS.get((using or connection).vendor)
+    return backend() if backend else None
+
+
+def _batches(iterable):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, _BATCH_SIZE))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, _BATCH_SIZE))
+
+
+def _rows(posts):
+    return posts.values_list('pk', 'text', 'group__title').iterator(
+        chunk_size=_BATCH_SIZE,
+    )
+
+
+def index_posts(posts):
+    """Добавить или обновить в индексе посты из queryset posts."""
+
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        for batch in _batches(_rows(posts)):
+            backend.upsert(cursor, batch)
+
+
+def remove_posts(post_ids):
+    backend = get_backend()
+    if backend is None or not post_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.delete(cursor, post_ids)
+
+
+def rebuild(posts):
+    """Пересобрать индекс с нуля; возвращает число проиндексированных постов."""
+
+    backend = get_backend()
+    if backend is None:
+        return 0
+    total = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        for batch in _batches(_rows(posts)):
+            backend.upsert(cursor, batch)
+            total += len(batch)
+    return total
+
+
+def _decode_after(cursor):
+    after = decode_token(cursor)
+    if not isinstance(after, list) or len(after) != 2:
+        return None
+    score, post_id = after
+    if not isinstance(score, (int, float)) or not isinstance(post_id, int):
+        return None
+    return score, post_id
+
+
+def search(posts, query, cursor, per_page):
+    """Страница найденных постов из queryset posts в порядке релевантности.
+
+    Возвращает CursorPage; у выдачи есть только курсор следующей страницы.
+    """
+
+    backend = get_backend()
+    hits = []
+    if backend is not None and query.strip():
+        with connection.cursor() as db_cursor:
+            hits = backend.search(
+                db_cursor, query, _decode_after(cursor), per_page + 1,
+            )
+    has_next = len(hits) > per_page
+    hits = hits[:per_page]
+    found = posts.in_bulk([post_id for post_id, _ in hits])
+    next_cursor = None
+    if has_next:
+        post_id, score = hits[-1]
+        next_cursor = encode_token([score, post_id])
+    return CursorPage(
+        [found[post_id] for post_id, _ in hits if post_id in found],
+        None,
+        next_cursor,
+        None,
+    )
@@ -0,0 +1,343 @@
+"""Синтетические данные для нагрузочных тестов и стендов.
+
+Seeder пишет пользователей, группы, посты, комментарии и подписки пачками
+через bulk_create, а денормализованные данные (счётчики, ленты подписок,
+поисковый индекс) строит после этого диапазонами id. Распределения
+похожи на настоящие: популярность авторов и размеры групп подчиняются
+степенному закону, комментарии достаются немногим постам и идут
+всплеском вскоре после публикации. При одном и том же seed данные
+получаются одинаковыми.
+"""
+import random
+from array import array
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from apps.posts import counters, search, timeline
+from apps.posts.bulk import bulk_insert, explicit_dates
+from apps.posts.cache import INDEX_PAGE, invalidate
+from apps.posts.models import Comment, Follow, Group, Post, User
+from apps.posts.thumbnails import generate_thumbnails
+
+
+WORDS = (
+    'утро', 'город', 'река', 'дорога', 'книга', 'лето', 'снег', 'кофе',
+    'друг', 'музыка', 'поезд', 'море', 'работа', 'вечер', 'сад', 'кошка',
+    'лес', 'дождь', 'письмо', 'окно', 'небо', 'мост', 'улица', 'фильм',
+    'новый', 'старый', 'тихий', 'яркий', 'долгий', 'тёплый', 'холодный',
+    'видел', 'читал', 'ждал', 'нашёл', 'вспомнил', 'написал', 'услышал',
+)
+
+# Множитель перестановки рангов (простое число): самый популярный автор
+# или пост не обязательно первый по id
+_STRIDE = 2654435761
+
+# Доля постов без группы
+_NO_GROUP = 0.3
+
+
+def random_text(rng, min_words=5, max_words=60):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return '{0}.'.format(' '.join(words).capitalize())
+
+
+def random_image(rng, name):
+    """Сохранить в хранилище небольшое JPEG-изображение, вернуть имя."""
+
+    color = tuple(rng.randrange(256) for _ in range(3))
+    image = Image.new('RGB', (640, 480), color)
+    stream = BytesIO()
+    image.save(stream, 'jpeg', quality=80)
+    return default_storage.save(
+        'posts/{0}.jpg'.format(name), ContentFile(stream.getvalue()),
+    )
+
+
+def _cum_weights(size, skew):
+    """Накопленные веса закона Ципфа для рангов 0..size-1."""
+
+    weights = []
+    total = 0
+    for rank in range(size):
+        total += 1 / (rank + 1) ** skew
+        weights.append(total)
+    return weights
+
+
+def _ranges(first, last, size):
+    for start in range(first, last + 1, size):
+        yield start, min(start + size - 1, last)
+
+
+def _from_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+class Seeder(object):  # noqa: WPS214, WPS230
+    """Генератор данных.
+
+    *_skew — показатели степенного закона: 0 — равномерно, чем больше,
+    тем сильнее перекос в пользу немногих авторов, групп и постов.
+    Примерно images постов получают изображения из пула image_pool
+    файлов. progress(step, done, total) вызывается после каждой пачки.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        users=100,
+        groups=10,
+        posts=1000,
+        comments=5000,
+        follows=1000,
+        images=0,
+        image_pool=20,
+        seed=0,
+        prefix='seed',
+        password=None,
+        days=365,
+        author_skew=1.0,
+        group_skew=1.0,
+        comment_skew=1.2,
+        comment_burst=3 * 3600,
+        batch_size=10000,
+        progress=None,
+    ):
+        self.sizes = {
+            'users': users,
+            'groups': groups,
+            'posts': posts,
+            'comments': comments,
+            'follows': follows,
+        }
+        self.images = min(images, posts)
+        self.image_pool = image_pool
+        self.prefix = prefix
+        self.password = password
+        self.days = days
+        self.author_skew = author_skew
+        self.group_skew = group_skew
+        self.comment_skew = comment_skew
+        self.comment_burst = comment_burst
+        self.batch_size = batch_size
+        self.progress = progress or (lambda step, done, total: None)
+        self.rng = random.Random(seed)
+        self.now = timezone.now()
+        self.user_ids = array('q')
+        self.group_ids = array('q')
+        self.post_ids = array('q')
+        self.post_dates = array('d')
+
+    def run(self):
+        with explicit_dates():
+            self.create_users()
+            self.create_groups()
+            self.create_posts()
+            self.create_comments()
+        self.create_follows()
+        self.refresh()
+
+    def create_users(self):
+        password = make_password(self.password)
+        numbers = iter(range(self.sizes['users']))
+
+        def build(count):
+            objs = bulk_insert(User, (
+                User(
+                    username='{0}{1}'.format(self.prefix, next(numbers)),
+                    password=password,
+                )
+                for _ in range(count)
+            ))
+            self.user_ids.extend(obj.pk for obj in objs)
+
+        self._batches('users', self.sizes['users'], build)
+
+    def create_groups(self):
+        objs = bulk_insert(Group, (
+            Group(
+                title='Группа {0}'.format(number),
+                slug='{0}-{1}'.format(self.prefix, number),
+                description=random_text(self.rng),
+            )
+            for number in range(self.sizes['groups'])
+        ))
+        self.group_ids.extend(obj.pk for obj in objs)
+        self.progress('groups', len(objs), self.sizes['groups'])
+
+    def create_posts(self):
+        if not self.user_ids:
+            return
+        rng = self.rng
+        authors = _cum_weights(len(self.user_ids), self.author_skew)
+        groups = _cum_weights(len(self.group_ids), self.group_skew)
+        images = self._create_images()
+        image_ratio = self.images / max(self.sizes['posts'], 1)
+        start = (self.now - timedelta(days=self.days)).timestamp()
+        span = self.days * 86400
+
+        def build(count):
+            objs = []
+            for author_id in self._pick(self.user_ids, authors, count):
+                group_id = self._random_group(groups)
+                image = self._random_image(images, image_ratio, len(objs))
+                objs.append(Post(
+                    text=random_text(rng),
+                    author_id=author_id,
+                    group_id=group_id,
+                    image=image,
+                    pub_date=_from_timestamp(start + rng.random() * span),
+                ))
+            bulk_insert(Post, objs)
+            self.post_ids.extend(obj.pk for obj in objs)
+            self.post_dates.extend(obj.pub_date.timestamp() for obj in objs)
+
+        self._batches('posts', self.sizes['posts'], build)
+
+    def create_comments(self):
+        if not self.post_ids:
+            return
+        rng = self.rng
+        positions = range(len(self.post_ids))
+        weights = _cum_weights(len(self.post_ids), self.comment_skew)
+        now = self.now.timestamp()
+
+        def build(count):
+            objs = []
+            for position in self._pick(positions, weights, count):
+                # Большинство комментариев — в первые часы после публикации
+                created = self.post_dates[position] + rng.expovariate(
+                    1 / self.comment_burst,
+                )
+                objs.append(Comment(
+                    post_id=self.post_ids[position],
+                    author_id=rng.choice(self.user_ids),
+                    text=random_text(rng, 1, 20),
+                    created=_from_timestamp(min(created, now)),
+                ))
+            Comment.objects.bulk_create(objs)
+
+        self._batches('comments', self.sizes['comments'], build)
+
+    def create_follows(self):
+        """Каждый пользователь подписывается в среднем на follows / users
+        авторов, выбранных по популярности."""
+
+        users = len(self.user_ids)
+        total = min(self.sizes['follows'], users * (users - 1))
+        if not total:
+            return
+        popularity = _cum_weights(users, self.author_skew)
+        pending = []
+        created = 0
+        for user_id in self.user_ids:
+            wanted = min(
+                round(self.rng.expovariate(users / total)),
+                users - 1,
+                total - created - len(pending),
+            )
+            authors = self._pick_authors(user_id, wanted, popularity)
+            pending.extend(
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in authors
+            )
+            if len(pending) >= self.batch_size:
+                created += self._flush_follows(pending, created, total)
+                pending = []
+        created += self._flush_follows(pending, created, total)
+
+    def refresh(self):
+        """Счётчики, ленты подписок, поисковый индекс и миниатюры."""
+
+        if self.user_ids:
+            first, last = min(self.user_ids), max(self.user_ids)
+            for start, end in _ranges(first, last, self.batch_size):
+                counters.recount_users(
+                    User.objects.filter(pk__range=(start, end)),
+                )
+                timeline.backfill_authors(start, end)
+                self.progress('timelines', end - first + 1, last - first + 1)
+        if self.post_ids:
+            first, last = min(self.post_ids), max(self.post_ids)
+            for start, end in _ranges(first, last, self.batch_size):
+                posts = Post.objects.filter(pk__range=(start, end))
+                counters.recount_posts(posts)
+                search.index_posts(posts)
+                self.progress('search', end - first + 1, last - first + 1)
+            self._generate_thumbnails(first, last)
+        invalidate(INDEX_PAGE)
+
+    def _random_group(self, cum_weights):
+        """Группа поста по весам или None (доля _NO_GROUP постов)."""
+
+        if self.group_ids and self.rng.random() >= _NO_GROUP:
+            return self._pick(self.group_ids, cum_weights, 1)[0]
+        return None
+
+    def _random_image(self, images, ratio, position):
+        """Изображение для доли ratio постов, по кругу из images."""
+
+        if images and self.rng.random() < ratio:
+            return images[position % len(images)]
+        return None
+
+    def _pick_authors(self, user_id, wanted, cum_weights):
+        """До wanted авторов для подписок user_id, по возрастанию id."""
+
+        authors = set()
+        # Популярные авторы выпадают часто, попытки ограничены
+        for _ in range(wanted * 4):
+            if len(authors) >= wanted:
+                break
+            author_id = self._pick(self.user_ids, cum_weights, 1)[0]
+            if author_id != user_id:
+                authors.add(author_id)
+        return sorted(authors)
+
+    def _pick(self, population, cum_weights, count):
+        """count элементов population по весам рангов."""
+
+        size = len(population)
+        ranks = self.rng.choices(range(size), cum_weights=cum_weights, k=count)
+        return [population[rank * _STRIDE % size] for rank in ranks]
+
+    def _batches(self, step, total, build):
+        """Вызывать build(count) пачками по batch_size до total строк."""
+
+        done = 0
+        while done < total:
+            count = min(self.batch_size, total - done)
+            with transaction.atomic():
+                build(count)
+            done += count
+            self.progress(step, done, total)
+
+    def _create_images(self):
+        return [
+            random_image(self.rng, '{0}-{1}'.format(self.prefix, number))
+            for number in range(min(self.image_pool, self.images))
+        ]
+
+    def _flush_follows(self, objs, created, total):
+        with transaction.atomic():
+            Follow.objects.bulk_create(objs)
+        self.progress('follows', created + len(objs), total)
+        return len(objs)
+
+    def _generate_thumbnails(self, first, last):
+        # Посты с одним файлом делят миниатюры: хватает одного поста на файл
+        posts = Post.objects.filter(pk__range=(first, last)).exclude(
+            image='',
+        ).exclude(image=None).order_by('image', 'pk')
+        seen = set()
+        for post_id, image in posts.values_list('pk', 'image').iterator():
+            if image not in seen:
+                seen.add(image)
+                card_images = generate_thumbnails(post_id, touch=False)
+                posts.filter(image=image).update(card_images=card_images)
@@ -0,0 +1,216 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.posts import counters, search, timeline
+from apps.posts.cache import (
+    INDEX_PAGE,
+    author_scope,
+    group_scope,
+    invalidate,
+    post_scope,
+    post_scopes,
+    queryset_scopes,
+)
+from apps.posts.models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    PostCounters,
+    User,
+    UserCounters,
+)
+
+
+# Поля, которые показываются на чужих страницах: их изменение сбрасывает
+# кэш этих страниц
+_TRACKED_FIELDS = {  # noqa: WPS407
+    Post: ('group',),
+    Group: ('slug', 'title', 'description'),
+    User: ('username', 'first_name', 'last_name'),
+}
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        PostCounters.objects.get_or_create(post=instance)
+        counters.change_user_counters(instance.author_id, posts=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_counters(instance.author_id, posts=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_post_counters(instance.post_id, comments=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_post_counters(instance.post_id, comments=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counters(instance.author_id, followers=1)
+        counters.change_user_counters(instance.user_id, following=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_counters(instance.author_id, followers=-1)
+    counters.change_user_counters(instance.user_id, following=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    timeline.trim(instance.user_id, instance.author_id)
+
+
+def _tracked_values(sender, instance):
+    # Из __dict__: отложенное поле (only, defer) не загружается запросом
+    return {
+        name: instance.__dict__.get(
+            sender._meta.get_field(name).attname,  # noqa: WPS437
+        )
+        for name in _TRACKED_FIELDS[sender]
+    }
+
+
+@receiver(post_init, sender=Post)
+@receiver(post_init, sender=Group)
+@receiver(post_init, sender=User)
+def remember_loaded_values(sender, instance, **kwargs):
+    instance._loaded_values = _tracked_values(  # noqa: WPS437
+        sender, instance,
+    )
+
+
+def _pop_changes(sender, instance, update_fields=None):
+    """Прежние значения отслеживаемых полей, изменённых с загрузки и
+    сохранённых сейчас; запомненные значения обновляются."""
+
+    loaded = instance._loaded_values  # noqa: WPS437
+    changes = {}
+    for name, value in _tracked_values(sender, instance).items():
+        attname = sender._meta.get_field(name).attname  # noqa: WPS437
+        if update_fields is not None and not (
+            {name, attname} & set(update_fields)
+        ):
+            continue
+        if value != loaded[name]:
+            changes[name] = loaded[name]
+            loaded[name] = value
+    return changes
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, update_fields=None, **kwargs):
+    names = [
+        INDEX_PAGE,
+        post_scope(instance.pk),
+        author_scope(instance.author.username),
+    ]
+    if instance.group_id:
+        names.append(group_scope(instance.group.slug))
+    # При переносе поста в другую группу меняются страницы обеих групп
+    old_group_id = _pop_changes(sender, instance, update_fields).get('group')
+    if old_group_id is not None:
+        names.extend(
+            group_scope(slug) for slug in Group.objects.filter(
+                pk=old_group_id,
+            ).values_list('slug', flat=True)
+        )
+    invalidate(*names)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    invalidate(*post_scopes([instance.post_id]))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    # Счётчики подписок и кнопка подписки видны в профилях обоих
+    invalidate(*(
+        author_scope(username)
+        for username in User.objects.filter(
+            pk__in=(instance.user_id, instance.author_id),
+        ).values_list('username', flat=True)
+    ))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_page(
+    sender, instance, created, update_fields=None, **kwargs,
+):
+    changes = _pop_changes(sender, instance, update_fields)
+    if not created and not changes:
+        return
+    names = {group_scope(instance.slug)}
+    if {'slug', 'title'} & set(changes):
+        # Название и ссылка группы есть в карточках её постов везде
+        names.add(group_scope(changes.get('slug', instance.slug)))
+        names.update(queryset_scopes(instance.posts.all()))
+    invalidate(*names)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_page(
+    sender, instance, created, update_fields=None, **kwargs,
+):
+    # Сохранение без видимых полей (last_login при входе) кэш не трогает
+    changes = _pop_changes(sender, instance, update_fields)
+    if not created and not changes:
+        return
+    names = {author_scope(instance.username)}
+    if 'username' in changes:
+        # Имя автора есть в карточках его постов и в его комментариях
+        names.add(author_scope(changes['username']))
+        names.update(queryset_scopes(Post.objects.filter(
+            Q(author=instance) | Q(comments__author=instance),
+        )))
+    invalidate(*names)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_posts(Post.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Group)
+def reindex_group_posts(sender, instance, created, **kwargs):
+    if not created:
+        search.index_posts(instance.posts.all())
@@ -0,0 +1,22 @@
+// Кнопка «Показать ещё комментарии» подгружает следующую порцию
+// фрагментом вместо перехода на страницу
+document.addEventListener('click', function (event) {
+    var link = event.target.closest('[data-comments-url]');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    fetch(link.dataset.commentsUrl, {credentials: 'same-origin'})
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            return response.text();
+        })
+        .then(function (html) {
+            link.closest('.comments-more').outerHTML = html;
+        })
+        .catch(function () {
+            window.location = link.href;
+        });
+});
@@ -0,0 +1,157 @@
+"""Стеммер русского языка по алгоритму Snowball (Porter).
+
+https://snowballstem.org/algorithms/russian/stemmer.html
+
+SQLite FTS5 не умеет морфологию, поэтому поисковый индекс и запрос
+хранят основы слов, полученные здесь.
+"""
+import re
+from functools import lru_cache
+
+
+_VOWELS = frozenset('аеиоуыэюя')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Окончания групп «1» снимаются, только если перед ними стоит «а» или «я»
+_PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+_ADJECTIVE = (
+    (),
+    (
+        'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+        'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+        'ая', 'яя', 'ою', 'ею',
+    ),
+)
+_PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+_REFLEXIVE = ((), ('ся', 'сь'))
+_VERB = (
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+        'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+        'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+        'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+_NOUN = (
+    (),
+    (
+        'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+        'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+        'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+        'ья', 'я',
+    ),
+)
+_SUPERLATIVE = ('ейше', 'ейш')
+_DERIVATIONAL = ('ость', 'ост')
+
+
+def _regions(word):
+    """Начала областей RV и R2."""
+
+    rv = len(word)
+    for index, letter in enumerate(word):
+        if letter in _VOWELS:
+            rv = index + 1
+            break
+
+    def next_region(start):
+        for index in range(start + 1, len(word)):
+            if word[index] not in _VOWELS and word[index - 1] in _VOWELS:
+                return index + 1
+        return len(word)
+
+    return rv, next_region(next_region(0))
+
+
+def _strip(stem, groups):
+    """Снять самое длинное окончание из groups; None, если его нет."""
+
+    first, second = groups
+    endings = sorted(first + second, key=len, reverse=True)
+    for ending in endings:
+        if not stem.endswith(ending):
+            continue
+        rest = stem[:-len(ending)]
+        if ending in second or rest.endswith(('а', 'я')):
+            return rest
+    return None
+
+
+def _strip_inflection(tail):
+    """Шаг 1: деепричастие, иначе возвратность + прилагательное (с
+    причастием), глагол или существительное."""
+
+    stripped = _strip(tail, _PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    reflexive = _strip(tail, _REFLEXIVE)
+    if reflexive is not None:
+        tail = reflexive
+    stripped = _strip(tail, _ADJECTIVE)
+    if stripped is not None:
+        participle = _strip(stripped, _PARTICIPLE)
+        return stripped if participle is None else participle
+    for groups in (_VERB, _NOUN):
+        stripped = _strip(tail, groups)
+        if stripped is not None:
+            return stripped
+    return tail
+
+
+def _strip_suffix(tail, suffixes):
+    """Снять первый подходящий суффикс из suffixes."""
+
+    for suffix in suffixes:
+        if tail.endswith(suffix):
+            return tail[:-len(suffix)]
+    return tail
+
+
+def _strip_derivational(tail, r2_start):
+    """Шаг 3: словообразовательный суффикс, если он целиком в R2
+    (r2_start — начало R2 внутри tail)."""
+
+    stripped = _strip_suffix(tail, _DERIVATIONAL)
+    if len(stripped) >= r2_start:
+        return stripped
+    return tail
+
+
+def _strip_tail(tail):
+    """Шаг 4: превосходная степень, удвоенное «н» и мягкий знак."""
+
+    tail = _strip_suffix(tail, _SUPERLATIVE)
+    if tail.endswith(('нн', 'ь')):
+        return tail[:-1]
+    return tail
+
+
+# Словарь текстов невелик по сравнению с числом словоупотреблений
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа русского слова; слова на других языках только нормализуются."""
+
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    prefix, tail = word[:rv], word[rv:]
+    tail = _strip_inflection(tail)
+    # Шаг 2
+    if tail.endswith('и'):
+        tail = tail[:-1]
+    tail = _strip_derivational(tail, r2 - rv)
+    return prefix + _strip_tail(tail)
+
+
+def stem_words(text):
+    """Основы всех слов text в исходном порядке."""
+
+    return [stem(word) for word in _WORD_RE.findall(text or '')]
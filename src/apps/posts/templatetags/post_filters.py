@@ -0,0 +1,34 @@
+from django import template
+
+from apps.posts import thumbnails
+
+
+register = template.Library()
+
+
+@register.filter
+def authored_by(post, user):
+    return user.is_authenticated and post.author_id == user.pk
+
+
+@register.simple_tag
+def card_thumbnail(post):
+    """Готовая миниатюра карточки поста или None.
+
+    Недостающая миниатюра ставится в очередь, шаблон тем временем
+    показывает оригинал.
+    """
+
+    if not post.image:
+        return None
+    thumbnail = thumbnails.get_card_thumbnail(post)
+    if thumbnail is None:
+        thumbnails.enqueue(post.pk)
+    return thumbnail
+
+
+@register.simple_tag
+def card_srcsets(post):
+    """[(mime, srcset), ...] готовых производных карточки для <picture>."""
+
+    return thumbnails.get_card_srcsets(post)
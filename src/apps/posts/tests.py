@@ -1,15 +1,43 @@
+import json
+import os
+import shutil
 import tempfile
-from io import BytesIO
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock
 from urllib.parse import urljoin
 
 from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from PIL import Image
 from sorl.thumbnail import get_thumbnail
 
-from apps.posts.models import Comment, Follow, Group, Post, User
+from apps.posts import (
+    counters,
+    dumps,
+    importing,
+    search,
+    seeding,
+    thumbnails,
+)
+from apps.posts.cache import post_card_key
+from apps.posts.models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    PostCounters,
+    TimelineEntry,
+    User,
+    UserCounters,
+)
 
 
 def create_test_image_file():
@@ -32,6 +60,24 @@ def create_test_txt_file():
     return binary_stream
 
 
+def temporary_directory(test):
+    """Временный каталог, который удаляется после теста."""
+
+    path = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+class TemporaryMediaMixin(object):
+    """MEDIA_ROOT теста во временном каталоге, а не в каталоге проекта."""
+
+    def setUp(self):
+        super().setUp()
+        media = override_settings(MEDIA_ROOT=temporary_directory(self))
+        media.enable()
+        self.addCleanup(media.disable)
+
+
 class UserTest(TestCase):  # noqa: WPS230, WPS214
     def setUp(self):
         self.client = Client()
@@ -196,17 +242,19 @@ class UserTest(TestCase):  # noqa: WPS230, WPS214
                 'text': 'post with image',
                 'image': create_test_image_file(),
             },
-            follow=True,
         )
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(
-            response.resolver_match.view_name,
-            'posts:index',
-            msg='Пост не создался',
+        self.assertRedirects(
+            response,
+            reverse('posts:index'),
+            fetch_redirect_response=False,
+            msg_prefix='Пост не создался',
         )
         self.assertEqual(Post.objects.all().count(), 2)
 
         latest_post = Post.objects.latest('pub_date')
+        # Миниатюры готовит пул после коммита, которого в тесте нет; иначе
+        # первая же страница создала бы их в потоке запроса
+        thumbnails.generate_thumbnails(latest_post.pk)
         urls = self.generate_urls_for_tests(
             default=False,
             post=latest_post,
@@ -246,19 +294,51 @@ class UserTest(TestCase):  # noqa: WPS230, WPS214
         self.assertEqual(Post.objects.all().count(), 1)
 
     def test_cache_is_working(self):
-        """Проверка работы кэша."""
+        """Проверка работы кэша: повторный запрос главной отдаётся из кэша,
+        а новый пост сбрасывает его."""
 
-        response = self.client.get(reverse('posts:index'))
+        response = self.anon_client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.anon_client.get(reverse('posts:index'))
         self.assertEqual(response.status_code, 200)
-        text = 'Кэш есть'
+
+        text = 'Кэш сброшен'
         response = self.client.post(
             reverse('posts:new_post'),
             data={'text': text},
             follow=True,
         )
         self.assertEqual(response.status_code, 200)
+        response = self.anon_client.get(reverse('posts:index'))
+        self.assertContains(response, text, status_code=200)
+
+    def test_cached_index_is_not_shared_with_users(self):
+        """Страница вошедшего пользователя не попадает в кэш главной, а
+        закэшированная страница анонимов не отдаётся пользователю."""
+
+        edit_url = reverse('posts:post_edit', kwargs={
+            'username': self.user.username, 'pk': self.post.pk,
+        })
         response = self.client.get(reverse('posts:index'))
-        self.assertNotContains(response, text, status_code=200)
+        self.assertContains(response, edit_url)
+        response = self.anon_client.get(reverse('posts:index'))
+        self.assertNotContains(response, edit_url)
+        self.assertNotContains(response, 'Выйти')
+
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, edit_url)
+
+    @override_settings(POSTS_GENERATION_CACHE=False)
+    def test_generation_cache_can_be_disabled(self):
+        """Без общего кэша главная не кэшируется и не отдаёт
+        валидаторов."""
+
+        self.anon_client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.anon_client.get(reverse('posts:index'))
+        self.assertTrue(queries)
+        self.assertFalse(response.has_header('ETag'))
 
     def test_authorized_user_create_comment(self):
         """Авторизированный пользователь может комментировать посты."""
@@ -357,3 +437,1453 @@ class UserTest(TestCase):  # noqa: WPS230, WPS214
         self.assertIn('paginator', response.context)
         self.assertEqual(response.context['paginator'].count, 0)
         self.assertNotContains(response, self.text, status_code=200)
+
+
+class CursorPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='kyle')
+        Post.objects.bulk_create(
+            Post(text='Пост {0}'.format(num), author=self.user)
+            for num in range(25)
+        )
+        self.expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list('id', flat=True),
+        )
+
+    def get_page_ids(self, cursor=''):
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': cursor},
+        )
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page']
+        return [post.id for post in page], page
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсоры next/prev обходят ленту без пропусков и повторов."""
+
+        ids, page = self.get_page_ids()
+        self.assertEqual(ids, self.expected[:10])
+        self.assertFalse(page.has_previous())
+
+        ids, page = self.get_page_ids(page.next_cursor)
+        self.assertEqual(ids, self.expected[10:20])
+
+        ids, last = self.get_page_ids(page.next_cursor)
+        self.assertEqual(ids, self.expected[20:])
+        self.assertFalse(last.has_next())
+
+        ids, page = self.get_page_ids(last.previous_cursor)
+        self.assertEqual(ids, self.expected[10:20])
+
+    def test_cursor_page_skips_count(self):
+        """В режиме курсора не выполняется COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page_ids()
+        self.assertFalse(
+            any('COUNT(*)' in query['sql'] for query in queries.captured_queries),
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор не ломает страницу."""
+
+        ids, _ = self.get_page_ids('garbage!')
+        self.assertEqual(ids, self.expected[:10])
+
+
+class FeedQueryCountTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='john')
+        self.reader = User.objects.create_user(username='miles')
+        self.group = Group.objects.create(
+            slug='resistance', title='Resistance', description='test group',
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:follow_index'),
+            reverse('posts:group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+        )
+
+    def create_posts(self, count):
+        for num in range(count):
+            post = Post.objects.create(
+                text='Пост {0}'.format(num),
+                author=self.author,
+                group=self.group,
+            )
+            Comment.objects.create(post=post, author=self.reader, text='!')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не зависит от количества постов на
+        странице."""
+
+        self.create_posts(1)
+        single = {url: self.count_queries(url) for url in self.urls}
+        self.create_posts(9)
+        for url in self.urls:
+            self.assertEqual(self.count_queries(url), single[url], msg=url)
+
+    def test_profile_reads_author_and_page_in_two_queries(self):
+        """Профиль: автор со счётчиками и подпиской — один запрос, первая
+        страница постов — второй (сессия и пользователь не в счёт)."""
+
+        self.create_posts(15)
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        self.assertEqual(self.count_queries(url), 4)
+        anonymous = Client()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = anonymous.get(url)
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(response.context['following'])
+
+        response = self.client.get(url, {'page': 2})
+        self.assertTrue(response.context['following'])
+        self.assertEqual(response.context['author'], self.author)
+        self.assertEqual(response.context['paginator'].count, 15)
+        self.assertEqual(len(response.context['page']), 5)
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='t800')
+        self.reader = User.objects.create_user(username='t1000')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def get_counters(self, user):
+        return UserCounters.objects.values_list(
+            'followers', 'following', 'posts',
+        ).get(user=user)
+
+    def test_follow_counters(self):
+        """Подписка и отписка через вьюхи меняют счётчики обоих
+        пользователей."""
+
+        self.client.post(
+            reverse('posts:profile_follow', kwargs={'username': self.author}),
+        )
+        self.assertEqual(self.get_counters(self.author), (1, 0, 0))
+        self.assertEqual(self.get_counters(self.reader), (0, 1, 0))
+
+        self.client.post(
+            reverse('posts:profile_unfollow', kwargs={'username': self.author}),
+        )
+        self.assertEqual(self.get_counters(self.author), (0, 0, 0))
+        self.assertEqual(self.get_counters(self.reader), (0, 0, 0))
+
+    def test_post_and_comment_counters(self):
+        """Счётчики постов и комментариев, в том числе при каскадном
+        удалении."""
+
+        self.client.post(reverse('posts:new_post'), data={'text': 'Пост'})
+        post = Post.objects.get(author=self.reader)
+        self.assertEqual(self.get_counters(self.reader), (0, 0, 1))
+
+        self.client.post(
+            reverse(
+                'posts:add_comment',
+                kwargs={'username': self.reader, 'pk': post.pk},
+            ),
+            data={'text': 'Комментарий'},
+        )
+        self.assertEqual(
+            PostCounters.objects.get(post=post).comments, 1,
+        )
+
+        post.delete()
+        self.assertEqual(self.get_counters(self.reader), (0, 0, 0))
+
+    def test_recount_repairs_drift(self):
+        """Команда recount чинит разошедшиеся счётчики."""
+
+        Post.objects.create(text='Пост', author=self.author)
+        UserCounters.objects.filter(user=self.author).update(posts=42)
+        UserCounters.objects.filter(user=self.reader).delete()
+
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self.get_counters(self.author), (0, 0, 1))
+        self.assertEqual(self.get_counters(self.reader), (0, 0, 0))
+
+    def test_author_block_reads_counters(self):
+        """Блок автора берёт числа из счётчиков, без COUNT-запросов."""
+
+        Post.objects.create(text='Пост', author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:profile', kwargs={'username': self.author}),
+            )
+        self.assertFalse(
+            any('posts_follow' in query['sql'] and 'COUNT' in query['sql']
+                for query in queries.captured_queries),
+        )
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='skynet')
+        self.reader = User.objects.create_user(username='dyson')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def get_follow_feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page']]
+
+    def test_fan_out_on_write(self):
+        """Новый пост раскладывается в ленты подписчиков, отписка
+        вычищает их."""
+
+        old = Post.objects.create(text='Старый', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=old).exists(),
+        )
+        self.client.force_login(self.author)
+        self.client.post(reverse('posts:new_post'), data={'text': 'Новый'})
+        self.client.force_login(self.reader)
+        self.assertEqual(self.get_follow_feed(), ['Новый', 'Старый'])
+
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.get_follow_feed(), [])
+
+    @override_settings(POSTS_FANOUT_THRESHOLD=0)
+    def test_fan_out_on_read_for_popular_authors(self):
+        """Посты популярных авторов не раскладываются, а добираются при
+        чтении ленты."""
+
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Популярный', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_follow_feed(), ['Популярный'])
+
+    @override_settings(POSTS_FANOUT_THRESHOLD=0)
+    def test_feed_merges_popular_authors_by_cursor(self):
+        """Разложенные посты и посты знаменитостей сливаются в одну ленту
+        и при паджинации курсором."""
+
+        regular = User.objects.create_user(username='kyle')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=regular)
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(
+                user=self.reader,
+                post=post,
+                author=regular,
+                pub_date=post.pub_date,
+            )
+            for post in (
+                Post.objects.create(text='r{0}'.format(num), author=regular)
+                for num in range(6)
+            )
+        )
+        for num in range(6):
+            Post.objects.create(text='p{0}'.format(num), author=self.author)
+        texts = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'text', flat=True,
+            ),
+        )
+
+        feed = []
+        params = {'cursor': ''}
+        while params['cursor'] is not None:
+            response = self.client.get(
+                reverse('posts:follow_index'), params,
+            )
+            feed.extend(post.text for post in response.context['page'])
+            params['cursor'] = response.context['page'].next_cursor
+        self.assertEqual(feed, texts)
+        response = self.client.get(reverse('posts:follow_index'), {'page': 2})
+        self.assertEqual(response.context['paginator'].count, 12)
+        self.assertEqual(
+            [post.text for post in response.context['page']], texts[10:],
+        )
+
+    @override_settings(POSTS_FANOUT_THRESHOLD=1)
+    def test_posts_are_fanned_out_when_author_is_no_longer_popular(self):
+        """Когда автор перестаёт быть знаменитостью, его посты
+        раскладываются по лентам оставшихся подписчиков."""
+
+        other = User.objects.create_user(username='sarah')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        Post.objects.create(text='Популярный', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        Follow.objects.filter(user=other).delete()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader).exists(),
+        )
+        self.assertEqual(self.get_follow_feed(), ['Популярный'])
+
+    @override_settings(POSTS_TIMELINE_LENGTH=2)
+    def test_timeline_is_trimmed(self):
+        """В ленте остаются только POSTS_TIMELINE_LENGTH новейших
+        записей."""
+
+        for num in range(3):
+            Post.objects.create(text=str(num), author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.get_follow_feed(), ['2', '1'])
+
+        Post.objects.create(text='3', author=self.author)
+        call_command('trim_timelines', stdout=StringIO())
+        self.assertEqual(self.get_follow_feed(), ['3', '2'])
+
+
+class PostCardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reese')
+        self.group = Group.objects.create(
+            slug='future', title='Future', description='test group',
+        )
+        self.post = Post.objects.create(
+            text='Из будущего', author=self.user, group=self.group,
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.group_url = reverse('posts:group', kwargs={'slug': self.group.slug})
+
+    def test_card_is_shared_between_pages(self):
+        """Карточка, отрендеренная на главной, переиспользуется на странице
+        группы."""
+
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Не из кэша')
+        self.assertContains(self.client.get(self.group_url), 'Из будущего')
+
+    def test_card_is_invalidated_on_edit_and_comment(self):
+        """Редактирование и комментарий обновляют карточку."""
+
+        self.client.get(self.group_url)
+        self.client.post(
+            reverse(
+                'posts:post_edit',
+                kwargs={'username': self.user, 'pk': self.post.pk},
+            ),
+            data={'text': 'Изменённый', 'group': self.group.pk},
+        )
+        self.assertContains(self.client.get(self.group_url), 'Изменённый')
+
+        self.client.post(
+            reverse(
+                'posts:add_comment',
+                kwargs={'username': self.user, 'pk': self.post.pk},
+            ),
+            data={'text': 'Комментарий'},
+        )
+        self.assertContains(
+            self.client.get(self.group_url), '1 комментариев',
+        )
+
+    def test_card_follows_group_and_author_renames(self):
+        """Переименование группы и автора обновляет карточку, а ключ
+        post_card_key совпадает с ключом шаблона."""
+
+        self.client.get(reverse('posts:index'))
+        post = Post.objects.for_feed().get(pk=self.post.pk)
+        self.assertIsNotNone(cache.get(post_card_key(post, True)))
+
+        self.group.title = 'Past'
+        self.group.save()
+        self.assertContains(self.client.get(self.group_url), '#Past')
+        self.user.username = 'kyle'
+        self.user.save()
+        self.assertContains(
+            self.client.get(reverse('posts:index')), '@kyle',
+        )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ThumbnailPipelineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='silberman')
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('posts:new_post'),
+            data={'text': 'С картинкой', 'image': create_test_image_file()},
+        )
+        self.post = Post.objects.get(author=self.user)
+
+    def get_ready_thumbnail(self):
+        self.post.refresh_from_db()
+        return thumbnails.get_card_thumbnail(self.post)
+
+    def test_page_does_not_block_on_thumbnail(self):
+        """Пока миниатюры нет, страница показывает оригинал и ставит
+        миниатюру в очередь."""
+
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            response = self.client.get(reverse('posts:index'))
+        enqueue.assert_called_once_with(self.post.pk)
+        self.assertContains(response, self.post.image.url)
+        self.assertIsNone(self.get_ready_thumbnail())
+
+    @override_settings(POSTS_THUMBNAIL_WORKERS=0)
+    def test_no_pool_does_not_generate_in_request(self):
+        """Без пула страница не создаёт миниатюры в потоке запроса."""
+
+        self.client.get(reverse('posts:index'))
+        self.assertIsNone(self.get_ready_thumbnail())
+
+    def test_generated_thumbnail_replaces_original(self):
+        """После генерации карточка показывает миниатюру."""
+
+        with mock.patch.object(thumbnails, 'enqueue'):
+            self.client.get(
+                reverse('posts:profile', kwargs={'username': self.user}),
+            )
+        thumbnails.generate_thumbnails(self.post.pk)
+        thumbnail = self.get_ready_thumbnail()
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        self.assertContains(response, thumbnail.url)
+
+    def test_derivatives_in_srcset(self):
+        """Карточка отдаёт srcset по готовым производным."""
+
+        thumbnails.generate_thumbnails(self.post.pk)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        self.assertContains(response, 'type="image/webp"')
+        for spec in thumbnails.CARD_DERIVATIVES:
+            self.assertContains(response, ' {0}w'.format(spec.width))
+
+    def test_image_cards_do_not_add_queries(self):
+        """Карточки с готовыми миниатюрами не добавляют запросов к
+        странице."""
+
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('posts:index'))
+            return len(queries)
+
+        thumbnails.generate_thumbnails(self.post.pk)
+        single = count_queries()
+        for _ in range(4):
+            post = Post.objects.create(
+                text='Ещё', author=self.user, image=self.post.image.name,
+            )
+            thumbnails.generate_thumbnails(post.pk)
+        self.assertEqual(count_queries(), single)
+
+    def test_replaced_image_is_not_ready(self):
+        """Миниатюры прежнего изображения не показываются для нового."""
+
+        thumbnails.generate_thumbnails(self.post.pk)
+        self.assertIsNotNone(self.get_ready_thumbnail())
+        Post.objects.filter(pk=self.post.pk).update(image='posts/other.png')
+        self.assertIsNone(self.get_ready_thumbnail())
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='sarah')
+        self.group = Group.objects.create(
+            title='Кибернетика', slug='cyber', description='Машины',
+        )
+        self.client = Client()
+
+    def get_found(self, query, cursor=None):
+        params = {'q': query}
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get(reverse('posts:search'), params)
+        return response.context['page']
+
+    def test_stemmed_search(self):
+        """Поиск находит словоформы, название группы и забывает удалённые
+        посты."""
+
+        post = Post.objects.create(
+            text='Терминаторы вернулись в прошлое', author=self.user,
+        )
+        grouped = Post.objects.create(
+            text='Просто пост', author=self.user, group=self.group,
+        )
+        Post.objects.create(text='Про котиков', author=self.user)
+
+        self.assertEqual(list(self.get_found('терминатору вернулся')), [post])
+        self.assertEqual(list(self.get_found('кибернетике')), [grouped])
+        self.assertEqual(list(self.get_found('')), [])
+
+        post.text = 'Будущее изменено'
+        post.save()
+        self.assertEqual(list(self.get_found('терминатор')), [])
+        self.assertEqual(list(self.get_found('будущего')), [post])
+
+        self.group.title = 'Робототехника'
+        self.group.save()
+        self.assertEqual(list(self.get_found('роботы')), [grouped])
+
+        post.delete()
+        self.assertEqual(list(self.get_found('будущее')), [])
+
+    def test_ranked_keyset_pages(self):
+        """Более релевантные посты выше, страницы не пересекаются."""
+
+        best = Post.objects.create(
+            text='Скайнет скайнет скайнет', author=self.user,
+        )
+        for number in range(12):
+            Post.objects.create(
+                text='Скайнет и длинный текст номер {0} про другое'.format(
+                    number,
+                ),
+                author=self.user,
+            )
+
+        first = self.get_found('скайнет')
+        self.assertEqual(first[0], best)
+        self.assertEqual(len(first), 10)
+        self.assertTrue(first.has_next())
+        second = self.get_found('скайнет', first.next_cursor)
+        self.assertEqual(len(second), 3)
+        self.assertFalse(second.has_next())
+        self.assertFalse(
+            {post.pk for post in first} & {post.pk for post in second},
+        )
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает индекс после массовой вставки."""
+
+        Post.objects.bulk_create([
+            Post(text='Жидкий металл', author=self.user),
+        ])
+        self.assertEqual(list(self.get_found('металл')), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.get_found('металлы')), 1)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN SQLite')
+class QueryPlanTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='kyle')
+        self.reader = User.objects.create_user(username='reese')
+        self.group = Group.objects.create(
+            title='Сопротивление', slug='resistance', description='Люди',
+        )
+        for number in range(3):
+            post = Post.objects.create(
+                text='Пост {0}'.format(number),
+                author=self.author,
+                group=self.group,
+            )
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        self.post = post
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def get_plans(self, url, table, params=None):
+        """Планы запросов страницы к table с ORDER BY."""
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'ORDER BY' not in sql:
+                    continue
+                if 'FROM "{0}"'.format(table) not in sql:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN {0}'.format(sql))
+                plans.append(' / '.join(row[-1] for row in cursor.fetchall()))
+        return plans
+
+    def assert_index_scan(self, url, table, index, params=None):
+        plans = self.get_plans(url, table, params)
+        self.assertTrue(plans, url)
+        for plan in plans:
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_feeds_use_indexes(self):
+        """Ленты и комментарии читаются по индексу без сортировки."""
+
+        profile = reverse('posts:profile', kwargs={'username': 'kyle'})
+        group = reverse('posts:group', kwargs={'slug': 'resistance'})
+        Follow.objects.create(user=self.reader, author=self.author)
+        for params in (None, {'cursor': ''}):
+            self.assert_index_scan(
+                profile, 'posts_post', 'post_author_pub_date_idx', params,
+            )
+            self.assert_index_scan(
+                group, 'posts_post', 'post_group_pub_date_idx', params,
+            )
+            self.assert_index_scan(
+                reverse('posts:follow_index'),
+                'posts_timelineentry',
+                'timeline_user_pub_date_idx',
+                params,
+            )
+        self.assert_index_scan(
+            reverse('posts:index'), 'posts_post', 'posts_post_pub_date',
+        )
+        self.assert_index_scan(
+            reverse('posts:post', kwargs={
+                'username': 'kyle', 'pk': self.post.pk,
+            }),
+            'posts_comment',
+            'comment_post_created_idx',
+        )
+
+
+class SeedingTest(TestCase):
+    def seed(self, prefix):
+        seeder = seeding.Seeder(
+            users=30, groups=4, posts=150, comments=400, follows=120,
+            seed=1, prefix=prefix, batch_size=50,
+        )
+        seeder.run()
+        return seeder
+
+    def test_seed(self):
+        """Синтетические данные воспроизводимы, а счётчики, ленты и поиск
+        после массовой загрузки согласованы с ними."""
+
+        seeder = self.seed('a')
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 150)
+        self.assertEqual(Comment.objects.count(), 400)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(counters.recount_users(), 0)
+        self.assertEqual(counters.recount_posts(), 0)
+
+        for follow in Follow.objects.all():
+            self.assertEqual(
+                set(TimelineEntry.objects.filter(
+                    user_id=follow.user_id, author_id=follow.author_id,
+                ).values_list('post_id', flat=True)),
+                set(Post.objects.filter(
+                    author_id=follow.author_id,
+                ).values_list('pk', flat=True)),
+            )
+        comments = Comment.objects.select_related('post')
+        self.assertTrue(all(
+            comment.created >= comment.post.pub_date for comment in comments
+        ))
+        post = Post.objects.get(pk=seeder.post_ids[0])
+        self.assertIn(post, search.search(
+            Post.objects.all(), post.text.split()[0], None, 200,
+        ).object_list)
+
+        texts = Post.objects.order_by('pk').values_list('text', flat=True)
+        first = list(texts)
+        self.seed('b')
+        self.assertEqual(list(texts.all()[150:]), first)
+
+    def test_skew(self):
+        """Популярность авторов и комментарии подчиняются степенному
+        закону: лидер заметно опережает медиану."""
+
+        self.seed('a')
+        followers = sorted(
+            UserCounters.objects.values_list('followers', flat=True),
+        )
+        self.assertGreater(followers[-1], 3 * followers[len(followers) // 2])
+        comments = sorted(
+            PostCounters.objects.values_list('comments', flat=True),
+        )
+        self.assertGreater(comments[-1], 3 * comments[len(comments) // 2])
+
+
+@override_settings(POSTS_COMMENTS_PER_PAGE=3)
+class CommentPaginationTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='miles')
+        self.post = Post.objects.create(text='Скайнет', author=self.author)
+        for number in range(7):
+            Comment.objects.create(
+                post=self.post,
+                author=User.objects.create_user(
+                    username='commenter{0}'.format(number),
+                ),
+                text='Комментарий {0}'.format(number),
+            )
+        self.kwargs = {'username': 'miles', 'pk': self.post.pk}
+
+    def get_texts(self, page):
+        return [comment.text for comment in page]
+
+    def test_post_page_and_fragments(self):
+        """Страница поста показывает первую порцию комментариев, фрагменты
+        по курсору — следующие, без повторов и пропусков."""
+
+        response = self.client.get(reverse('posts:post', kwargs=self.kwargs))
+        page = response.context['comment_page']
+        texts = self.get_texts(page)
+        self.assertEqual(
+            texts, ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'],
+        )
+        url = reverse('posts:comments', kwargs=self.kwargs)
+        while page.has_next():
+            response = self.client.get(url, {'comments': page.next_cursor})
+            page = response.context['comment_page']
+            texts += self.get_texts(page)
+        self.assertEqual(
+            texts, ['Комментарий {0}'.format(number) for number in range(7)],
+        )
+        self.assertNotContains(response, 'data-comments-url')
+        self.assertNotContains(response, '<html')
+
+    def test_constant_queries(self):
+        """Авторы комментариев читаются JOIN'ом, а не запросом на каждого."""
+
+        url = reverse('posts:comments', kwargs=self.kwargs)
+        with CaptureQueriesContext(connection) as small:
+            with self.settings(POSTS_COMMENTS_PER_PAGE=1):
+                self.client.get(url)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(url)
+        self.assertEqual(len(small), len(large))
+
+    def test_unknown_post(self):
+        response = self.client.get(reverse(
+            'posts:comments', kwargs={'username': 'sarah', 'pk': self.post.pk},
+        ))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='ellen')
+        self.group = Group.objects.create(title='Вейланд', slug='weyland')
+        self.post = Post.objects.create(
+            text='Ностромо', author=self.author, group=self.group,
+        )
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'ellen'}),
+            reverse('posts:group', kwargs={'slug': 'weyland'}),
+            reverse(
+                'posts:post', kwargs={'username': 'ellen', 'pk': self.post.pk},
+            ),
+        ]
+
+    def test_not_modified(self):
+        """Повторный запрос с валидатором получает 304 без запросов к базе."""
+
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    not_modified = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'],
+                    )
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(len(queries), 0)
+                self.assertIn('Cookie', response['Vary'])
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes(self):
+        """Новый пост или комментарий меняет валидаторы страниц с ним."""
+
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Чужой',
+        )
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        etags = [self.client.get(url)['ETag'] for url in self.urls[:3]]
+        Post.objects.create(
+            text='Рипли', author=self.author, group=self.group,
+        )
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_viewers(self):
+        """Разные зрители получают разные ETag."""
+
+        client = Client()
+        client.force_login(self.author)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(
+                    self.client.get(url)['ETag'], client.get(url)['ETag'],
+                )
+
+    def test_follow(self):
+        """Подписка меняет валидатор профиля автора."""
+
+        url = self.urls[1]
+        etag = self.client.get(url)['ETag']
+        Follow.objects.create(
+            user=User.objects.create_user(username='dallas'),
+            author=self.author,
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def assert_changed(self, url, etag, text):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, text)
+        self.assertContains(self.client.get(url), text)
+
+    def test_group_rename(self):
+        """Новое название группы сразу видно на главной и странице поста."""
+
+        urls = [self.urls[0], self.urls[3]]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.group.title = 'Ютани'
+        self.group.save()
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                self.assert_changed(url, etag, '#Ютани')
+
+    def test_author_rename(self):
+        """Новое имя автора сразу видно на главной и в комментариях."""
+
+        other = Post.objects.create(
+            text='Чужой пост',
+            author=User.objects.create_user(username='ash'),
+        )
+        Comment.objects.create(post=other, author=self.author, text='Да')
+        other_url = reverse(
+            'posts:post', kwargs={'username': 'ash', 'pk': other.pk},
+        )
+        urls = [self.urls[0], other_url]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.author.username = 'ripley'
+        self.author.save()
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                self.assert_changed(url, etag, '@ripley')
+
+    def test_author_rename_on_group_page(self):
+        """Страница группы не отвечает 304 со старым именем автора."""
+
+        url = self.urls[2]
+        etag = self.client.get(url)['ETag']
+        self.author.username = 'ripley'
+        self.author.save()
+        self.assert_changed(url, etag, '@ripley')
+
+    def test_invisible_changes(self):
+        """Вход и сохранение поста без переноса в группу не сбрасывают
+        кэш автора и не читают прежнюю группу."""
+
+        etag = self.client.get(self.urls[1])['ETag']
+        self.client.force_login(self.author)
+        response = Client().get(self.urls[1], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk,
+        )
+        post.text = 'Ностромо, исправлено'
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        self.assertFalse([
+            query for query in queries
+            if 'FROM "posts_group"' in query['sql']
+        ])
+
+
+class ExportTest(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='bishop')
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('posts:new_post'),
+            data={'text': 'С картинкой', 'image': create_test_image_file()},
+        )
+        self.image_post = Post.objects.get(author=self.user)
+        self.posts = [self.image_post] + [
+            Post.objects.create(
+                text='Пост {0}'.format(number), author=self.user,
+            )
+            for number in range(3)
+        ]
+        other = Post.objects.create(
+            text='Чужой пост',
+            author=User.objects.create_user(username='ash'),
+        )
+        Comment.objects.create(post=other, author=self.user, text='Мой')
+        Comment.objects.create(post=other, author=other.author, text='Ваш')
+        self.url = reverse('posts:export', kwargs={'username': 'bishop'})
+
+    def parse(self, content):
+        return [json.loads(line) for line in content.splitlines()]
+
+    def check_rows(self, rows):
+        self.assertEqual(
+            [(row['type'], row['text']) for row in rows],
+            [('post', post.text) for post in self.posts] + [
+                ('comment', 'Мой'),
+            ],
+        )
+        self.assertEqual(rows[0]['image'], self.image_post.image.name)
+
+    def test_ndjson(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.check_rows(self.parse(b''.join(response.streaming_content)))
+
+    def test_zip(self):
+        """Zip содержит NDJSON и файлы изображений под именами из него."""
+
+        response = self.client.get(self.url, {'format': 'zip'})
+        archive = zipfile.ZipFile(BytesIO(b''.join(
+            response.streaming_content,
+        )))
+        self.check_rows(self.parse(archive.read('data.ndjson')))
+        with self.image_post.image.open() as image:
+            self.assertEqual(
+                archive.read(self.image_post.image.name), image.read(),
+            )
+
+    def test_only_own_archive(self):
+        response = self.client.get(
+            reverse('posts:export', kwargs={'username': 'ash'}),
+        )
+        self.assertRedirects(
+            response, reverse('posts:profile', kwargs={'username': 'ash'}),
+        )
+
+    def test_command(self):
+        output = os.path.join(temporary_directory(self), 'bishop.zip')
+        call_command('export_user', 'bishop', format='zip', output=output)
+        with zipfile.ZipFile(output) as archive:
+            self.check_rows(self.parse(archive.read('data.ndjson')))
+
+
+class ApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='dallas')
+        self.group = Group.objects.create(title='Экипаж', slug='crew')
+        self.posts = [
+            Post.objects.create(
+                text='Пост {0}'.format(number),
+                author=self.author,
+                group=self.group if number % 2 else None,
+            )
+            for number in range(5)
+        ]
+        self.post = self.posts[-1]
+        for number in range(3):
+            Comment.objects.create(
+                post=self.post,
+                author=self.author,
+                text='Комментарий {0}'.format(number),
+            )
+
+    def get(self, name, params=None, **kwargs):
+        response = self.client.get(
+            reverse('api:{0}'.format(name), kwargs=kwargs), params,
+        )
+        return response.status_code, response.json()
+
+    def collect(self, name, params, **kwargs):
+        """Пройти все страницы списка по курсору."""
+
+        items = []
+        cursor = ''
+        while cursor is not None:
+            status, data = self.get(
+                name, dict(params, cursor=cursor), **kwargs,
+            )
+            self.assertEqual(status, 200)
+            items += data['results']
+            cursor = data['next']
+        return items
+
+    def test_feeds(self):
+        """Ленты совпадают с HTML-версией и листаются по курсору."""
+
+        texts = [post.text for post in reversed(self.posts)]
+        params = {'fields': 'text', 'limit': 2}
+        self.assertEqual(
+            [item['text'] for item in self.collect('index', params)], texts,
+        )
+        self.assertEqual(
+            [item['text'] for item in self.collect(
+                'profile', params, username='dallas',
+            )],
+            texts,
+        )
+        self.assertEqual(
+            [item['text'] for item in self.collect(
+                'group', params, slug='crew',
+            )],
+            ['Пост 3', 'Пост 1'],
+        )
+
+    def test_post_and_comments(self):
+        status, post = self.get('post', pk=self.post.pk)
+        self.assertEqual(status, 200)
+        self.assertEqual(post['author'], 'dallas')
+        self.assertEqual(post['comments'], 3)
+        self.assertIsNone(post['image'])
+        comments = self.collect(
+            'comments', {'fields': 'text', 'limit': 2}, pk=self.post.pk,
+        )
+        self.assertEqual(
+            comments,
+            [{'text': 'Комментарий {0}'.format(number)} for number in range(3)],
+        )
+
+    def test_logged_in(self):
+        """Вошедшему отдаётся тот же ответ в том же бюджете запросов:
+        сессия и пользователь не читаются."""
+
+        anonymous = {}
+        for name, kwargs in self.api_urls():
+            anonymous[name] = self.get(name, **kwargs)
+        self.client.force_login(self.author)
+        for name, kwargs in self.api_urls():
+            with self.subTest(name=name):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.get(name, **kwargs)
+                self.assertEqual(response, anonymous[name])
+                self.assertNotIn(
+                    'django_session', ' '.join(
+                        query['sql'] for query in queries
+                    ),
+                )
+
+    def api_urls(self):
+        return (
+            ('index', {}),
+            ('post', {'pk': self.post.pk}),
+            ('comments', {'pk': self.post.pk}),
+            ('group', {'slug': 'crew'}),
+            ('profile', {'username': 'dallas'}),
+        )
+
+    def test_sparse_fields(self):
+        """Читаются только запрошенные поля, без JOIN'ов ради остальных."""
+
+        with CaptureQueriesContext(connection) as queries:
+            status, data = self.get('index', {'fields': 'id,text'})
+        self.assertEqual(status, 200)
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN', queries[0]['sql'])
+        status, data = self.get('index', {'fields': 'id,password'})
+        self.assertEqual(status, 400)
+
+    def test_not_found(self):
+        for name, kwargs in (
+            ('post', {'pk': 0}),
+            ('comments', {'pk': 0}),
+            ('group', {'slug': 'nobody'}),
+            ('profile', {'username': 'nobody'}),
+        ):
+            with self.subTest(name=name):
+                status, _ = self.get(name, **kwargs)
+                self.assertEqual(status, 404)
+        status, data = self.get('group', slug=Group.objects.create(
+            title='Пусто', slug='empty',
+        ).slug)
+        self.assertEqual((status, data['results']), (200, []))
+
+    def test_compression(self):
+        url = reverse('api:index')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class BatchApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='parker')
+        self.author = User.objects.create_user(username='brett')
+        self.group = Group.objects.create(title='Машинное', slug='engine')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def post(self, name, items, client=None):
+        response = (client or self.client).post(
+            reverse('api:{0}'.format(name)),
+            json.dumps(items),
+            content_type='application/json',
+        )
+        return response.status_code, response.json()
+
+    def test_posts(self):
+        """Пакет постов пишется целиком, со счётчиками, лентами и
+        поиском."""
+
+        Follow.objects.create(user=self.author, author=self.user)
+        status, data = self.post('batch_posts', [
+            {'text': 'Первый котёнок'},
+            {'text': 'Второй', 'group': self.group.pk},
+        ])
+        self.assertEqual(status, 201)
+        posts = Post.objects.filter(author=self.user).order_by('pk')
+        self.assertEqual(data['created'], [post.pk for post in posts])
+        self.assertEqual(posts[1].group, self.group)
+        self.user.counters.refresh_from_db()
+        self.assertEqual(self.user.counters.posts, 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.author).count(), 2,
+        )
+        found = search.search(Post.objects.all(), 'котёнок', None, 10)
+        self.assertEqual([post.pk for post in found], [posts[0].pk])
+
+    def test_item_errors(self):
+        """Ошибка одного элемента — ничего не записано, ошибки по
+        индексам."""
+
+        status, data = self.post('batch_posts', [
+            {'text': 'Хороший'},
+            {'text': ''},
+            'строка',
+            {'text': 'Чужая группа', 'group': 0},
+        ])
+        self.assertEqual(status, 400)
+        self.assertEqual(
+            [(error['index'], sorted(error['errors'])) for error in (
+                data['errors']
+            )],
+            [(1, ['text']), (2, ['__all__']), (3, ['group'])],
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_comments(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        status, data = self.post('batch_comments', [
+            {'post': 0, 'text': 'Мимо'},
+        ])
+        self.assertEqual((status, data['errors'][0]['index']), (400, 0))
+        status, data = self.post('batch_comments', [
+            {'post': post.pk, 'text': 'Раз'},
+            {'post': post.pk, 'text': 'Два'},
+        ])
+        self.assertEqual(status, 201)
+        self.assertEqual(len(data['created']), 2)
+        self.assertEqual(PostCounters.objects.get(post=post).comments, 2)
+
+    def test_booleans_are_not_ids(self):
+        """true в JSON — не pk 1."""
+
+        # Пост и группа с pk 1 есть: true не должно найти их
+        Post.objects.create(pk=1, text='Пост', author=self.author)
+        Group.objects.update_or_create(
+            pk=1, defaults={'title': 'Первая', 'slug': 'first'},
+        )
+        status, data = self.post('batch_comments', [
+            {'post': True, 'text': 'Мимо'},
+        ])
+        self.assertEqual(status, 400)
+        self.assertIn('post', data['errors'][0]['errors'])
+        status, data = self.post('batch_posts', [
+            {'text': 'Без группы', 'group': True},
+        ])
+        self.assertEqual(status, 400)
+        self.assertIn('group', data['errors'][0]['errors'])
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_deleted_ids_are_not_reused(self):
+        """Пакет не получает pk удалённых постов."""
+
+        deleted = Post.objects.create(text='Удалённый', author=self.user)
+        deleted_pk = deleted.pk
+        deleted.delete()
+        status, data = self.post('batch_posts', [{'text': 'Новый'}])
+        self.assertEqual(status, 201)
+        self.assertGreater(data['created'][0], deleted_pk)
+        self.assertEqual(
+            Post.objects.create(text='Следом', author=self.user).pk,
+            data['created'][0] + 1,
+        )
+
+    def test_follows(self):
+        other = User.objects.create_user(username='lambert')
+        Follow.objects.create(user=self.user, author=other)
+        status, data = self.post('batch_follows', [
+            {'author': 'brett'},
+            {'author': 'lambert', 'action': 'unfollow'},
+        ])
+        self.assertEqual(status, 201)
+        self.assertEqual(
+            data, {'followed': ['brett'], 'unfollowed': ['lambert']},
+        )
+        self.assertEqual(
+            list(self.user.follower.values_list(
+                'author__username', flat=True,
+            )),
+            ['brett'],
+        )
+        self.user.counters.refresh_from_db()
+        self.assertEqual(self.user.counters.following, 1)
+        status, data = self.post('batch_follows', [
+            {'author': 'parker'}, {'author': 'nobody'},
+        ])
+        self.assertEqual(status, 400)
+        self.assertEqual(len(data['errors']), 2)
+
+    def test_requests(self):
+        status, _ = self.post('batch_posts', [], client=Client())
+        self.assertEqual(status, 401)
+        status, _ = self.post('batch_posts', {'text': 'Не массив'})
+        self.assertEqual(status, 400)
+        with self.settings(POSTS_BATCH_MAX_ITEMS=1):
+            status, _ = self.post('batch_posts', [{'text': 'а'}] * 2)
+        self.assertEqual(status, 400)
+
+    def test_token(self):
+        """Скрипт без сессии пишет по ключу, CSRF для него не нужен."""
+
+        output = StringIO()
+        call_command('create_api_token', 'parker', name='импорт', stdout=output)
+        key = output.getvalue().strip()
+        self.assertEqual(self.user.api_tokens.get().name, 'импорт')
+        client = Client(
+            enforce_csrf_checks=True,
+            HTTP_AUTHORIZATION='Token {0}'.format(key),
+        )
+        status, data = self.post('batch_posts', [{'text': 'а'}], client)
+        self.assertEqual(status, 201)
+        post = Post.objects.get(pk=data['created'][0])
+        self.assertEqual(post.author, self.user)
+        client = Client(HTTP_AUTHORIZATION='Token {0}x'.format(key))
+        status, _ = self.post('batch_posts', [{'text': 'а'}], client)
+        self.assertEqual(status, 401)
+        self.user.is_active = False
+        self.user.save()
+        client = Client(HTTP_AUTHORIZATION='Token {0}'.format(key))
+        status, _ = self.post('batch_posts', [{'text': 'а'}], client)
+        self.assertEqual(status, 401)
+
+    def test_session_needs_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(
+            reverse('api:batch_posts'),
+            json.dumps([{'text': 'а'}]),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Post.objects.exists())
+
+    def test_errors_are_not_escaped(self):
+        response = self.client.post(
+            reverse('api:batch_posts'), '[', content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Неверный JSON', response.content.decode())
+
+
+class ImportTest(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.root = temporary_directory(self)
+        Image.new('RGB', (10, 10)).save(os.path.join(self.root, 'cat.png'))
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as dump:
+            dump.write(content)
+        return path
+
+    def import_posts(self, path, **options):
+        call_command(
+            'import_posts', path, workers=0, stdout=StringIO(), **options,
+        )
+
+    def test_json(self):
+        """Авторы, группы, комментарии, даты и изображения переносятся."""
+
+        path = self.write('dump.json', json.dumps([
+            {
+                'id': 1,
+                'author': 'Джон Доу',
+                'group': 'Котики',
+                'text': 'Старый пост',
+                'pub_date': '2015-03-01T10:00:00Z',
+                'image': 'cat.png',
+                'comments': [{'author': 'lee', 'text': 'Мяу'}],
+            },
+            {'id': 2, 'author': 'lee', 'text': 'Ещё', 'group': 'Котики'},
+            {'type': 'comment', 'post': 2, 'author': 'ann', 'text': 'Да'},
+            {'type': 'comment', 'post': 99, 'text': 'Потерялся'},
+        ]))
+        self.import_posts(path)
+        post = Post.objects.get(text='Старый пост')
+        self.assertEqual(post.author.username, 'Джон_Доу')
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group.title, 'Котики')
+        self.assertTrue(post.group.slug)
+        self.assertTrue(post.image.name.startswith('posts/cat'))
+        self.assertEqual(Post.objects.get(text='Ещё').group, post.group)
+        self.assertEqual(
+            sorted(Comment.objects.values_list('text', flat=True)),
+            ['Да', 'Мяу'],
+        )
+        self.assertEqual(post.author.counters.posts, 1)
+        self.assertEqual(PostCounters.objects.get(post=post).comments, 1)
+
+    def test_csv(self):
+        path = self.write(
+            'dump.csv',
+            'id,author,text,pub_date\n7,bob,"Из CSV, с запятой",2019-01-01\n',
+        )
+        self.import_posts(path)
+        post = Post.objects.get()
+        self.assertEqual(post.text, 'Из CSV, с запятой')
+        self.assertEqual(post.pub_date.year, 2019)
+
+    def test_wxr(self):
+        path = self.write('dump.xml', """<?xml version="1.0"?>
+<rss xmlns:content="http://purl.org/rss/1.0/modules/content/"
+     xmlns:dc="http://purl.org/dc/elements/1.1/"
+     xmlns:wp="http://wordpress.org/export/1.2/">
+<channel>
+  <item>
+    <title>Заголовок</title>
+    <dc:creator>admin</dc:creator>
+    <content:encoded><![CDATA[<p>Текст <b>поста</b></p>]]></content:encoded>
+    <category domain="category" nicename="news">Новости</category>
+    <wp:post_id>10</wp:post_id>
+    <wp:post_date_gmt>2012-05-06 07:08:09</wp:post_date_gmt>
+    <wp:post_type>post</wp:post_type>
+    <wp:status>publish</wp:status>
+    <wp:comment>
+      <wp:comment_author>guest</wp:comment_author>
+      <wp:comment_content>Спасибо</wp:comment_content>
+      <wp:comment_approved>1</wp:comment_approved>
+    </wp:comment>
+    <wp:comment>
+      <wp:comment_content>Спам</wp:comment_content>
+      <wp:comment_approved>spam</wp:comment_approved>
+    </wp:comment>
+  </item>
+  <item>
+    <title>Черновик</title>
+    <wp:post_id>11</wp:post_id>
+    <wp:post_type>post</wp:post_type>
+    <wp:status>draft</wp:status>
+  </item>
+  <item>
+    <wp:post_id>12</wp:post_id>
+    <wp:post_type>attachment</wp:post_type>
+    <wp:post_parent>10</wp:post_parent>
+    <wp:attachment_url>cat.png</wp:attachment_url>
+  </item>
+</channel>
+</rss>""")
+        self.import_posts(path)
+        post = Post.objects.get()
+        self.assertEqual(post.text, 'Заголовок\n\nТекст поста')
+        self.assertEqual(post.author.username, 'admin')
+        self.assertEqual(post.group.title, 'Новости')
+        self.assertEqual(post.pub_date.year, 2012)
+        self.assertTrue(post.image)
+        self.assertEqual(
+            list(post.comments.values_list('text', flat=True)), ['Спасибо'],
+        )
+
+    def test_resume(self):
+        """Прерванный импорт продолжается без повторов."""
+
+        records = [
+            {'id': number, 'author': 'max', 'text': 'Пост {0}'.format(number)}
+            for number in range(5)
+        ]
+        path = self.write('dump.ndjson', '\n'.join(
+            json.dumps(record) for record in records
+        ))
+
+        def interrupted(stream, dump_format):
+            for number, record in enumerate(
+                dumps.read_records(stream, dump_format),
+            ):
+                if number == 3:
+                    raise KeyboardInterrupt
+                yield record
+
+        with mock.patch(
+            'apps.posts.management.commands.import_posts.read_records',
+            interrupted,
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                self.import_posts(path, batch_size=2)
+        self.assertEqual(Post.objects.count(), 2)
+        self.import_posts(path, batch_size=2)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            ['Пост {0}'.format(number) for number in range(5)],
+        )
+
+    def test_image_size_limit(self):
+        """Загрузка обрывается, как только изображение превысило
+        предел; пост импортируется без него."""
+
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.read.return_value = b'x' * 1024
+        path = self.write('posts.json', json.dumps([{
+            'id': 1,
+            'author': 'lambert',
+            'text': 'Большая картинка',
+            'image': 'https://example.com/big.png',
+        }]))
+        with self.settings(POSTS_IMPORT_MAX_IMAGE_BYTES=4096):
+            with mock.patch('urllib.request.urlopen', return_value=response):
+                self.import_posts(path)
+        self.assertEqual(response.read.call_count, 5)
+        post = Post.objects.get()
+        self.assertFalse(post.image)
+
+    def test_download_queue_is_bounded(self):
+        """Очередь загрузок не растёт с дампом."""
+
+        importer = importing.Importer('queue', workers=1)
+        importer.executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(importer.executor.shutdown)
+        limit = importing._PENDING_PER_WORKER  # noqa: WPS437
+        pending = []
+
+        def queue(job):
+            importer._queue_images([job])  # noqa: WPS437
+            pending.append(len(importer.futures))
+
+        with mock.patch.object(
+            importer, '_download_in_thread', lambda *job: True,
+        ):
+            for number in range(limit * 3):
+                queue((number, number, 'cat.png'))
+            importer._drain(0)  # noqa: WPS437
+        self.assertLessEqual(max(pending), limit)
+        self.assertEqual(importer.stats['images'], limit * 3)
@@ -0,0 +1,193 @@
+"""Фоновая генерация миниатюр постов.
+
+Pillow не должен работать в потоке запроса: шаблон берёт только готовую
+миниатюру, а недостающие ставятся в локальный пул потоков. Пока миниатюры
+нет, карточка показывает оригинал. Имена готовых миниатюр лежат в строке
+поста (Post.card_images), поэтому карточка не читает хранилище sorl.
+
+POSTS_THUMBNAIL_WORKERS = 0 — синхронный режим только для тестов (пул
+делил бы с тестом базу в памяти): миниатюры создаются после коммита в
+том же потоке, что сохранил пост, в том числе в потоке запроса.
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.images import ImageFile
+
+from apps.posts.cache import invalidate, post_scopes
+from apps.posts.models import Post
+
+
+CARD_WIDTH = 783
+CARD_HEIGHT = 339
+CARD_GEOMETRY = '{0}x{1}'.format(CARD_WIDTH, CARD_HEIGHT)
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}  # noqa: WPS407
+
+DerivativeSpec = namedtuple('DerivativeSpec', ('width', 'format', 'quality'))
+
+_MIME_TYPES = {  # noqa: WPS407
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+
+
+def _supported_formats():
+    """Современные форматы, которые умеют и Pillow, и sorl (для AVIF нужен
+    Pillow с libavif и sorl, знающий расширение .avif)."""
+
+    formats = []
+    for image_format, feature in (('AVIF', 'avif'), ('WEBP', 'webp')):
+        if image_format in EXTENSIONS and features.check(feature):
+            formats.append(image_format)
+    return formats + ['JPEG']
+
+
+# Реестр производных карточки: несколько ширин в каждом формате для srcset,
+# порядок форматов — порядок <source> в <picture>
+CARD_DERIVATIVES = tuple(
+    DerivativeSpec(width, image_format, 70 if image_format != 'JPEG' else 85)
+    for image_format in _supported_formats()
+    for width in (392, 588, CARD_WIDTH)
+)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = set()
+_executor = None
+
+
+def _derivative_args(spec):
+    geometry = '{0}x{1}'.format(
+        spec.width, round(spec.width * CARD_HEIGHT / CARD_WIDTH),
+    )
+    options = dict(CARD_OPTIONS, format=spec.format, quality=spec.quality)
+    return geometry, options
+
+
+def _ready_images(post):
+    """Имена готовых миниатюр поста из post.card_images или None, если их
+    ещё нет или они сделаны для прежнего изображения."""
+
+    if not post.image or not post.card_images:
+        return None
+    images = json.loads(post.card_images)
+    if images.get('image') != post.image.name:
+        return None
+    return images
+
+
+def get_card_thumbnail(post):
+    """Готовая миниатюра карточки поста или None."""
+
+    images = _ready_images(post)
+    if images is None:
+        return None
+    return ImageFile(images['card'], default.storage)
+
+
+def get_card_srcsets(post):
+    """srcset по форматам из готовых производных: [(mime, srcset), ...]."""
+
+    images = _ready_images(post)
+    if images is None:
+        return []
+    srcsets = OrderedDict()
+    for image_format, width, name in images['derivatives']:
+        srcsets.setdefault(_MIME_TYPES[image_format], []).append(
+            '{0} {1}w'.format(default.storage.url(name), width),
+        )
+    return [(mime, ', '.join(srcset)) for mime, srcset in srcsets.items()]
+
+
+def generate_thumbnails(post_id, touch=True):
+    """Создать миниатюру и производные поста и записать их имена в
+    post.card_images; возвращает записанное значение.
+
+    При touch сбрасываются закэшированные карточки и страницы с постом.
+    """
+
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return None
+    card = get_thumbnail(post.image, CARD_GEOMETRY, **CARD_OPTIONS)
+    derivatives = []
+    for spec in CARD_DERIVATIVES:
+        geometry, options = _derivative_args(spec)
+        thumbnail = get_thumbnail(post.image, geometry, **options)
+        derivatives.append([spec.format, spec.width, thumbnail.name])
+    changes = {'card_images': json.dumps({
+        'image': post.image.name,
+        'card': card.name,
+        'derivatives': derivatives,
+    })}
+    if touch:
+        # Новое updated меняет ключ карточки во фрагментном кэше
+        changes['updated'] = timezone.now()
+    Post.objects.filter(pk=post_id).update(**changes)
+    if touch:
+        invalidate(*post_scopes([post_id]))
+    return changes['card_images']
+
+
+def _run(post_id):
+    close_old_connections()
+    try:
+        generate_thumbnails(post_id)
+    except Exception:  # noqa: B902 - воркер не должен падать
+        logger.exception('Thumbnail generation failed for post %s', post_id)
+    finally:
+        connection.close()
+        with _lock:
+            _pending.discard(post_id)
+
+
+def _get_executor():
+    global _executor  # noqa: WPS420
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def enqueue(post_id):
+    """Поставить генерацию миниатюр поста в пул (повторы схлопываются).
+
+    В синхронном режиме (POSTS_THUMBNAIL_WORKERS = 0) пула нет, и
+    недостающая миниатюра не создаётся: её создаёт enqueue_on_commit.
+    """
+
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        return
+    with _lock:
+        if post_id in _pending:
+            return
+        _pending.add(post_id)
+    _get_executor().submit(_run, post_id)
+
+
+def _generate_or_enqueue(post_id):
+    if settings.POSTS_THUMBNAIL_WORKERS:
+        enqueue(post_id)
+    else:
+        generate_thumbnails(post_id)
+
+
+def enqueue_on_commit(post):
+    """После коммита поставить миниатюры поста в пул, а в синхронном
+    режиме — создать их сразу в текущем потоке."""
+
+    if post.image:
+        transaction.on_commit(lambda: _generate_or_enqueue(post.pk))
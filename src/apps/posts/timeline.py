@@ -0,0 +1,319 @@
+"""Лента подписок: гибрид fan-out-on-write и fan-out-on-read.
+
+Новый пост обычного автора сразу раскладывается по TimelineEntry всех его
+подписчиков, и лента читается диапазоном по индексу (user, -pub_date).
+Посты авторов, у которых подписчиков больше POSTS_FANOUT_THRESHOLD, не
+раскладываются — их лента добирает при чтении. В ленте хранится не больше
+POSTS_TIMELINE_LENGTH новейших записей на пользователя (trim_timelines).
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from apps.posts.models import Follow, Post, TimelineEntry, UserCounters
+
+
+_BATCH_SIZE = 1000
+
+# Ключ паджинации ленты: у постов знаменитостей post_id — аннотация
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+# Последние limit постов каждого автора из диапазона id — в ленты всех его
+# подписчиков, кроме уже разложенных и постов авторов-знаменитостей
+_BACKFILL_AUTHORS_SQL = """
+    INSERT INTO {timeline} (user_id, post_id, author_id, pub_date)
+    SELECT follow.user_id, post.id, post.author_id, post.pub_date
+    FROM {follow} follow
+    JOIN (
+        SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+            PARTITION BY author_id ORDER BY pub_date DESC
+        ) AS position
+        FROM {post}
+        WHERE author_id BETWEEN %s AND %s
+    ) post ON post.author_id = follow.author_id AND post.position <= %s
+    LEFT JOIN {counters} counters ON counters.user_id = follow.author_id
+    WHERE follow.author_id BETWEEN %s AND %s
+    AND COALESCE(counters.followers, 0) <= %s
+    AND NOT EXISTS (
+        SELECT 1 FROM {timeline} entry
+        WHERE entry.user_id = follow.user_id AND entry.post_id = post.id
+    )
+"""
+
+
+# Всё, что старше length новейших записей ленты, для пользователей из
+# диапазона id
+_TRIM_SQL = """
+    DELETE FROM {timeline} WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC
+            ) AS position
+            FROM {timeline}
+            WHERE user_id BETWEEN %s AND %s
+        ) entry
+        WHERE entry.position > %s
+    )
+"""
+
+
+def _bulk_create_entries(entries):
+    entries = iter(entries)
+    batch = list(islice(entries, _BATCH_SIZE))
+    while batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        batch = list(islice(entries, _BATCH_SIZE))
+
+
+def is_celebrity(author_id):
+    followers = UserCounters.objects.filter(user_id=author_id).values_list(
+        'followers', flat=True,
+    ).first()
+    return (followers or 0) > settings.POSTS_FANOUT_THRESHOLD
+
+
+def fan_out_post(post):
+    """Разложить новый пост по лентам подписчиков автора."""
+
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True,
+    )
+    _bulk_create_entries(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator(chunk_size=_BATCH_SIZE)
+    )
+
+
+def fan_out_posts(posts):
+    """fan_out_post для пачки постов, созданных в обход сигналов."""
+
+    posts = list(posts)
+    author_ids = list({post.author_id for post in posts})
+    followers = {}
+    for offset in range(0, len(author_ids), _BATCH_SIZE // 2):
+        chunk = author_ids[offset:offset + _BATCH_SIZE // 2]
+        rows = Follow.objects.filter(author_id__in=chunk).exclude(
+            author__counters__followers__gt=settings.POSTS_FANOUT_THRESHOLD,
+        ).values_list('author_id', 'user_id')
+        for author_id, user_id in rows.iterator(chunk_size=_BATCH_SIZE):
+            followers.setdefault(author_id, []).append(user_id)
+    _bulk_create_entries(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for post in posts
+        for user_id in followers.get(post.author_id, ())
+    )
+
+
+def backfill(user_id, author_id, limit=None):
+    """Добавить в ленту нового подписчика последние посты автора
+    (не больше limit, по умолчанию POSTS_TIMELINE_BACKFILL)."""
+
+    if is_celebrity(author_id):
+        return
+    if limit is None:
+        limit = settings.POSTS_TIMELINE_BACKFILL
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date',
+    ).values_list('pk', 'pub_date')[:limit]
+    _bulk_create_entries(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts
+    )
+    trim_timelines(user_id, user_id)
+
+
+def backfill_follows(follows, limit=None):
+    """backfill для пачки подписок: посты каждого автора читаются один
+    раз на всех его новых подписчиков."""
+
+    if limit is None:
+        limit = settings.POSTS_TIMELINE_BACKFILL
+    followers = {}
+    for follow in follows:
+        followers.setdefault(follow.author_id, []).append(follow.user_id)
+    author_ids = list(followers)
+    celebrities = set()
+    for offset in range(0, len(author_ids), _BATCH_SIZE // 2):
+        celebrities.update(UserCounters.objects.filter(
+            user_id__in=author_ids[offset:offset + _BATCH_SIZE // 2],
+            followers__gt=settings.POSTS_FANOUT_THRESHOLD,
+        ).values_list('user_id', flat=True))
+    for author_id, user_ids in followers.items():
+        if author_id in celebrities:
+            continue
+        posts = list(Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date',
+        ).values_list('pk', 'pub_date')[:limit])
+        _bulk_create_entries(
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in user_ids
+            for post_id, pub_date in posts
+        )
+
+
+def backfill_authors(first_id, last_id, limit=None):
+    """backfill всех подписчиков авторов с id от first_id до last_id
+    одним INSERT … SELECT — для массовой загрузки данных.
+
+    Возвращает число добавленных записей.
+    """
+
+    if limit is None:
+        limit = settings.POSTS_TIMELINE_BACKFILL
+    sql = _BACKFILL_AUTHORS_SQL.format(
+        timeline=TimelineEntry._meta.db_table,  # noqa: WPS437
+        follow=Follow._meta.db_table,  # noqa: WPS437
+        post=Post._meta.db_table,  # noqa: WPS437
+        counters=UserCounters._meta.db_table,  # noqa: WPS437
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            first_id, last_id, limit,
+            first_id, last_id, settings.POSTS_FANOUT_THRESHOLD,
+        ])
+        return cursor.rowcount
+
+
+def trim_timelines(first_id, last_id, length=None):
+    """Оставить в лентах пользователей с id от first_id до last_id не
+    больше length (по умолчанию POSTS_TIMELINE_LENGTH) новейших записей.
+
+    Возвращает число удалённых записей.
+    """
+
+    if length is None:
+        length = settings.POSTS_TIMELINE_LENGTH
+    sql = _TRIM_SQL.format(
+        timeline=TimelineEntry._meta.db_table,  # noqa: WPS437
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [first_id, last_id, length])
+        return cursor.rowcount
+
+
+def trim(user_id, author_id):
+    """Убрать из ленты посты автора после отписки.
+
+    Если с этой отпиской автор перестал быть знаменитостью, его посты
+    раскладываются по лентам оставшихся подписчиков: до сих пор они
+    добирались при чтении.
+    """
+
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    followers = UserCounters.objects.filter(user_id=author_id).values_list(
+        'followers', flat=True,
+    ).first()
+    if followers == settings.POSTS_FANOUT_THRESHOLD:
+        backfill_authors(author_id, author_id)
+
+
+def _entry_post(entry):
+    post = entry.post
+    post.post_id = entry.post_id
+    post.comment_count = entry.comment_count
+    return post
+
+
+class Timeline(object):
+    """Лента подписок — последовательность постов для Paginator и
+    CursorPaginator.
+
+    Разложенные посты читаются из TimelineEntry диапазоном по индексу
+    (user, -pub_date, -post) вместе с постом, автором и группой одним
+    JOIN'ом; посты знаменитостей — по индексу (author, -pub_date, -id).
+    Обе выборки упорядочены одинаково и сливаются при чтении.
+    """
+
+    model = TimelineEntry
+    ordered = True
+
+    def __init__(self, entries, celebrity_posts=None):
+        self.entries = entries
+        self.celebrity_posts = celebrity_posts
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if self.celebrity_posts is None:
+            return [_entry_post(entry) for entry in self.entries[index]]
+        # Срез слияния: из каждой выборки хватит index.stop первых строк
+        entries = self.entries[:index.stop]
+        posts = heapq.merge(
+            [_entry_post(entry) for entry in entries],
+            self.celebrity_posts[:index.stop],
+            key=lambda post: (post.pub_date, post.post_id),
+            reverse=self.entries.query.order_by[0].startswith('-'),
+        )
+        return list(posts)[index]
+
+    def filter(self, *args, **kwargs):  # noqa: A003
+        return self._apply('filter', *args, **kwargs)
+
+    def order_by(self, *ordering):
+        return self._apply('order_by', *ordering)
+
+    def count(self):
+        total = self.entries.count()
+        if self.celebrity_posts is not None:
+            total += self.celebrity_posts.count()
+        return total
+
+    def _apply(self, method, *args, **kwargs):
+        celebrity_posts = self.celebrity_posts
+        if celebrity_posts is not None:
+            celebrity_posts = getattr(celebrity_posts, method)(*args, **kwargs)
+        return Timeline(
+            getattr(self.entries, method)(*args, **kwargs), celebrity_posts,
+        )
+
+
+def get_timeline(user):
+    """Лента подписок пользователя (Timeline)."""
+
+    entries = TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group',
+    ).annotate(
+        comment_count=Coalesce(F('post__counters__comments'), 0),
+    ).order_by(*TIMELINE_ORDERING)
+    celebrities = list(
+        Follow.objects.filter(
+            user=user,
+            author__counters__followers__gt=settings.POSTS_FANOUT_THRESHOLD,
+        ).values_list('author_id', flat=True),
+    )
+    if not celebrities:
+        return Timeline(entries)
+    # Записи, разложенные до того, как автор стал знаменитостью, уже
+    # есть среди его постов
+    return Timeline(
+        entries.exclude(author_id__in=celebrities),
+        Post.objects.filter(author_id__in=celebrities).for_feed().annotate(
+            post_id=F('id'),
+        ).order_by(*TIMELINE_ORDERING),
+    )
@@ -0,0 +1,40 @@
+"""Ключи пакетного API: заголовок «Authorization: Token <ключ>»."""
+import hashlib
+import secrets
+
+from apps.posts.models import ApiToken
+
+
+TOKEN_PREFIX = 'Token '
+
+_KEY_BYTES = 32
+
+
+def _hash(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def create_token(user, name=''):
+    """Создать ключ user; вернуть его — в базе остаётся только хэш."""
+
+    key = secrets.token_urlsafe(_KEY_BYTES)
+    ApiToken.objects.create(user=user, name=name, key_hash=_hash(key))
+    return key
+
+
+def get_token(request):
+    """Ключ из заголовка Authorization или None, если его нет."""
+
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not header.startswith(TOKEN_PREFIX):
+        return None
+    return header[len(TOKEN_PREFIX):].strip()
+
+
+def get_token_user(key):
+    """Активный владелец ключа или None."""
+
+    token = ApiToken.objects.select_related('user').filter(
+        key_hash=_hash(key), user__is_active=True,
+    ).first()
+    return None if token is None else token.user
@@ -1,6 +1,7 @@
 from django.urls import path
 
-from apps.posts.views.comments import AddCommentView
+from apps.posts.views.comments import AddCommentView, CommentListView
+from apps.posts.views.export import ExportView
 from apps.posts.views.follow import (
     FollowIndexView,
     ProfileFollowView,
@@ -14,6 +15,7 @@ from apps.posts.views.posts import (
     PostEditView,
 )
 from apps.posts.views.profile import ProfileView
+from apps.posts.views.search import SearchView
 
 
 app_name = 'posts'
@@ -23,7 +25,13 @@ urlpatterns = [
     path('new/', NewPostCreateView.as_view(), name='new_post'),
     path('follow/', FollowIndexView.as_view(), name='follow_index'),
     path('group/<slug:slug>/', GroupView.as_view(), name='group'),
+    path('search/', SearchView.as_view(), name='search'),
     path('<str:username>/', ProfileView.as_view(), name='profile'),
+    path(
+        '<str:username>/export/',
+        ExportView.as_view(),
+        name='export',
+    ),
     path(
         '<str:username>/<int:pk>/',
         PostDetailView.as_view(),
@@ -39,6 +47,11 @@ urlpatterns = [
         AddCommentView.as_view(),
         name='add_comment',
     ),
+    path(
+        '<str:username>/<int:pk>/comments/',
+        CommentListView.as_view(),
+        name='comments',
+    ),
     path(
         '<str:username>/follow/',
         ProfileFollowView.as_view(),
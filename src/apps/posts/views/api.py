@@ -0,0 +1,197 @@
+import abc
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+
+from apps.core.compression import compress_response
+from apps.core.edge import edge_cache
+from apps.posts.api import (
+    COMMENT_FIELDS,
+    JSON_PARAMS,
+    POST_FIELDS,
+    comment_rows,
+    parse_fields,
+    post_rows,
+    serialize,
+)
+from apps.posts.cache import (
+    INDEX_PAGE,
+    author_scope,
+    condition_by_generation,
+    group_scope,
+    post_scope,
+)
+from apps.posts.mixins import PublicReplicaReadMixin
+from apps.posts.models import Comment, Group, Post, User
+from apps.posts.pagination import CursorPaginator
+
+
+_MAX_LIMIT = 100
+
+
+def cached(scope):
+    """Сжатие, общий кэш и conditional GET по поколению scope(kwargs)."""
+
+    def decorator(view_func):
+        conditional = condition_by_generation(scope, per_viewer=False)
+        return compress_response(edge_cache(scope)(conditional(view_func)))
+    return decorator
+
+
+class ApiView(PublicReplicaReadMixin, View, metaclass=abc.ABCMeta):
+    """Ответ JSON из полей ?fields= (по умолчанию все поля ресурса).
+
+    Ответ одинаков для всех посетителей, поэтому сессия не читается и
+    бюджет запросов не зависит от входа на сайт.
+    """
+
+    available_fields = POST_FIELDS
+
+    def get(self, request, *args, **kwargs):
+        try:
+            fields = parse_fields(
+                request.GET.get('fields'), self.available_fields,
+            )
+        except ValueError as error:
+            return JsonResponse(
+                {'error': str(error)},
+                status=400,
+                json_dumps_params=JSON_PARAMS,
+            )
+        try:
+            data = self.get_data(fields)
+        except Http404:
+            return JsonResponse(
+                {'error': 'Не найдено'},
+                status=404,
+                json_dumps_params=JSON_PARAMS,
+            )
+        return JsonResponse(data, json_dumps_params=JSON_PARAMS)
+
+    @abc.abstractmethod
+    def get_data(self, fields):
+        """Данные ответа; Http404 — ответ 404."""
+
+
+class ApiListView(ApiView):
+    """Список с keyset-паджинацией: ?cursor= и ?limit=.
+
+    Пустая страница проверяет, существует ли владелец списка (exists),
+    поэтому непустая читается одним запросом.
+    """
+
+    per_page = 10
+    ordering = ('-pub_date', '-id')
+
+    @abc.abstractmethod
+    def get_rows(self, fields):
+        """Queryset строк списка с полями fields."""
+
+    def owner_exists(self):
+        return True
+
+    def get_per_page(self):
+        try:
+            limit = int(self.request.GET.get('limit') or self.per_page)
+        except ValueError:
+            limit = self.per_page
+        return min(max(limit, 1), _MAX_LIMIT)
+
+    def get_data(self, fields):
+        paginator = CursorPaginator(
+            self.get_rows(fields), self.get_per_page(), ordering=self.ordering,
+        )
+        page = paginator.get_page(self.request.GET.get('cursor'))
+        if not page and not page.has_previous() and not self.owner_exists():
+            raise Http404
+        return {
+            'results': serialize(page, fields, self.available_fields),
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }
+
+
+@method_decorator(cached(lambda kwargs: INDEX_PAGE), name='dispatch')
+class IndexApiView(ApiListView):
+    """Лента всех постов."""
+
+    query_budget = 1
+
+    def get_rows(self, fields):
+        return post_rows(Post.objects.all(), fields)
+
+
+@method_decorator(
+    cached(lambda kwargs: group_scope(kwargs['slug'])), name='dispatch',
+)
+class GroupApiView(ApiListView):
+    """Посты группы."""
+
+    query_budget = 2
+
+    def get_rows(self, fields):
+        return post_rows(
+            Post.objects.filter(group__slug=self.kwargs['slug']), fields,
+        )
+
+    def owner_exists(self):
+        return Group.objects.filter(slug=self.kwargs['slug']).exists()
+
+
+@method_decorator(
+    cached(lambda kwargs: author_scope(kwargs['username'])), name='dispatch',
+)
+class ProfileApiView(ApiListView):
+    """Посты автора."""
+
+    query_budget = 2
+
+    def get_rows(self, fields):
+        return post_rows(
+            Post.objects.filter(author__username=self.kwargs['username']),
+            fields,
+        )
+
+    def owner_exists(self):
+        return User.objects.filter(username=self.kwargs['username']).exists()
+
+
+@method_decorator(
+    cached(lambda kwargs: post_scope(kwargs['pk'])), name='dispatch',
+)
+class PostApiView(ApiView):
+    """Один пост."""
+
+    query_budget = 1
+
+    def get_data(self, fields):
+        rows = post_rows(Post.objects.filter(pk=self.kwargs['pk']), fields)
+        row = rows.first()
+        if row is None:
+            raise Http404
+        return serialize([row], fields, self.available_fields)[0]
+
+
+@method_decorator(
+    cached(lambda kwargs: post_scope(kwargs['pk'])), name='dispatch',
+)
+class CommentsApiView(ApiListView):
+    """Комментарии поста в порядке добавления."""
+
+    available_fields = COMMENT_FIELDS
+    ordering = ('created', 'id')
+    query_budget = 2
+
+    def get_rows(self, fields):
+        return comment_rows(
+            Comment.objects.filter(post_id=self.kwargs['pk']), fields,
+        )
+
+    @property
+    def per_page(self):
+        return settings.POSTS_COMMENTS_PER_PAGE
+
+    def owner_exists(self):
+        return Post.objects.filter(pk=self.kwargs['pk']).exists()
@@ -0,0 +1,87 @@
+import abc
+import json
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+
+from apps.posts.api import JSON_PARAMS
+from apps.posts.batch import (
+    BatchError,
+    change_follows,
+    create_comments,
+    create_posts,
+)
+from apps.posts.mixins import PrimaryWriteMixin, TokenAuthMixin
+
+
+def parse_items(body):
+    """Элементы пакета из тела запроса; ValueError с текстом ошибки."""
+
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise ValueError('Неверный JSON')
+    if not isinstance(items, list):
+        raise ValueError('Ожидается массив')
+    if len(items) > settings.POSTS_BATCH_MAX_ITEMS:
+        raise ValueError('Не больше {0} элементов'.format(
+            settings.POSTS_BATCH_MAX_ITEMS,
+        ))
+    return items
+
+
+def _json_response(data, status):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+class BatchView(
+    TokenAuthMixin, PrimaryWriteMixin, View, metaclass=abc.ABCMeta,
+):
+    """POST JSON-массива элементов от имени текущего пользователя: по
+    сессии (с CSRF) или по ключу в заголовке «Authorization: Token …».
+
+    Ответ 201 — результат save(user, items), 400 — ошибки разбора или
+    ошибки элементов с их индексами (ничего не записано).
+    """
+
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _json_response({'error': 'Нужна авторизация'}, 401)
+        try:
+            items = parse_items(request.body)
+        except ValueError as error:
+            return _json_response({'error': str(error)}, 400)
+        try:
+            data = self.save(request.user, items)
+        except BatchError as error:
+            return _json_response({'errors': error.errors}, 400)
+        return _json_response(data, 201)
+
+    @abc.abstractmethod
+    def save(self, user, items):
+        """Записать items от имени user; BatchError — ответ 400."""
+
+
+class PostBatchView(BatchView):
+    """Посты: [{"text": …, "group": id}, …]."""
+
+    def save(self, user, items):
+        return {'created': [post.pk for post in create_posts(user, items)]}
+
+
+class CommentBatchView(BatchView):
+    """Комментарии: [{"post": id, "text": …}, …]."""
+
+    def save(self, user, items):
+        return {'created': [
+            comment.pk for comment in create_comments(user, items)
+        ]}
+
+
+class FollowBatchView(BatchView):
+    """Подписки: [{"author": username, "action": "follow"|"unfollow"}, …]."""
+
+    def save(self, user, items):
+        followed, unfollowed = change_follows(user, items)
+        return {'followed': followed, 'unfollowed': unfollowed}
@@ -1,18 +1,58 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import CreateView
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.generic import CreateView, TemplateView
 
+from apps.core.edge import edge_cache
+from apps.posts.cache import invalidate_post_card, post_scope
 from apps.posts.forms import CommentForm
-from apps.posts.models import Comment
+from apps.posts.mixins import (
+    CommentPageMixin,
+    PrimaryWriteMixin,
+    ReplicaReadMixin,
+)
+from apps.posts.models import Comment, Post
 
 
-class AddCommentView(LoginRequiredMixin, CreateView):
+class AddCommentView(PrimaryWriteMixin, LoginRequiredMixin, CreateView):
     """Добавление комментария к посту."""
 
     model = Comment
     form_class = CommentForm
 
+    @transaction.atomic
     def form_valid(self, form):
         form.instance.author = self.request.user
         form.instance.post_id = self.kwargs['pk']
+        post = Post.objects.for_feed().filter(pk=self.kwargs['pk']).first()
+        if post is not None:
+            invalidate_post_card(post)
         form.save()
         return super().form_valid(form)
+
+
+@method_decorator(
+    edge_cache(lambda kwargs: post_scope(kwargs['pk'])),
+    name='dispatch',
+)
+class CommentListView(ReplicaReadMixin, CommentPageMixin, TemplateView):
+    """Следующая порция комментариев поста HTML-фрагментом."""
+
+    template_name = 'posts/includes/comment_list.html'
+    query_budget = 4
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        post = get_object_or_404(
+            Post.objects.select_related('author').only(
+                'pk', 'author__username',
+            ),
+            pk=self.kwargs['pk'],
+            author__username=self.kwargs['username'],
+        )
+        context['post'] = post
+        context['comment_page'] = self.get_comment_page(
+            self.get_comments(post.pk),
+        )
+        return context
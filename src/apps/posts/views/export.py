@@ -0,0 +1,34 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.views import View
+
+from apps.posts.export import export_ndjson, export_zip
+
+
+_FORMATS = {  # noqa: WPS407
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+    'zip': (export_zip, 'application/zip'),
+}
+
+
+class ExportView(LoginRequiredMixin, View):
+    """Выгрузка своих постов и комментариев: NDJSON или zip с
+    изображениями (?format=zip)."""
+
+    def get(self, request, *args, **kwargs):
+        if request.user.username != kwargs['username']:
+            return redirect('posts:profile', username=kwargs['username'])
+        export_format = request.GET.get('format')
+        if export_format not in _FORMATS:
+            export_format = 'ndjson'
+        export, content_type = _FORMATS[export_format]
+        response = StreamingHttpResponse(
+            export(request.user), content_type=content_type,
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="{0}.{1}"'.format(
+                request.user.username, export_format,
+            )
+        )
+        return response
@@ -1,24 +1,44 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect
+from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.generic import ListView
 
-from apps.posts.mixins import PytestGetMixin, PytestMixin, SameUserFollowMixin
-from apps.posts.models import Follow, Post, User
+from apps.posts.mixins import (
+    CursorPaginationMixin,
+    PrimaryWriteMixin,
+    PytestGetMixin,
+    PytestMixin,
+    ReplicaReadMixin,
+    SameUserFollowMixin,
+)
+from apps.posts.models import Follow, User
+from apps.posts.timeline import TIMELINE_ORDERING, get_timeline
 
 
-class FollowIndexView(LoginRequiredMixin, PytestMixin, ListView):
+class FollowIndexView(  # noqa: WPS215
+    ReplicaReadMixin,
+    LoginRequiredMixin,
+    CursorPaginationMixin,
+    PytestMixin,
+    ListView,
+):
     """Избранные авторы. Главная страница."""
 
     template_name = 'posts/follow.html'
     paginate_by = 10
+    # Подписки на знаменитостей добавляют счёт и страницу их постов
+    query_budget = 7
     extra_context = {'follow': True}
+    cursor_ordering = TIMELINE_ORDERING
 
     def get_queryset(self):
-        return Post.objects.filter(author__following__user=self.request.user)
+        return get_timeline(self.request.user)
 
 
 class ProfileFollowView(  # noqa: WPS215
+    PrimaryWriteMixin,
     LoginRequiredMixin,
     PytestGetMixin,
     SameUserFollowMixin,
@@ -26,6 +46,7 @@ class ProfileFollowView(  # noqa: WPS215
 ):
     """Подписка на автора."""
 
+    @method_decorator(transaction.atomic)
     def post(self, request, *args, **kwargs):
         author = get_object_or_404(User, username=kwargs['username'])
         Follow.objects.get_or_create(user=request.user, author=author)
@@ -33,6 +54,7 @@ class ProfileFollowView(  # noqa: WPS215
 
 
 class ProfileUnfollowView(  # noqa: WPS215
+    PrimaryWriteMixin,
     LoginRequiredMixin,
     PytestGetMixin,
     SameUserFollowMixin,
@@ -40,6 +62,7 @@ class ProfileUnfollowView(  # noqa: WPS215
 ):
     """Отписка от автора."""
 
+    @method_decorator(transaction.atomic)
     def post(self, request, *args, **kwargs):
         author = get_object_or_404(User, username=kwargs['username'])
         request.user.follower.filter(author=author).delete()
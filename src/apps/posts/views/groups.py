@@ -1,11 +1,23 @@
+from django.utils.decorators import method_decorator
 from django.views.generic import DetailView
 
-from apps.posts.mixins import PaginatorMixin
+from apps.core.edge import edge_cache
+from apps.posts.cache import condition_by_generation, group_scope
+from apps.posts.mixins import PaginatorMixin, ReplicaReadMixin
 from apps.posts.models import Group
 
 
-class GroupView(PaginatorMixin, DetailView):
+@method_decorator(
+    edge_cache(lambda kwargs: group_scope(kwargs['slug'])),
+    name='dispatch',
+)
+@method_decorator(
+    condition_by_generation(lambda kwargs: group_scope(kwargs['slug'])),
+    name='dispatch',
+)
+class GroupView(ReplicaReadMixin, PaginatorMixin, DetailView):
     """Страница группы."""
 
     model = Group
     template_name = 'posts/group.html'
+    query_budget = 6
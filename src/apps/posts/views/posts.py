@@ -1,43 +1,100 @@
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django.views.generic import CreateView, DetailView, ListView, UpdateView
 
+from apps.core.edge import edge_cache
+from apps.posts.cache import (
+    INDEX_PAGE,
+    author_scope,
+    cache_page_by_generation,
+    condition_by_generation,
+    invalidate_post_card,
+    post_scope,
+)
 from apps.posts.forms import CommentForm, PostForm
-from apps.posts.mixins import PytestMixin, UserIsFollowerMixin
+from apps.posts.mixins import (
+    CommentPageMixin,
+    CursorPaginationMixin,
+    PrimaryWriteMixin,
+    PytestMixin,
+    ReplicaReadMixin,
+    UserIsFollowerMixin,
+)
 from apps.posts.models import Post
+from apps.posts.thumbnails import enqueue_on_commit
 
 
-_CACHE_TIMEOUT = 20
-
-
+@method_decorator(edge_cache(lambda kwargs: INDEX_PAGE), name='dispatch')
 @method_decorator(
-    cache_page(_CACHE_TIMEOUT, key_prefix='index_page'),
+    condition_by_generation(lambda kwargs: INDEX_PAGE),
     name='dispatch',
 )
-class IndexListView(PytestMixin, ListView):
+@method_decorator(
+    cache_page_by_generation(
+        settings.INDEX_PAGE_CACHE_TIMEOUT, key_prefix=INDEX_PAGE,
+    ),
+    name='dispatch',
+)
+class IndexListView(  # noqa: WPS215
+    ReplicaReadMixin,
+    CursorPaginationMixin,
+    PytestMixin,
+    ListView,
+):
     """Главная страница."""
 
     model = Post
     template_name = 'posts/index.html'
     paginate_by = 10
+    query_budget = 5
 
+    def get_queryset(self):
+        return Post.objects.for_feed()
 
-class PostDetailView(UserIsFollowerMixin, DetailView):
-    """Просмотр одного поста."""
+
+@method_decorator(
+    edge_cache(
+        lambda kwargs: post_scope(kwargs['pk']),
+        lambda kwargs: author_scope(kwargs['username']),
+    ),
+    name='dispatch',
+)
+@method_decorator(
+    condition_by_generation(
+        lambda kwargs: post_scope(kwargs['pk']),
+        lambda kwargs: author_scope(kwargs['username']),
+    ),
+    name='dispatch',
+)
+class PostDetailView(  # noqa: WPS215
+    ReplicaReadMixin,
+    UserIsFollowerMixin,
+    CommentPageMixin,
+    DetailView,
+):
+    """Просмотр одного поста с первой порцией комментариев."""
 
     model = Post
     template_name = 'posts/post.html'
+    query_budget = 6
+
+    def get_queryset(self):
+        return Post.objects.for_feed().select_related('author__counters')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['form'] = CommentForm(self.request.POST or None)
+        comments = self.get_comments(self.object.pk)
+        context['comments'] = comments
+        context['comment_page'] = self.get_comment_page(comments)
         return context
 
 
-class NewPostCreateView(LoginRequiredMixin, CreateView):
+class NewPostCreateView(PrimaryWriteMixin, LoginRequiredMixin, CreateView):
     """Добавление нового поста."""
 
     model = Post
@@ -45,13 +102,15 @@ class NewPostCreateView(LoginRequiredMixin, CreateView):
     form_class = PostForm
     success_url = reverse_lazy('posts:index')
 
+    @transaction.atomic
     def form_valid(self, form):
         form.instance.author = self.request.user
         form.save()
+        enqueue_on_commit(form.instance)
         return super().form_valid(form)
 
 
-class PostEditView(LoginRequiredMixin, UpdateView):
+class PostEditView(PrimaryWriteMixin, LoginRequiredMixin, UpdateView):
     """Редактирование поста."""
 
     model = Post
@@ -59,6 +118,16 @@ class PostEditView(LoginRequiredMixin, UpdateView):
     form_class = PostForm
     extra_context = {'is_created': True}
 
+    def get_queryset(self):
+        return Post.objects.for_feed()
+
+    def form_valid(self, form):
+        invalidate_post_card(form.instance)
+        response = super().form_valid(form)
+        if 'image' in form.changed_data:
+            enqueue_on_commit(self.object)
+        return response
+
     def dispatch(self, request, *args, **kwargs):
         if self.request.user.username != self.kwargs['username']:
             return redirect(
@@ -1,13 +1,48 @@
+from django.utils.decorators import method_decorator
 from django.views.generic import DetailView
 
-from apps.posts.mixins import PaginatorMixin, UserIsFollowerMixin
+from apps.core.edge import edge_cache
+from apps.posts.cache import author_scope, condition_by_generation
+from apps.posts.mixins import (
+    PaginatorMixin,
+    ReplicaReadMixin,
+    UserIsFollowerMixin,
+)
 from apps.posts.models import User
 
 
-class ProfileView(PaginatorMixin, UserIsFollowerMixin, DetailView):
-    """Профиль пользователя."""
+@method_decorator(
+    edge_cache(lambda kwargs: author_scope(kwargs['username'])),
+    name='dispatch',
+)
+@method_decorator(
+    condition_by_generation(lambda kwargs: author_scope(kwargs['username'])),
+    name='dispatch',
+)
+class ProfileView(  # noqa: WPS215
+    ReplicaReadMixin,
+    PaginatorMixin,
+    UserIsFollowerMixin,
+    DetailView,
+):
+    """Профиль пользователя.
+
+    Автор, счётчики и флаг подписки читаются одним запросом
+    (UserIsFollowerMixin), первая страница постов — вторым: число постов
+    для паджинатора берётся из счётчиков автора.
+    """
 
     model = User
+    # Под именем user шаблон показал бы автора вошедшим на сайт
+    context_object_name = 'author'
     template_name = 'posts/profile.html'
     slug_field = 'username'
     slug_url_kwarg = 'username'
+    query_budget = 4
+
+    def get_object(self, queryset=None):
+        return self.author
+
+    def get_post_count(self, obj):
+        counters = getattr(obj, 'counters', None)
+        return None if counters is None else counters.posts
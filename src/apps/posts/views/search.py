@@ -0,0 +1,24 @@
+from django.views.generic import TemplateView
+
+from apps.posts import search
+from apps.posts.models import Post
+
+
+class SearchView(TemplateView):
+    """Полнотекстовый поиск по постам."""
+
+    template_name = 'posts/search.html'
+    paginate_by = 10
+    query_budget = 5
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        context['query'] = query
+        context['page'] = search.search(
+            Post.objects.for_feed(),
+            query,
+            self.request.GET.get('cursor'),
+            self.paginate_by,
+        )
+        return context
@@ -3,6 +3,8 @@ from pathlib import PurePath
 
 from dotenv import load_dotenv
 
+from config.database import parse_database_url
+
 
 load_dotenv()
 
@@ -36,6 +38,7 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE = (
+    'apps.core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,12 +80,52 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 
 # Database
+# DATABASE_URL — DSN базы (см. config.database), по умолчанию локальный
+# SQLite. Соединения живут DJANGO_DB_CONN_MAX_AGE секунд и перед
+# повторным использованием в новом запросе проверяются
+# (DJANGO_DB_HEALTH_CHECKS)
+_DB_OPTIONS = {  # noqa: WPS407
+    'conn_max_age': int(os.getenv('DJANGO_DB_CONN_MAX_AGE') or 60),
+    'statement_timeout': int(os.getenv('DJANGO_DB_STATEMENT_TIMEOUT') or 0),
+}
 DATABASES = {  # noqa: WPS407
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    },
+    'default': parse_database_url(
+        os.getenv('DATABASE_URL') or 'sqlite:///{0}'.format(
+            os.path.join(BASE_DIR, 'db.sqlite3'),
+        ),
+        **_DB_OPTIONS,
+    ),
+}
+# PRAGMA для каждого нового соединения SQLite (apps.core.sqlite3): WAL не
+# блокирует чтение записью, busy_timeout (мс) ждёт освобождения блокировки
+# вместо «database is locked», cache_size < 0 — размер кэша страниц в КиБ
+SQLITE_PRAGMAS = {  # noqa: WPS407
+    'journal_mode': os.getenv('DJANGO_SQLITE_JOURNAL_MODE') or 'wal',
+    'synchronous': os.getenv('DJANGO_SQLITE_SYNCHRONOUS') or 'normal',
+    'busy_timeout': int(os.getenv('DJANGO_SQLITE_BUSY_TIMEOUT') or 5000),
+    'mmap_size': int(os.getenv('DJANGO_SQLITE_MMAP_SIZE') or 268435456),
+    'cache_size': int(os.getenv('DJANGO_SQLITE_CACHE_SIZE') or -65536),
+    'temp_store': 'memory',
 }
+SQLITE_TRANSACTION_MODE = (
+    os.getenv('DJANGO_SQLITE_TRANSACTION_MODE') or 'IMMEDIATE'
+).upper()
+# Реплики только для чтения: DSN через запятую. На них идут GET-запросы
+# лент и постов (apps.core.routers); после записи клиент ещё
+# REPLICA_STICKY_SECONDS читает с основной базы
+for _index, _url in enumerate(
+    filter(None, (os.getenv('DATABASE_REPLICA_URLS') or '').split(',')),
+):
+    DATABASES['replica{0}'.format(_index)] = dict(
+        parse_database_url(_url.strip(), **_DB_OPTIONS),
+        TEST={'MIRROR': 'default'},
+    )
+REPLICA_DATABASES = tuple(alias for alias in DATABASES if alias != 'default')
+REPLICA_STICKY_SECONDS = int(os.getenv('DJANGO_REPLICA_STICKY_SECONDS') or 10)
+DATABASE_ROUTERS = ('apps.core.routers.ReplicaRouter',)
+DB_HEALTH_CHECKS = os.getenv(
+    'DJANGO_DB_HEALTH_CHECKS', 'true',
+).lower() in {'yes', '1', 'true'}
 
 
 # Password validation
@@ -114,6 +157,22 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Хэшированные имена статики (нужен collectstatic), такие файлы отдаются
+# с Cache-Control: immutable
+STATIC_MANIFEST = os.getenv(
+    'DJANGO_STATIC_MANIFEST', 'false',
+).lower() in {'yes', '1', 'true'}
+if STATIC_MANIFEST:
+    STATICFILES_STORAGE = (
+        'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+    )
+STATIC_MAX_AGE = int(os.getenv('DJANGO_STATIC_MAX_AGE') or 3600)
+
+# Отдача файлов веб-сервером: '' (сам Django), 'x-accel-redirect' (nginx,
+# к пути запроса добавляется FILE_OFFLOAD_PREFIX) или 'x-sendfile'
+FILE_OFFLOAD = (os.getenv('DJANGO_FILE_OFFLOAD') or '').lower()
+FILE_OFFLOAD_PREFIX = os.getenv('DJANGO_FILE_OFFLOAD_PREFIX') or '/protected'
+
 INTERNAL_IPS = (
     '127.0.0.1',
 )
@@ -129,8 +188,94 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 SITE_ID = 1
 
+# Лента подписок: авторы с большим числом подписчиков не раскладываются
+# по лентам при публикации, а добираются при чтении
+POSTS_FANOUT_THRESHOLD = int(os.getenv('POSTS_FANOUT_THRESHOLD') or 1000)
+POSTS_TIMELINE_BACKFILL = int(os.getenv('POSTS_TIMELINE_BACKFILL') or 100)
+# Новейших записей в ленте подписок пользователя (manage.py trim_timelines)
+POSTS_TIMELINE_LENGTH = int(os.getenv('POSTS_TIMELINE_LENGTH') or 1000)
+
+# Keyset-паджинация лент вместо COUNT(*) + OFFSET
+POSTS_CURSOR_PAGINATION = os.getenv(
+    'POSTS_CURSOR_PAGINATION', 'false',
+).lower() in {'yes', '1', 'true'}
+
+# Комментарии на странице поста: первая порция, остальные подгружаются
+# фрагментами (posts:comments)
+POSTS_COMMENTS_PER_PAGE = int(os.getenv('POSTS_COMMENTS_PER_PAGE') or 50)
+
+# Наибольший пакет batch API (api:batch_posts, batch_comments, batch_follows)
+POSTS_BATCH_MAX_ITEMS = int(os.getenv('POSTS_BATCH_MAX_ITEMS') or 1000)
+
+# Наибольший размер изображения, загружаемого import_posts (байт)
+POSTS_IMPORT_MAX_IMAGE_BYTES = int(
+    os.getenv('POSTS_IMPORT_MAX_IMAGE_BYTES') or 10 * 1024 * 1024,
+)
+
+# Cache: file (по умолчанию) или redis — общие для всех воркеров, locmem —
+# свой у каждого процесса (по умолчанию при DEBUG). Для redis нужен пакет
+# django-redis.
+_CACHE_BACKENDS = {  # noqa: WPS407
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'file': (
+        'django.core.cache.backends.filebased.FileBasedCache',
+        os.path.join(BASE_DIR, '.cache'),
+    ),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+_CACHE_NAME = os.getenv('DJANGO_CACHE_BACKEND') or (
+    'locmem' if DEBUG else 'file'
+)
+_CACHE_BACKEND, _CACHE_LOCATION = _CACHE_BACKENDS[_CACHE_NAME]
 CACHES = {  # noqa: WPS407
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': _CACHE_BACKEND,
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION') or _CACHE_LOCATION,
+    },
+}
+
+# Поколения кэша (apps.posts.cache), кэш страниц по ним и conditional GET
+# верны, только если кэш общий для всех воркеров: с locmem они работают
+# лишь при DEBUG (и в тестах), иначе выключены
+POSTS_GENERATION_CACHE = DEBUG or _CACHE_NAME != 'locmem'
+
+# Главная страница инвалидируется при изменении постов, поэтому может
+# храниться в кэше долго
+INDEX_PAGE_CACHE_TIMEOUT = int(os.getenv('INDEX_PAGE_CACHE_TIMEOUT') or 900)
+
+# Общий кэш перед приложением (apps.core.edge): страницы для анонимных
+# посетителей отдаются с Cache-Control: public, s-maxage и Surrogate-Key
+# (0 — выключено). При записи ключи сбрасываются через EDGE_CACHE_PURGER:
+# '' (не сбрасывать), 'file', 'http' или путь к своему классу;
+# EDGE_CACHE_PURGE_LOCATION — файл или URL для PURGE
+EDGE_CACHE_TIMEOUT = int(os.getenv('EDGE_CACHE_TIMEOUT') or 0)
+EDGE_CACHE_PURGER = os.getenv('EDGE_CACHE_PURGER') or ''
+EDGE_CACHE_PURGE_LOCATION = os.getenv('EDGE_CACHE_PURGE_LOCATION') or ''
+
+# Потоки фоновой генерации миниатюр (0 — синхронный режим для тестов)
+POSTS_THUMBNAIL_WORKERS = int(os.getenv('POSTS_THUMBNAIL_WORKERS') or 2)
+
+# Миниатюры и производные изображений постов лежат рядом с оригиналами
+THUMBNAIL_PREFIX = 'posts/cache/'
+
+# Метрики запросов (apps.core.metrics): превышение query_budget
+# представления роняет запрос при QUERY_BUDGETS_STRICT (в тестах включено
+# в config.test_settings). DJANGO_METRICS_LOG_LEVEL=INFO пишет в лог
+# метрики каждого запроса
+QUERY_BUDGETS_STRICT = os.getenv(
+    'DJANGO_QUERY_BUDGETS_STRICT', 'false',
+).lower() in {'yes', '1', 'true'}
+LOGGING = {  # noqa: WPS407
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'apps.core.metrics': {
+            'handlers': ['console'],
+            'level': os.getenv('DJANGO_METRICS_LOG_LEVEL') or 'WARNING',
+            'propagate': False,
+        },
     },
 }
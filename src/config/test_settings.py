@@ -0,0 +1,31 @@
+"""Настройки тестов: manage.py test и pytest."""
+from config.settings import *  # noqa: F401, F403, WPS347
+
+# Тесты идут в одном процессе, и кэш не должен переживать прогон
+CACHES = {  # noqa: WPS407
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+POSTS_GENERATION_CACHE = True
+
+# Потоки пула делили бы с тестом базу SQLite в памяти: миниатюры
+# генерируются синхронно в потоке теста при сохранении поста
+POSTS_THUMBNAIL_WORKERS = 0
+SILENCED_SYSTEM_CHECKS = ['posts.W002']  # noqa: WPS407
+
+# Превышение бюджета запросов роняет тест, а метрики в консоль не пишутся
+QUERY_BUDGETS_STRICT = True
+LOGGING = {  # noqa: WPS407
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'null': {'class': 'logging.NullHandler'},
+    },
+    'loggers': {
+        'apps.core.metrics': {
+            'handlers': ['null'],
+            'propagate': False,
+        },
+    },
+}
@@ -4,7 +4,9 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.flatpages import views
 from django.urls import include, path, re_path
-from django.views.static import serve
+
+from apps.core.files import serve
+from apps.core.metrics import metrics_view
 
 
 handler404 = 'apps.core.views.page_not_found'  # noqa: WPS440, F811
@@ -14,6 +16,8 @@ urlpatterns = [
     path('auth/', include('apps.users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/v1/', include('apps.posts.api_urls', namespace='api')),
 ]
 
 urlpatterns += [
@@ -51,11 +55,14 @@ if not settings.DEBUG:
         re_path(
             '^media/(?P<path>.*)$',
             serve,
-            {'document_root': settings.MEDIA_ROOT},
+            {'document_root': settings.MEDIA_ROOT, 'immutable': True},
         ),
         re_path(
             '^static/(?P<path>.*)$',
             serve,
-            {'document_root': settings.STATIC_ROOT},
+            {
+                'document_root': settings.STATIC_ROOT,
+                'immutable': settings.STATIC_MANIFEST,
+            },
         ),
     ] + urlpatterns
@@ -5,7 +5,10 @@ import sys
 
 
 def main():
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    settings_module = 'config.settings'
+    if sys.argv[1:2] == ['test']:
+        settings_module = 'config.test_settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
     try:
         from django.core import management  # noqa: WPS433
     except ImportError as exc: